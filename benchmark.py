@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+'''
+Benchmark of SAR parser and visualizer on generated SAR data.
+
+Generates ``sar -A`` output with :mod:`sar.generator`, runs each stage in
+its own process (so peak RSS is per stage) and reports cold import time,
+wall time, parse throughput and peak RSS. Results can be saved as JSON and
+compared with results of another commit::
+
+    python benchmark.py --cpus 32 --interval 10 --output new.json
+    python benchmark.py --cpus 32 --interval 10 --compare new.json
+'''
+
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from sar import generator
+
+
+class StageError(Exception):
+    '''
+    Stage raised an exception, carries its traceback from the child process
+    '''
+
+
+def peak_rss_kb():
+    '''
+    Returns peak resident set size of current process, in kB
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if platform.system() == 'Darwin':
+        # macOS reports bytes
+        peak //= 1024
+    return peak
+
+
+def cold_import(module):
+    '''
+    Returns seconds it takes to import a module in a fresh interpreter
+    '''
+    code = ('import time; start = time.time(); import %s; '
+            'print(time.time() - start)' % (module,))
+    output = subprocess.check_output(
+        [sys.executable, '-c', code],
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def stage_import_parser(paths, options):
+    '''
+    Cold import of the parser module
+    '''
+    return cold_import('sar.parser'), None, None
+
+
+def stage_import_viz(paths, options):
+    '''
+    Cold import of the visualization module (matplotlib is loaded on
+    first render, so it is not part of this)
+    '''
+    return cold_import('sar.viz'), None, None
+
+
+def stage_parse(paths, options):
+    '''
+    Parses a day into ``dict`` rows, file read at once
+    '''
+    from sar import parser
+    from sar.profiling import Profile
+    profile = Profile()
+    start = time.time()
+    parser.Parser(paths['day'], profile=profile).get_sar_info()
+    return time.time() - start, os.path.getsize(paths['day']), profile
+
+
+def stage_parse_stats_only(paths, options):
+    '''
+    Parses a day into its running summary only
+    '''
+    from sar import parser
+    start = time.time()
+    parser.Parser(paths['day'], stats_only=True).summarize()
+    return time.time() - start, os.path.getsize(paths['day']), None
+
+
+def stage_parse_windowed(paths, options):
+    '''
+    Parses a day into its running summary, file read in 1 MB windows
+    '''
+    from sar import parser
+    start = time.time()
+    parser.Parser(paths['day'], stats_only=True,
+                  window=1024 * 1024).summarize()
+    return time.time() - start, os.path.getsize(paths['day']), None
+
+
+def stage_parse_rows(paths, options):
+    '''
+    Parses a day into ``dict`` rows, file read in 1 MB windows
+    '''
+    from sar import parser
+    start = time.time()
+    parser.Parser(paths['day'], window=1024 * 1024).get_sar_info()
+    return time.time() - start, os.path.getsize(paths['day']), None
+
+
+def stage_parse_compact(paths, options):
+    '''
+    Parses a day into compact records, file read in 1 MB windows
+    '''
+    from sar import parser
+    start = time.time()
+    parser.Parser(paths['day'], window=1024 * 1024,
+                  compact=True).get_sar_info()
+    return time.time() - start, os.path.getsize(paths['day']), None
+
+
+def stage_parse_workers(paths, options, workers=1):
+    '''
+    Parses a day into ``dict`` rows in a pool of ``workers`` processes
+    '''
+    from sar import parser
+    start = time.time()
+    parser.Parser(paths['day'], workers=workers).get_sar_info()
+    return time.time() - start, os.path.getsize(paths['day']), None
+
+
+def stage_multiparse(paths, options):
+    '''
+    Parses all days of the combined file
+    '''
+    from sar import multiparser
+    start = time.time()
+    multiparser.Multiparser(paths['combo']).load_file()
+    return time.time() - start, os.path.getsize(paths['combo']), None
+
+
+def stage_preprocess(paths, options):
+    '''
+    Prepares chart series of a parsed day (without drawing)
+    '''
+    from sar import parser
+    from sar import viz
+    sar_info = parser.Parser(paths['day']).get_sar_info()
+    start = time.time()
+    viz.Visualization(sar_info, paging=True, network=True, disk=True)
+    return time.time() - start, None, None
+
+
+def stage_render(paths, options):
+    '''
+    Draws CPU, memory, paging, network and disk charts of a parsed day
+    into a PNG image
+    '''
+    from sar import parser
+    from sar import viz
+    from sar.profiling import Profile
+    profile = Profile()
+    sar_info = parser.Parser(paths['day']).get_sar_info()
+    sar_viz = viz.Visualization(sar_info, paging=True, network=True,
+                                disk=True, profile=profile)
+    start = time.time()
+    sar_viz.save(paths['png'], output_type=viz.Visualization.PNG_OUTPUT)
+    return time.time() - start, None, profile
+
+
+def stage_render_workers(paths, options, workers=1):
+    '''
+    Draws charts of a parsed day (with CPU heatmap and busiest cores)
+    into a PNG image, in ``workers`` processes
+    '''
+    from sar import parser
+    from sar import viz
+    from sar.profiling import Profile
+    profile = Profile()
+    sar_info = parser.Parser(paths['day']).get_sar_info()
+    sar_viz = viz.Visualization(sar_info, paging=True, network=True,
+                                disk=True, cpu_heatmap=True, top_cpus=8,
+                                profile=profile, workers=workers)
+    start = time.time()
+    sar_viz.save(paths['png'], output_type=viz.Visualization.PNG_OUTPUT)
+    return time.time() - start, None, profile
+
+
+"""Benchmark stages, in order of execution. Each one is called with paths
+of generated files and command line options, and returns (seconds, bytes
+processed or ``None``, :class:`sar.profiling.Profile` or ``None``)"""
+STAGES = [
+    ('import_parser', stage_import_parser),
+    ('import_viz', stage_import_viz),
+    ('parse', stage_parse),
+    ('parse_stats_only', stage_parse_stats_only),
+    ('parse_windowed', stage_parse_windowed),
+    ('parse_rows', stage_parse_rows),
+    ('parse_compact', stage_parse_compact),
+    ('multiparse', stage_multiparse),
+    ('preprocess', stage_preprocess),
+    ('render', stage_render),
+]
+
+
+def run_stage(stage, paths, options, queue):
+    '''
+    Runs a single stage, in a child process
+    '''
+    try:
+        seconds, nbytes, profile = stage(paths, options)
+        result = {'seconds': seconds, 'bytes': nbytes,
+                  'peak_rss_kb': peak_rss_kb()}
+        if profile is not None:
+            result['breakdown'] = profile.as_dict()
+        queue.put(result)
+    except Exception:
+        queue.put({'error': traceback.format_exc()})
+
+
+def measure(name, stage, paths, options):
+    '''
+    Runs a stage ``options.repeat`` times, each in a fresh process, and
+    keeps the fastest run. Raises :class:`StageError` if the stage fails.
+    '''
+    best = None
+    for i in range(options.repeat):
+        queue = multiprocessing.Queue()
+        child = multiprocessing.Process(
+            target=run_stage, args=(stage, paths, options, queue))
+        child.start()
+        result = queue.get()
+        child.join()
+
+        if 'error' in result:
+            raise StageError('stage %s failed:\n%s' % (name, result['error']))
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+
+    if best['bytes']:
+        best['mb_per_s'] = best['bytes'] / best['seconds'] / 1e6
+    return best
+
+
+def git_revision():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                stderr=devnull).strip().decode()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def generate(options, workdir):
+    '''
+    Generates benchmark input files
+    '''
+    params = dict(cpus=options.cpus, ifaces=options.ifaces,
+                  disks=options.disks, interval=options.interval,
+                  ampm=options.ampm, restarts=options.restarts,
+                  seed=options.seed)
+    paths = {
+        'day': os.path.join(workdir, 'day.log'),
+        'combo': os.path.join(workdir, 'combo.log'),
+        'png': os.path.join(workdir, 'render.png'),
+    }
+
+    start = time.time()
+    generator.Generator(days=1, **params).generate(paths['day'])
+    generator.Generator(days=options.days, **params).generate(paths['combo'])
+
+    return paths, time.time() - start
+
+
+def report(results, baseline=None):
+    header = '%-18s %10s %10s %12s' % ('stage', 'seconds', 'MB/s',
+                                       'peak RSS kB')
+    if baseline:
+        header += ' %10s' % ('vs base',)
+    print(header)
+
+    names = [name for name, stage in STAGES]
+    # parse_workers_N and render_workers_N stages, by number of workers
+    names += sorted((name for name in results['stages'] if name not in names),
+                    key=lambda name: (name.rsplit('_', 1)[0],
+                                      int(name.rsplit('_', 1)[1])))
+
+    for name in names:
+        result = results['stages'].get(name)
+        if result is None:
+            continue
+        line = '%-18s %10.3f %10s %12d' % (
+            name, result['seconds'],
+            '%.2f' % result['mb_per_s'] if 'mb_per_s' in result else '-',
+            result['peak_rss_kb'])
+        base = (baseline or {}).get('stages', {}).get(name)
+        if base and 'seconds' in base:
+            line += ' %9.2fx' % (base['seconds'] / result['seconds'],)
+        print(line)
+        for part, figures in sorted(result.get('breakdown', {}).items()):
+            print('  %-16s %10.3f' % (part, figures['seconds']))
+
+
+def run(options, workdir):
+    '''
+    Generates input files in a work directory and measures selected stages
+        :return: ``Dictionary`` of results, saved as JSON by ``--output``
+    '''
+    paths, gen_seconds = generate(options, workdir)
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'params': dict((k, v) for k, v in vars(options).items()
+                       if k not in ('output', 'compare', 'stages',
+                                    'workers', 'render_workers')),
+        'input_bytes': {'day': os.path.getsize(paths['day']),
+                        'combo': os.path.getsize(paths['combo'])},
+        'generate_seconds': gen_seconds,
+        'stages': {},
+    }
+
+    selected = options.stages.split(',')
+    for name, stage in STAGES:
+        if name in selected:
+            results['stages'][name] = measure(name, stage, paths, options)
+    for workers in filter(None, options.workers.split(',')):
+        name = 'parse_workers_%s' % (workers,)
+        stage = functools.partial(stage_parse_workers, workers=int(workers))
+        results['stages'][name] = measure(name, stage, paths, options)
+    for workers in filter(None, options.render_workers.split(',')):
+        name = 'render_workers_%s' % (workers,)
+        stage = functools.partial(stage_render_workers, workers=int(workers))
+        results['stages'][name] = measure(name, stage, paths, options)
+
+    return results
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    argparser.add_argument('--cpus', type=int, default=16)
+    argparser.add_argument('--ifaces', type=int, default=4)
+    argparser.add_argument('--disks', type=int, default=4)
+    argparser.add_argument('--days', type=int, default=2)
+    argparser.add_argument('--interval', type=int, default=60,
+                           help='seconds between samples')
+    argparser.add_argument('--ampm', action='store_true',
+                           help='12hr AM/PM timestamps')
+    argparser.add_argument('--restarts', type=int, default=0,
+                           help='restarts per day')
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--repeat', type=int, default=3,
+                           help='runs per stage, fastest is kept')
+    argparser.add_argument('--stages', default=','.join(n for n, s in STAGES),
+                           help='comma separated stages to run')
+    argparser.add_argument('--workers', default='',
+                           help='comma separated worker counts to run '
+                           'parse_workers_N stages with, e.g. 1,2,4,8')
+    argparser.add_argument('--render-workers', default='',
+                           help='comma separated worker counts to run '
+                           'render_workers_N stages with, e.g. 1,2,4,8')
+    argparser.add_argument('--output', help='save results as JSON')
+    argparser.add_argument('--compare', help='JSON results to compare with')
+    options = argparser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='sarbench')
+    try:
+        results = run(options, workdir)
+    except StageError as exc:
+        # Don't report (or save as a baseline) results of a broken build
+        sys.stderr.write('%s\n' % (exc,))
+        sys.exit(1)
+    finally:
+        # Stages may leave files of their own behind
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as fhandle:
+            baseline = json.load(fhandle)
+
+    report(results, baseline)
+
+    if options.output:
+        with open(options.output, 'w') as fhandle:
+            json.dump(results, fhandle, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
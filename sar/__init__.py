@@ -19,6 +19,12 @@ PART_PAGING = 4
 """Network usage part of SAR file"""
 PART_NET = 5
 
+"""Names of SAR parts in the parsed output dictionary"""
+PART_NAMES = {
+    PART_CPU: 'cpu', PART_MEM: 'mem', PART_SWP: 'swap', PART_IO: 'io',
+    PART_PAGING: 'paging', PART_NET: 'net'
+}
+
 """CPU regexp pattern for detecting SAR section header"""
 PATTERN_CPU = ".*CPU.*(usr|user).*nice.*sys.*"
 
@@ -107,17 +113,34 @@ FIELD_PAIRS_NET = {
     'txcmp': FIELDS_NET[6], 'rxmcst': FIELDS_NET[7]
 }
 
+"""Numeric fields of each section of parsed SAR data"""
+SECTION_FIELDS = {
+    'cpu': sorted(FIELD_PAIRS_CPU.keys()),
+    'mem': sorted(FIELD_PAIRS_MEM.keys()),
+    'swap': sorted(FIELD_PAIRS_SWP.keys()),
+    'io': sorted(FIELD_PAIRS_IO.keys()),
+    'paging': sorted(FIELD_PAIRS_PAGING.keys()),
+    'net': sorted(f for f in FIELD_PAIRS_NET.keys() if f != 'iface')
+}
+
+"""Sections of parsed SAR data with one row per CPU / network interface"""
+ENTITY_SECTIONS = ('cpu', 'net')
+
 """Restart time regexp pattern for detecting SAR restart notices"""
 PATTERN_RESTART = ".*LINUX\ RESTART.*"
 
 """Pattern for splitting multiple combined SAR file"""
 PATTERN_MULTISPLIT = "Linux"
 
+"""Banner line starting each day in combined SAR file (multiline regexp)"""
+PATTERN_BANNER = "^Linux [^\n]*"
+
 """Split by date in multiday SAR file"""
 PATTERN_DATE = "[0-9][0-9][0-9][0-9]\-[0-9][0-9]\-[0-9][0-9]"
 
 __all__ = [
-    "PART_CPU", "PART_MEM", "PART_SWP", "PART_IO",
+    "PART_CPU", "PART_MEM", "PART_SWP", "PART_IO", "PART_PAGING", "PART_NET",
+    "PART_NAMES", "SECTION_FIELDS", "ENTITY_SECTIONS",
     "PATTERN_CPU", "PATTERN_MEM", "PATTERN_SWP", "PATTERN_IO",
-    "PATTERN_RESTART", "PATTERN_MULTISPLIT", "PATTERN_DATE"
+    "PATTERN_RESTART", "PATTERN_MULTISPLIT", "PATTERN_BANNER", "PATTERN_DATE"
 ]
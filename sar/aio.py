@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.aio` is a module containing :mod:`asyncio` variants of SAR file
+parsing, for use inside event-loop services (Python 3.5+ only).
+
+Parsing runs in an executor, so the event loop isn't blocked while files
+are parsed. With thread executors (the loop's default one, unless given)
+cancelling the awaiting task also stops parsing, before the next SAR part
+of the file. With process executors, parsing which already started runs
+to completion in its worker and its result is dropped.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+
+import sar.multiparser as sarmultiparse
+import sar.parser as sarparse
+
+
+def _load_in_process(factory, filename, kwargs):
+    '''
+    Creates parser and loads file, in a process executor's worker
+        :return: Loaded parser, ``None`` if loading failed
+    '''
+    parser = factory(filename, **kwargs)
+    if (not parser.load_file()):
+        return None
+    return parser
+
+
+async def _load(factory, filename, executor, limiter, kwargs):
+    '''
+    Creates parser and loads file in executor, holding limiter (if any)
+    while doing so
+        :return: Loaded parser, ``None`` if loading failed
+    '''
+    if (limiter is not None):
+        async with limiter:
+            return await _load(factory, filename, executor, None, kwargs)
+
+    loop = asyncio.get_event_loop()
+
+    if (isinstance(executor, ProcessPoolExecutor)):
+        return await loop.run_in_executor(
+            executor, _load_in_process, factory, filename, kwargs)
+
+    parser = factory(filename, **kwargs)
+    try:
+        loaded = await loop.run_in_executor(executor, parser.load_file)
+    except asyncio.CancelledError:
+        parser.cancel()
+        raise
+
+    if (not loaded):
+        return None
+    return parser
+
+
+async def load_file(filename, executor=None, limiter=None, **kwargs):
+    '''
+    Loads SAR format logfile in ASCII format (sarXX), see
+    :meth:`sar.parser.Parser.load_file`
+        :param filename: Name of the SAR output file
+        :type filename: str.
+        :param executor: Executor parsing runs in, loop's default if
+            ``None``
+        :type executor: ``concurrent.futures.Executor``
+        :param limiter: Held while parsing, to bound the number of files
+            being parsed at once
+        :type limiter: ``asyncio.Semaphore``
+        :param kwargs: Passed to :class:`sar.parser.Parser`
+        :return: Loaded :class:`sar.parser.Parser`, ``None`` if loading
+            failed
+    '''
+    return await _load(sarparse.Parser, filename, executor, limiter, kwargs)
+
+
+async def get_sar_info(filename, executor=None, limiter=None, **kwargs):
+    '''
+    Parses SAR format logfile, see :func:`load_file`
+        :return: ``Dictionary``-style list of SAR data, ``False`` if loading
+            failed (like :meth:`sar.parser.Parser.get_sar_info`)
+    '''
+    parser = await load_file(filename, executor, limiter, **kwargs)
+    if (parser is None):
+        return False
+    return parser.get_sar_info()
+
+
+async def load_combo_file(filename, executor=None, limiter=None, **kwargs):
+    '''
+    Loads combined SAR format logfile, see :func:`load_file`
+        :param kwargs: Passed to :class:`sar.multiparser.Multiparser`
+        :return: Loaded :class:`sar.multiparser.Multiparser`, ``None`` if
+            loading failed
+    '''
+    return await _load(sarmultiparse.Multiparser, filename, executor,
+                       limiter, kwargs)
+
+
+async def get_sar_infos(filenames, limit=4, executor=None, **kwargs):
+    '''
+    Parses many SAR format logfiles, at most ``limit`` of them at once
+        :param filenames: Names of SAR output files
+        :type filenames: ``List`` of str.
+        :param limit: Maximum number of files being parsed at once
+        :type limit: int.
+        :param executor: Executor parsing runs in, loop's default if
+            ``None``
+        :type executor: ``concurrent.futures.Executor``
+        :param kwargs: Passed to :class:`sar.parser.Parser`
+        :return: ``Dictionary`` of filename => SAR data (``False`` for
+            files which failed to load). Cancelling cancels parsing of all
+            files.
+    '''
+    limiter = asyncio.Semaphore(limit)
+    infos = await asyncio.gather(*[
+        get_sar_info(filename, executor, limiter, **kwargs)
+        for filename in filenames])
+
+    return dict(zip(filenames, infos))
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.archive` is a module containing append-only, memory-mapped
+columnar archive of SAR history of a single host.
+
+Each section (and CPU / network interface, for ``cpu`` and ``net``) is a
+directory holding ``ts.i8``, sorted seconds since epoch as little-endian
+64-bit integers, and one ``<field>.f8`` file of little-endian doubles per
+field, all with one entry per sample::
+
+    <archive>/mem/ts.i8
+    <archive>/mem/memused.f8
+    <archive>/cpu/all/ts.i8
+    <archive>/cpu/all/usr.f8
+
+Files are memory-mapped on first use, so opening an archive costs nothing
+and reads only touch pages of the requested time range.
+'''
+
+from sar import SECTION_FIELDS, ENTITY_SECTIONS
+from sar.timeutil import parse_date, time_to_seconds, to_epoch
+import numpy as np
+import os
+
+"""Data type of the time index files"""
+TIME_DTYPE = np.dtype('<i8')
+
+"""Data type of field column files"""
+FIELD_DTYPE = np.dtype('<f8')
+
+"""Name of the time index file"""
+TIME_FILE = 'ts.i8'
+
+"""Extension of field column files"""
+FIELD_EXT = '.f8'
+
+
+class Archive(object):
+    '''
+    Columnar archive of SAR data of a single host
+        :param path: Directory of the archive, created on first append
+        :type path: str.
+    '''
+
+    def __init__(self, path):
+
+        self.path = path
+        '''Directory of the archive'''
+        self.__maps = {}
+        '''Column file path => (size, memory map) of already mapped files'''
+
+    def append_parser(self, parser):
+        '''
+        Appends data parsed by SAR parser to the archive
+            :param parser: Parser of a SAR file
+            :type parser: :class:`sar.parser.Parser`
+            :return: Number of appended samples, ``False`` if parsing failed
+        '''
+        sar_info = parser.get_sar_info()
+        if (sar_info is False):
+            return False
+
+        return self.append(parse_date(parser.get_filedate()), sar_info)
+
+    def append(self, date, sar_info):
+        '''
+        Appends parsed SAR data of a single day to the archive. Samples not
+        newer than the last archived sample of a section are skipped, so
+        appending the same day twice is harmless.
+            :param date: Day the data was recorded on
+            :type date: ``datetime.date``
+            :param sar_info: ``Dictionary``-style SAR data, as returned by
+                :meth:`sar.parser.Parser.get_sar_info`
+            :return: Number of appended samples
+        '''
+        if (date is None):
+            raise ValueError('Unknown date of SAR data')
+
+        midnight = to_epoch(date)
+        appended = 0
+
+        for section, fieldnames in SECTION_FIELDS.items():
+            samples = sar_info.get(section)
+            if (not samples):
+                continue
+
+            full_times = sorted(samples.keys())
+            times = [midnight + time_to_seconds(t) for t in full_times]
+
+            if (section in ENTITY_SECTIONS):
+                entities = set()
+                for sample in samples.values():
+                    entities.update(sample.keys())
+                for entity in entities:
+                    rows = [samples[t].get(entity) for t in full_times]
+                    appended += self.__append_rows(
+                        self.__column_dir(section, entity), fieldnames,
+                        times, rows)
+            else:
+                rows = [samples[t] for t in full_times]
+                appended += self.__append_rows(
+                    self.__column_dir(section), fieldnames, times, rows)
+
+        return appended
+
+    def read(self, section, fields=None, start=None, end=None, entity=None):
+        '''
+        Reads archived data of a section over a time range. Returned arrays
+        are views of the memory-mapped files, nothing is copied.
+            :param section: Name of SAR section (``cpu``, ``mem``, ...)
+            :type section: str.
+            :param fields: Field names to return, all by default
+            :type fields: list.
+            :param start: Start of range (inclusive), ``datetime`` or
+                seconds since epoch
+            :param end: End of range (exclusive), ``datetime`` or seconds
+                since epoch
+            :param entity: CPU id / interface name, required for ``cpu``
+                and ``net``
+            :type entity: str.
+            :return: ``Dictionary`` of columns (``numpy.ndarray``), ``ts``
+                with seconds since epoch and one per field
+        '''
+        if (section not in SECTION_FIELDS):
+            raise ValueError('Unknown SAR section: %s' % (section,))
+        if (section in ENTITY_SECTIONS and entity is None):
+            raise ValueError('Section %s needs an entity (%s)' %
+                             (section, ', '.join(self.entities(section))))
+
+        if (fields is None):
+            fields = SECTION_FIELDS[section]
+
+        column_dir = self.__column_dir(section, entity)
+        times = self.__map(os.path.join(column_dir, TIME_FILE), TIME_DTYPE)
+
+        # Time index length is authoritative, field columns may be ahead of
+        # it if an append was interrupted
+        first = 0
+        last = len(times)
+        if (start is not None):
+            first = int(np.searchsorted(times, to_epoch(start), 'left'))
+        if (end is not None):
+            last = int(np.searchsorted(times, to_epoch(end), 'left'))
+
+        columns = {'ts': times[first:last]}
+        for fieldname in fields:
+            if (fieldname not in SECTION_FIELDS[section]):
+                raise ValueError('Unknown field %s in section %s' %
+                                 (fieldname, section))
+            column = self.__map(
+                os.path.join(column_dir, fieldname + FIELD_EXT), FIELD_DTYPE)
+            columns[fieldname] = column[first:last]
+
+        return columns
+
+    def entities(self, section):
+        '''
+        Returns CPU ids / interface names archived for a section
+            :param section: ``cpu`` or ``net``
+            :type section: str.
+            :return: ``List`` of entity names
+        '''
+        section_dir = os.path.join(self.path, section)
+        if (not os.path.isdir(section_dir)):
+            return []
+
+        return sorted(os.listdir(section_dir))
+
+    def __column_dir(self, section, entity=None):
+        '''
+        Returns directory holding columns of a section (and entity)
+        '''
+        if (entity is None):
+            return os.path.join(self.path, section)
+
+        return os.path.join(self.path, section, entity)
+
+    def __append_rows(self, column_dir, fieldnames, times, rows):
+        '''
+        Appends rows of a single section / entity, skipping missing rows and
+        rows not newer than what is already archived
+            :return: Number of appended rows
+        '''
+        time_path = os.path.join(column_dir, TIME_FILE)
+        stored = self.__map(time_path, TIME_DTYPE)
+        last_time = stored[-1] if len(stored) else None
+
+        kept_times = []
+        kept_rows = []
+        for ts, row in zip(times, rows):
+            if (row is not None and (last_time is None or ts > last_time)):
+                kept_times.append(ts)
+                kept_rows.append(row)
+
+        if (not kept_times):
+            return 0
+
+        if (not os.path.isdir(column_dir)):
+            os.makedirs(column_dir)
+
+        # Fields first, time index last: readers never see rows whose
+        # fields were not written yet
+        for fieldname in fieldnames:
+            column = np.array(
+                [row.get(fieldname, np.nan) for row in kept_rows],
+                dtype=FIELD_DTYPE)
+            field_path = os.path.join(column_dir, fieldname + FIELD_EXT)
+            field_size = len(stored) * FIELD_DTYPE.itemsize
+            if (os.path.exists(field_path) and
+                    os.path.getsize(field_path) != field_size):
+                # Drop leftovers of an interrupted append
+                self.__maps.pop(field_path, None)
+                with open(field_path, 'r+b') as fhandle:
+                    fhandle.truncate(field_size)
+            with open(field_path, 'ab') as fhandle:
+                fhandle.write(column.tobytes())
+
+        with open(time_path, 'ab') as fhandle:
+            fhandle.write(np.array(kept_times, dtype=TIME_DTYPE).tobytes())
+
+        return len(kept_times)
+
+    def __map(self, path, dtype):
+        '''
+        Returns read-only memory map of a column file, remapped if the file
+        grew since it was mapped
+            :return: ``numpy.ndarray``, empty if file doesn't exist
+        '''
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+
+        if (size < dtype.itemsize):
+            return np.zeros(0, dtype=dtype)
+
+        try:
+            mapped_size, mapped = self.__maps[path]
+            if (mapped_size == size):
+                return mapped
+        except KeyError:
+            pass
+
+        mapped = np.memmap(path, dtype=dtype, mode='r',
+                           shape=(size // dtype.itemsize,))
+        self.__maps[path] = (size, mapped)
+
+        return mapped
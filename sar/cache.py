@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.cache` is a module containing in-process caches for parsed SAR
+data and rendered charts.
+
+Services creating a parser for each request can take parsers with loaded
+data from the process-wide cache instead, so a file is parsed again only
+when it changes (or was dropped to keep the cache under its size)::
+
+    from sar import cache
+
+    insar = cache.get_parser('./data/sample.log')
+    cache.parsers.stats()  # hits, misses, evictions, entries, bytes
+'''
+
+from collections import OrderedDict
+from sar import ENTITY_SECTIONS
+import os
+import sys
+import threading
+
+"""Estimated bytes of parsed data kept by the process-wide parser cache"""
+PARSE_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def file_identity(filename):
+    '''
+    Returns identity of a file, which changes whenever the file does
+        :param filename: Name of the file
+        :type filename: str.
+        :return: (absolute path, inode, size, mtime) ``tuple``
+    '''
+    filestat = os.stat(filename)
+
+    return (os.path.abspath(filename), filestat.st_ino, filestat.st_size,
+            filestat.st_mtime)
+
+
+def estimate_size(sar_info):
+    '''
+    Estimates memory taken by parsed SAR data, from sizes of the first
+    sample of each section
+        :param sar_info: ``Dictionary``-style SAR data, as returned by
+            :meth:`sar.parser.Parser.get_sar_info`
+        :return: Estimated number of bytes
+    '''
+    if (not sar_info):
+        return 0
+
+    size = sys.getsizeof(sar_info)
+    for section, samples in sar_info.items():
+        if (not samples):
+            continue
+        full_time, sample = next(iter(samples.items()))
+        if (section in ENTITY_SECTIONS):
+            sample_size = sys.getsizeof(sample) + sum(
+                _row_size(row) for row in sample.values())
+        else:
+            sample_size = _row_size(sample)
+        size += sys.getsizeof(samples) + len(samples) * (
+            sys.getsizeof(full_time) + sample_size)
+
+    return size
+
+
+def parser_size(parser):
+    '''
+    Estimates memory taken by a parser with loaded data
+        :param parser: Parser
+        :type parser: :class:`sar.parser.Parser`
+        :return: Estimated number of bytes
+    '''
+    return estimate_size(parser.get_sar_info())
+
+
+def _row_size(row):
+    '''
+    Returns size of a row with its values
+    '''
+    return sys.getsizeof(row) + sum(sys.getsizeof(value)
+                                    for value in row.values())
+
+
+class _Flight(object):
+    '''
+    Value being loaded by one thread, waited for by others
+    '''
+
+    def __init__(self):
+
+        self.done = threading.Event()
+        '''Set once value is loaded (or loading failed)'''
+        self.value = None
+        '''Loaded value'''
+        self.error = None
+        '''Exception loading raised'''
+
+
+class LRUCache(object):
+    '''
+    Thread-safe cache dropping least recently used entries once it holds
+    more than ``maxsize`` of them, or more than ``maxbytes`` of estimated
+    size
+        :param maxsize: Maximum number of entries, None for no limit
+        :type maxsize: int.
+        :param maxbytes: Maximum estimated size of entries, None for no
+            limit. Values larger than that aren't kept at all.
+        :type maxbytes: int.
+        :param sizeof: Estimates size of a value in bytes,
+            ``sys.getsizeof`` by default
+    '''
+
+    def __init__(self, maxsize=16, maxbytes=None, sizeof=None):
+
+        self.maxsize = maxsize
+        '''Maximum number of entries'''
+        self.maxbytes = maxbytes
+        '''Maximum estimated size of entries'''
+        self.sizeof = sizeof or sys.getsizeof
+        '''Estimates size of a value'''
+        self.hits = 0
+        '''Number of lookups finding their key (or waiting for another
+           thread loading it)'''
+        self.misses = 0
+        '''Number of lookups not finding their key'''
+        self.evictions = 0
+        '''Number of entries dropped to keep the cache under its limits'''
+        self.nbytes = 0
+        '''Estimated size of entries'''
+        self._entries = OrderedDict()
+        '''Key => (value, estimated size), least recently used first'''
+        self._flights = {}
+        '''Key => :class:`_Flight` of values being loaded'''
+        self._lock = threading.Lock()
+        '''Guards entries, flights and counters'''
+
+    def get(self, key, default=None):
+        '''
+        Returns cached value, marking it as recently used
+            :param key: Cache key
+            :param default: Returned when key is not cached
+        '''
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        '''
+        Caches value, dropping least recently used entries over the limits
+            :param key: Cache key
+            :param value: Value to cache
+        '''
+        size = self.sizeof(value)
+
+        with self._lock:
+            self.__put(key, value, size)
+
+    def get_or_load(self, key, load):
+        '''
+        Returns cached value, loading and caching it if it is not cached.
+        Concurrent calls for the same key load it only once, the others
+        wait for it (and get the exception if loading fails).
+            :param key: Cache key
+            :param load: Called without arguments to load the value
+            :return: Cached or loaded value
+        '''
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[0]
+
+            flight = self._flights.get(key)
+            loading = flight is None
+            if (loading):
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if (not loading):
+            flight.done.wait()
+            if (flight.error is not None):
+                raise flight.error
+            return flight.value
+
+        loaded = False
+        try:
+            flight.value = load()
+            size = self.sizeof(flight.value)
+            loaded = True
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            # Waiters must be woken up whatever happened, even on
+            # KeyboardInterrupt or SystemExit
+            with self._lock:
+                del self._flights[key]
+                if (loaded):
+                    self.__put(key, flight.value, size)
+            flight.done.set()
+
+        return flight.value
+
+    def stats(self):
+        '''
+        Returns cache counters
+            :return: ``Dictionary`` with ``hits``, ``misses``,
+                ``evictions``, ``entries`` and ``bytes`` (estimated size of
+                entries)
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.nbytes}
+
+    def clear(self):
+        '''
+        Drops all entries
+        '''
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __put(self, key, value, size):
+        '''
+        Caches value, lock must be held
+        '''
+        previous = self._entries.pop(key, None)
+        if (previous is not None):
+            self.nbytes -= previous[1]
+        self._entries[key] = (value, size)
+        self.nbytes += size
+
+        while (self._entries and (
+                (self.maxsize is not None and
+                 len(self._entries) > self.maxsize) or
+                (self.maxbytes is not None and
+                 self.nbytes > self.maxbytes))):
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted[1]
+            self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+"""Process-wide cache of parsers with loaded data, see :func:`get_parser`"""
+parsers = LRUCache(maxsize=None, maxbytes=PARSE_CACHE_BYTES,
+                   sizeof=parser_size)
+
+
+def get_parser(filename, **options):
+    '''
+    Returns parser with loaded data of a SAR file from the process-wide
+    cache, parsing the file if it changed since it was cached. Concurrent
+    calls for the same file and options parse it once.
+        :param filename: SAR ASCII file
+        :type filename: str.
+        :param options: Keyword arguments of :class:`sar.parser.Parser`,
+            part of the cache key (lists and sets are keyed as tuples, other
+            values must be hashable)
+        :return: :class:`sar.parser.Parser`, ``False`` if parsing failed
+            (failures aren't cached)
+    '''
+    key = file_identity(filename) + (tuple(sorted(
+        (name, _hashable(value)) for name, value in options.items())),)
+
+    try:
+        return parsers.get_or_load(
+            key, lambda: _load_parser(filename, options))
+    except _ParseFailed:
+        return False
+
+
+def _hashable(value):
+    '''
+    Returns option value usable in a cache key
+    '''
+    if (isinstance(value, (list, tuple))):
+        return tuple(_hashable(item) for item in value)
+    if (isinstance(value, (set, frozenset))):
+        return tuple(sorted(_hashable(item) for item in value))
+
+    return value
+
+
+class _ParseFailed(Exception):
+    '''
+    Parser failed to load data of a file
+    '''
+
+
+def _load_parser(filename, options):
+    '''
+    Creates parser of a file and loads its data
+    '''
+    import sar.parser as sarparse
+
+    parser = sarparse.Parser(filename, **options)
+    if (parser.get_sar_info() is False):
+        raise _ParseFailed(filename)
+
+    return parser
@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.canvas` is a module writing SAR charts as a self-contained,
+interactive HTML page.
+
+Series are embedded as base64-encoded little-endian typed arrays
+(``Float32Array`` for values, ``Float64Array`` for times) and drawn on
+``<canvas>`` elements. The page builds a min/max pyramid of every series
+once, so each redraw touches a few values per pixel column, no matter how
+many samples are zoomed into view. Scroll zooms, dragging pans and
+double-click resets all charts at once.
+'''
+
+from array import array
+import base64
+import calendar
+import json
+import sys
+import time
+
+from sar.timeutil import time_to_seconds
+
+"""Marker replaced with chart data in :data:`TEMPLATE`"""
+DATA_MARKER = '/*SARVIZ_DATA*/'
+
+"""Marker replaced with page title in :data:`TEMPLATE`"""
+TITLE_MARKER = '/*SARVIZ_TITLE*/'
+
+"""HTML page, with plotting code"""
+TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>/*SARVIZ_TITLE*/</title>
+<style>
+body { font-family: sans-serif; margin: 1em 2em; }
+h2 { font-size: 1em; margin: 1.2em 0 .2em 0; }
+.legend span { margin-right: 1em; font-size: .8em; }
+.legend i { display: inline-block; width: .8em; height: .8em;
+            margin-right: .3em; }
+canvas { display: block; width: 100%; height: 220px; cursor: crosshair; }
+#readout { font-size: .85em; color: #555; min-height: 1.2em;
+           position: sticky; top: 0; background: #fff; }
+</style>
+</head>
+<body>
+<div id="readout">Scroll to zoom, drag to pan, double-click to reset</div>
+<div id="panels"></div>
+<script type="application/json" id="sarviz-data">/*SARVIZ_DATA*/</script>
+<script>
+(function () {
+'use strict';
+
+var COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+              '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'];
+var PAD = {left: 64, right: 12, top: 8, bottom: 20};
+
+var data = JSON.parse(document.getElementById('sarviz-data').textContent);
+
+function decode(b64, Type) {
+  var raw = atob(b64), bytes = new Uint8Array(raw.length);
+  for (var i = 0; i < raw.length; i++) {
+    bytes[i] = raw.charCodeAt(i);
+  }
+  return new Type(bytes.buffer);
+}
+
+function nanmin(a, b) { return a !== a ? b : (b !== b ? a : Math.min(a, b)); }
+function nanmax(a, b) { return a !== a ? b : (b !== b ? a : Math.max(a, b)); }
+
+// Level k holds min and max of every 2^k consecutive samples
+function pyramid(values) {
+  var levels = [{min: values, max: values}], prev = levels[0];
+  while (prev.min.length > 1) {
+    var len = prev.min.length, n = Math.ceil(len / 2);
+    var min = new Float32Array(n), max = new Float32Array(n);
+    for (var i = 0; i < n; i++) {
+      var a = 2 * i, b = Math.min(a + 1, len - 1);
+      min[i] = nanmin(prev.min[a], prev.min[b]);
+      max[i] = nanmax(prev.max[a], prev.max[b]);
+    }
+    prev = {min: min, max: max};
+    levels.push(prev);
+  }
+  return levels;
+}
+
+// Min and max of samples falling into each pixel column of the view
+function envelope(levels, i0, i1, width) {
+  var per = (i1 - i0) / width;
+  var k = Math.min(Math.max(0, Math.floor(Math.log(per) / Math.LN2)),
+                   levels.length - 1);
+  var level = levels[k], size = Math.pow(2, k);
+  var min = new Float32Array(width), max = new Float32Array(width);
+  for (var px = 0; px < width; px++) {
+    var a = Math.max(0, Math.floor((i0 + px * per) / size));
+    var b = Math.min(Math.ceil((i0 + (px + 1) * per) / size),
+                     level.min.length);
+    var lo = NaN, hi = NaN;
+    for (var j = a; j < b; j++) {
+      lo = nanmin(lo, level.min[j]);
+      hi = nanmax(hi, level.max[j]);
+    }
+    min[px] = lo;
+    max[px] = hi;
+  }
+  return {min: min, max: max};
+}
+
+var times = decode(data.time.values, Float64Array);
+var count = times.length;
+var view = {i0: 0, i1: Math.max(count - 1, 1)};
+
+function pad2(v) { return (v < 10 ? '0' : '') + v; }
+
+function label(i) {
+  var t = times[Math.max(0, Math.min(count - 1, Math.round(i)))];
+  if (data.time.epoch) {
+    return new Date(t * 1000).toISOString().replace('T', ' ').slice(0, 19);
+  }
+  return pad2(Math.floor(t / 3600)) + ':' + pad2(Math.floor(t / 60) % 60) +
+    ':' + pad2(t % 60);
+}
+
+var panels = data.panels.map(function (spec) {
+  var series = spec.series.map(function (s) {
+    return {label: s.label, values: decode(s.values, Float32Array)};
+  });
+  if (spec.stacked) {
+    for (var i = 1; i < series.length; i++) {
+      var below = series[i - 1].values, values = series[i].values;
+      for (var j = 0; j < count; j++) {
+        values[j] += below[j];
+      }
+    }
+  }
+  series.forEach(function (s) { s.levels = pyramid(s.values); });
+
+  var title = document.createElement('h2');
+  title.textContent = spec.title + ' (' + spec.ylabel + ')';
+  var legend = document.createElement('div');
+  legend.className = 'legend';
+  series.forEach(function (s, i) {
+    var item = document.createElement('span'), swatch = document.createElement('i');
+    swatch.style.background = COLORS[i % COLORS.length];
+    item.appendChild(swatch);
+    item.appendChild(document.createTextNode(s.label));
+    legend.appendChild(item);
+  });
+  var canvas = document.createElement('canvas');
+  var root = document.getElementById('panels');
+  root.appendChild(title);
+  root.appendChild(legend);
+  root.appendChild(canvas);
+
+  return {spec: spec, series: series, canvas: canvas};
+});
+
+function draw(panel) {
+  var canvas = panel.canvas, ratio = window.devicePixelRatio || 1;
+  canvas.width = canvas.clientWidth * ratio;
+  canvas.height = canvas.clientHeight * ratio;
+  var ctx = canvas.getContext('2d');
+  ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+  var w = canvas.clientWidth - PAD.left - PAD.right;
+  var h = canvas.clientHeight - PAD.top - PAD.bottom;
+  if (w < 1 || h < 1) {
+    return;
+  }
+
+  var i0 = view.i0, i1 = view.i1, span = i1 - i0, raw = span <= w;
+  var lo = panel.spec.stacked ? 0 : NaN, hi = NaN;
+  var shapes = panel.series.map(function (s) {
+    var shape;
+    if (raw) {
+      var a = Math.max(0, Math.floor(i0)), b = Math.min(count - 1, Math.ceil(i1));
+      shape = {a: a, b: b, values: s.values};
+      for (var j = a; j <= b; j++) {
+        lo = nanmin(lo, s.values[j]);
+        hi = nanmax(hi, s.values[j]);
+      }
+    } else {
+      shape = envelope(s.levels, i0, i1, Math.floor(w));
+      for (var px = 0; px < shape.min.length; px++) {
+        lo = nanmin(lo, shape.min[px]);
+        hi = nanmax(hi, shape.max[px]);
+      }
+    }
+    return shape;
+  });
+  if (lo !== lo) { lo = 0; hi = 1; }
+  if (hi === lo) { hi = lo + 1; }
+
+  function y(v) { return PAD.top + h - (v - lo) / (hi - lo) * h; }
+  function x(i) { return PAD.left + (i - i0) / span * w; }
+
+  ctx.clearRect(0, 0, canvas.clientWidth, canvas.clientHeight);
+  ctx.font = '10px sans-serif';
+  ctx.fillStyle = '#555';
+  ctx.strokeStyle = '#ddd';
+  ctx.lineWidth = 1;
+  ctx.textAlign = 'right';
+  for (var t = 0; t <= 4; t++) {
+    var v = lo + (hi - lo) * t / 4;
+    ctx.beginPath();
+    ctx.moveTo(PAD.left, y(v));
+    ctx.lineTo(PAD.left + w, y(v));
+    ctx.stroke();
+    ctx.fillText(+v.toPrecision(4), PAD.left - 4, y(v) + 3);
+  }
+  ctx.textAlign = 'center';
+  for (t = 0; t <= 5; t++) {
+    ctx.fillText(label(i0 + span * t / 5),
+                 Math.min(Math.max(PAD.left + w * t / 5, PAD.left + 50),
+                          PAD.left + w - 50),
+                 PAD.top + h + 14);
+  }
+
+  ctx.save();
+  ctx.beginPath();
+  ctx.rect(PAD.left, PAD.top, w, h);
+  ctx.clip();
+  // Stacked series are filled down to the axis, topmost first
+  var order = shapes.map(function (s, i) { return i; });
+  if (panel.spec.stacked) {
+    order.reverse();
+  }
+  order.forEach(function (i) {
+    var shape = shapes[i], color = COLORS[i % COLORS.length];
+    var first = null, last = null, pen = false;
+    ctx.beginPath();
+    function point(px, v) {
+      if (v !== v) {
+        pen = false;
+        return;
+      }
+      if (pen) {
+        ctx.lineTo(px, y(v));
+      } else {
+        ctx.moveTo(px, y(v));
+        pen = true;
+      }
+      if (first === null) { first = px; }
+      last = px;
+    }
+    if (raw) {
+      for (var j = shape.a; j <= shape.b; j++) {
+        point(x(j), shape.values[j]);
+      }
+    } else {
+      for (var px = 0; px < shape.min.length; px++) {
+        point(PAD.left + px, shape.max[px]);
+        point(PAD.left + px, shape.min[px]);
+      }
+    }
+    if (panel.spec.stacked && first !== null) {
+      ctx.lineTo(last, y(lo));
+      ctx.lineTo(first, y(lo));
+      ctx.closePath();
+      ctx.fillStyle = color;
+      ctx.fill();
+    } else {
+      ctx.strokeStyle = color;
+      ctx.stroke();
+    }
+  });
+  ctx.restore();
+}
+
+var pending = false;
+function redraw() {
+  if (!pending) {
+    pending = true;
+    window.requestAnimationFrame(function () {
+      pending = false;
+      panels.forEach(draw);
+    });
+  }
+}
+
+function position(canvas, event) {
+  var rect = canvas.getBoundingClientRect();
+  var w = rect.width - PAD.left - PAD.right;
+  return view.i0 + (event.clientX - rect.left - PAD.left) / w *
+    (view.i1 - view.i0);
+}
+
+function clamp() {
+  var span = Math.min(Math.max(view.i1 - view.i0, 2), Math.max(count - 1, 1));
+  view.i0 = Math.min(Math.max(view.i0, 0), Math.max(count - 1 - span, 0));
+  view.i1 = view.i0 + span;
+}
+
+var drag = null;
+panels.forEach(function (panel) {
+  var canvas = panel.canvas;
+  canvas.addEventListener('wheel', function (event) {
+    event.preventDefault();
+    var at = position(canvas, event);
+    var factor = event.deltaY < 0 ? 0.8 : 1.25;
+    view.i0 = at - (at - view.i0) * factor;
+    view.i1 = at + (view.i1 - at) * factor;
+    clamp();
+    redraw();
+  });
+  canvas.addEventListener('mousedown', function (event) {
+    drag = {x: event.clientX, i0: view.i0, i1: view.i1,
+            width: canvas.clientWidth - PAD.left - PAD.right};
+  });
+  canvas.addEventListener('dblclick', function () {
+    view.i0 = 0;
+    view.i1 = Math.max(count - 1, 1);
+    redraw();
+  });
+  canvas.addEventListener('mousemove', function (event) {
+    var i = Math.max(0, Math.min(count - 1, Math.round(position(canvas, event))));
+    var text = label(i) + '  ' + panel.spec.title + ': ';
+    text += panel.series.map(function (s, k) {
+      var v = s.values[i];
+      if (panel.spec.stacked && k > 0) {
+        v -= panel.series[k - 1].values[i];
+      }
+      return s.label + ' ' + (+v.toPrecision(4));
+    }).join(', ');
+    document.getElementById('readout').textContent = text;
+  });
+});
+window.addEventListener('mousemove', function (event) {
+  if (drag) {
+    var shift = (drag.x - event.clientX) / drag.width * (drag.i1 - drag.i0);
+    view.i0 = drag.i0 + shift;
+    view.i1 = drag.i1 + shift;
+    clamp();
+    redraw();
+  }
+});
+window.addEventListener('mouseup', function () { drag = null; });
+window.addEventListener('resize', redraw);
+redraw();
+})();
+</script>
+</body>
+</html>
+'''
+
+
+def encode_array(values, typecode='f'):
+    '''
+    Encodes numbers as base64 string of a little-endian typed array
+        :param values: Numbers, ``None`` for missing ones
+        :param typecode: :mod:`array` type code, ``f`` (``Float32Array``)
+            or ``d`` (``Float64Array``)
+        :type typecode: str.
+        :return: str.
+    '''
+    nan = float('nan')
+    packed = array(typecode, [nan if v is None else v for v in values])
+    if (sys.byteorder != 'little'):
+        packed.byteswap()
+    if (hasattr(packed, 'tobytes')):
+        raw = packed.tobytes()
+    else:
+        raw = packed.tostring()
+
+    return base64.b64encode(raw).decode('ascii')
+
+
+def time_values(time_points):
+    '''
+    Converts time points of SAR data into numbers
+        :param time_points: Sorted ``HH:MM:SS`` or ``YYYY-MM-DD HH:MM:SS``
+            time points
+        :return: (epoch, values) ``tuple``, values being seconds since
+            midnight, or since epoch if ``epoch`` is ``True``
+    '''
+    if (time_points and len(time_points[0]) > 8):
+        return (True, [calendar.timegm(time.strptime(tp, '%Y-%m-%d %H:%M:%S'))
+                       for tp in time_points])
+
+    return (False, [time_to_seconds(tp) for tp in time_points])
+
+
+def write_html(output, time_points, panels, title='SAR report'):
+    '''
+    Writes charts as interactive HTML page
+        :param output: Name of the output file, or file-like object opened
+            for writing bytes
+        :param time_points: Sorted time points of SAR data
+        :param panels: ``(title, ylabel, stacked, [(label, values), ...])``
+            per chart, values being aligned with time points
+        :param title: Page title
+        :type title: str.
+    '''
+    epoch, times = time_values(time_points)
+    payload = {
+        'time': {'epoch': epoch, 'values': encode_array(times, 'd')},
+        'panels': [{
+            'title': panel_title,
+            'ylabel': ylabel,
+            'stacked': stacked,
+            'series': [{'label': label, 'values': encode_array(values)}
+                       for label, values in series],
+        } for panel_title, ylabel, stacked, series in panels],
+    }
+    # "</" can't appear inside <script>, JSON allows escaping it
+    data = json.dumps(payload).replace('</', '<\\/')
+    escaped_title = title.replace('&', '&amp;').replace('<', '&lt;')
+    page = TEMPLATE.replace(TITLE_MARKER, escaped_title) \
+        .replace(DATA_MARKER, data).encode('utf-8')
+
+    if (hasattr(output, 'write')):
+        output.write(page)
+    else:
+        with open(output, 'wb') as fhandle:
+            fhandle.write(page)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.dayindex` is a module containing index of days in combined SAR
+files, where outputs of many days are concatenated into one file.
+
+Days are found by sysstat banner lines (``Linux <kernel> (<host>) <date>
+...``) at line starts only, so "LINUX RESTART" notices, interface aliases
+or hostnames containing "Linux" don't split days. On request, the index
+is saved in a sidecar file next to the combined file (``<filename>.idx``)
+and reused as long as the combined file doesn't change.
+'''
+
+from sar import PATTERN_BANNER
+from sar.timeutil import parse_date
+import datetime
+import mmap
+import os
+import re
+
+"""Suffix of sidecar index files"""
+INDEX_SUFFIX = '.idx'
+
+"""First line of sidecar index files, followed by size and mtime of the
+indexed file"""
+INDEX_HEADER = '# sarviz day index'
+
+
+class DayIndex(object):
+    '''
+    Index of days in combined SAR file
+        :param filename: Name of the combined SAR output file
+        :type filename: str.
+        :param sidecar: Read and write index from/to sidecar file
+        :type sidecar: bool.
+    '''
+
+    def __init__(self, filename, sidecar=False):
+
+        self.filename = filename
+        '''Name of the combined SAR output file'''
+        self.sidecar = sidecar
+        '''Whether index is kept in sidecar file'''
+        self.entries = []
+        '''``List`` of (ISO date, offset, length) of days, in file order'''
+
+    def load(self):
+        '''
+        Loads index from sidecar file, or builds it (and saves it to
+        sidecar file) if there is none or it is stale
+            :return: ``List`` of (ISO date, offset, length) of days
+        '''
+        filestat = os.stat(self.filename)
+        identity = '%d %r' % (filestat.st_size, filestat.st_mtime)
+
+        entries = None
+        if (self.sidecar):
+            entries = self.__read_sidecar(identity)
+        if (entries is None):
+            entries = self.build()
+            if (self.sidecar):
+                self.__write_sidecar(identity, entries)
+
+        self.entries = entries
+        return entries
+
+    def build(self):
+        '''
+        Scans combined file for banner lines
+            :return: ``List`` of (ISO date, offset, length) of days
+        '''
+        banner_re = re.compile(PATTERN_BANNER.encode('ascii'), re.M)
+        starts = []
+
+        with open(self.filename, 'rb') as fhandle:
+            try:
+                sarmap = mmap.mmap(fhandle.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file can't be mapped
+                return []
+
+            try:
+                size = sarmap.size()
+                for match in banner_re.finditer(sarmap):
+                    info = match.group(0).decode('ascii', 'replace').split()
+                    if (len(info) < 4):
+                        continue
+                    date = parse_date(info[3])
+                    if (date is not None):
+                        starts.append((date.isoformat(), match.start()))
+            finally:
+                sarmap.close()
+
+        entries = []
+        for i, (date, offset) in enumerate(starts):
+            end = starts[i + 1][1] if i + 1 < len(starts) else size
+            entries.append((date, offset, end - offset))
+
+        return entries
+
+    def select(self, start=None, end=None):
+        '''
+        Returns index entries of days within a date range
+            :param start: First day, ``datetime.date`` or ISO date string
+            :param end: Last day (inclusive), ``datetime.date`` or ISO date
+                string
+            :return: ``List`` of (ISO date, offset, length) of days
+        '''
+        if (isinstance(start, datetime.date)):
+            start = start.isoformat()
+        if (isinstance(end, datetime.date)):
+            end = end.isoformat()
+
+        return [entry for entry in self.entries
+                if ((start is None or entry[0] >= start) and
+                    (end is None or entry[0] <= end))]
+
+    def __sidecar_name(self):
+        return self.filename + INDEX_SUFFIX
+
+    def __read_sidecar(self, identity):
+        '''
+        Reads index from sidecar file
+            :return: ``List`` of entries, ``None`` if sidecar file is
+                missing, broken or was written for different file contents
+        '''
+        try:
+            with open(self.__sidecar_name(), 'r') as fhandle:
+                lines = fhandle.read().splitlines()
+        except (IOError, OSError):
+            return None
+
+        if (not lines or lines[0] != '%s %s' % (INDEX_HEADER, identity)):
+            return None
+
+        entries = []
+        try:
+            for line in lines[1:]:
+                date, offset, length = line.split()
+                entries.append((date, int(offset), int(length)))
+        except ValueError:
+            return None
+
+        return entries
+
+    def __write_sidecar(self, identity, entries):
+        '''
+        Writes index to sidecar file, atomically. Failing to write it (e.g.
+        read-only directory) is not an error, index is just rebuilt next
+        time.
+        '''
+        filename = self.__sidecar_name()
+        tempname = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            with open(tempname, 'w') as fhandle:
+                fhandle.write('%s %s\n' % (INDEX_HEADER, identity))
+                for entry in entries:
+                    fhandle.write('%s %d %d\n' % entry)
+            os.rename(tempname, filename)
+        except (IOError, OSError):
+            if (os.path.exists(tempname)):
+                os.unlink(tempname)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.export` is a module containing streaming export of parsed SAR
+data as newline delimited JSON (one object per row), for log pipelines.
+
+Rows are written as they are decoded (see
+:meth:`sar.parser.Parser.iter_rows`), so memory stays bounded and first
+rows come out right away. Each line looks like::
+
+    {"date": "2016-08-20", "entity": "all", "fields": {"usr": 1.5, ...},
+     "host": "j-login1", "section": "cpu", "time": "2016-08-20T11:40:25",
+     "ts": 1471693225}
+
+``ts`` is seconds since epoch of the wall clock time SAR recorded, taken
+as if it was UTC, like in :mod:`sar.store`. ``entity`` is left out for
+sections without CPUs / interfaces. Run in a pipeline with::
+
+    sar -A -f /var/log/sa/sa20 | python -m sar.export - > sa20.ndjson
+'''
+
+from sar.timeutil import parse_date, time_to_seconds, to_epoch
+import sar.parser as sarparse
+import argparse
+import errno
+import json
+import os
+import sys
+
+"""Default number of bytes collected before writing them out"""
+BUFFER_SIZE = 64 * 1024
+
+
+def iter_records(parser, sections=None, fhandle=None):
+    '''
+    Yields rows of SAR data as JSON-ready ``dict``s, as they are decoded
+        :param parser: Parser of the SAR file
+        :type parser: :class:`sar.parser.Parser`
+        :param sections: Names of sections to export, all by default
+        :type sections: list.
+        :param fhandle: File object to read SAR output from instead of the
+            parser's file, see :meth:`sar.parser.Parser.iter_rows`
+        :return: Generator of ``Dictionary``s
+    '''
+    date = None
+    midnight = None
+    host = None
+
+    for section, full_time, entity, row in parser.iter_rows(
+            sections=sections, fhandle=fhandle):
+        if (host is None):
+            # Banner line has been read by now
+            host = parser.get_hostname() or None
+            date = parse_date(parser.get_filedate())
+            if (date is not None):
+                midnight = to_epoch(date)
+                date = date.isoformat()
+
+        record = {'host': host, 'date': date, 'section': section,
+                  'fields': dict(row.items())}
+        if (midnight is not None):
+            record['ts'] = midnight + time_to_seconds(full_time)
+            record['time'] = '%sT%s' % (date, full_time)
+        else:
+            record['ts'] = None
+            record['time'] = full_time
+        if (entity is not None):
+            record['entity'] = entity
+
+        yield record
+
+
+def write_ndjson(parser, output, sections=None, fhandle=None,
+                 buffer_size=BUFFER_SIZE):
+    '''
+    Writes rows of SAR data to a file as newline delimited JSON, as they
+    are decoded. Lines are collected and written (and flushed) in chunks of
+    about ``buffer_size`` bytes.
+        :param parser: Parser of the SAR file
+        :type parser: :class:`sar.parser.Parser`
+        :param output: File object to write to (e.g. ``sys.stdout``)
+        :param sections: Names of sections to export, all by default
+        :type sections: list.
+        :param fhandle: File object to read SAR output from instead of the
+            parser's file
+        :param buffer_size: Bytes collected before writing them out
+        :type buffer_size: int.
+        :return: Number of written rows
+    '''
+    encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+    chunk = []
+    chunk_size = 0
+    count = 0
+
+    for record in iter_records(parser, sections, fhandle):
+        line = encoder.encode(record) + '\n'
+        chunk.append(line)
+        chunk_size += len(line)
+        count += 1
+        if (chunk_size >= buffer_size):
+            output.write(''.join(chunk))
+            output.flush()
+            chunk = []
+            chunk_size = 0
+
+    if (chunk):
+        output.write(''.join(chunk))
+    output.flush()
+
+    return count
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(
+        description='Export SAR ASCII file as newline delimited JSON')
+    argparser.add_argument('filename', help='SAR file, - for stdin')
+    argparser.add_argument('--sections',
+                           help='comma separated sections (cpu, mem, ...)')
+    argparser.add_argument('--output', help='output file, stdout by default')
+    argparser.add_argument('--window', type=int,
+                           help='bytes of SAR file read at once')
+    options = argparser.parse_args(argv)
+
+    sections = None
+    if (options.sections):
+        sections = options.sections.split(',')
+
+    if (options.filename == '-'):
+        parser = sarparse.Parser(window=options.window)
+        fhandle = sys.stdin
+    else:
+        parser = sarparse.Parser(options.filename, window=options.window)
+        fhandle = None
+
+    output = sys.stdout
+    if (options.output):
+        output = open(options.output, 'w')
+    try:
+        write_ndjson(parser, output, sections, fhandle)
+        output.flush()
+    except IOError as error:
+        # Reader went away (e.g. ``| head``), stop writing quietly
+        if (error.errno != errno.EPIPE or output is not sys.stdout):
+            raise
+        # Python flushes stdout again on exit, don't fail there too
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
+    finally:
+        if (output is not sys.stdout):
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.generator` is a module generating synthetic ``sar -A`` ASCII
+output, for benchmarking and testing on data of any size.
+
+Output mimics ``sar -A -f <file>`` of sysstat: banner line per day, each
+activity section listing all samples of the day, "LINUX RESTART" notices
+(with repeated section headers) for restarts and "Average:" rows at the
+end of each section. Values are random but plausible, and reproducible
+for the same seed.
+'''
+
+import datetime
+import random
+
+"""Kernel version printed in generated banner lines"""
+KERNEL = '3.10.0-957.el7.x86_64'
+
+"""Total memory of generated machines, in kB"""
+MEM_TOTAL = 16 * 1024 * 1024
+
+"""Total swap of generated machines, in kB"""
+SWAP_TOTAL = 4 * 1024 * 1024
+
+
+class Generator(object):
+    '''
+    Generator of synthetic SAR output
+        :param cpus: Number of CPUs
+        :type cpus: int.
+        :param ifaces: Number of network interfaces (besides ``lo``)
+        :type ifaces: int.
+        :param disks: Number of block devices
+        :type disks: int.
+        :param days: Number of days (banner + sections each)
+        :type days: int.
+        :param interval: Seconds between samples
+        :type interval: int.
+        :param ampm: Use 12hr AM/PM timestamps instead of 24hr ones
+        :type ampm: bool.
+        :param restarts: Number of restarts per day, evenly spread
+        :type restarts: int.
+        :param start_date: Date of the first day
+        :type start_date: ``datetime.date``
+        :param hostname: Host name printed in banner lines
+        :type hostname: str.
+        :param seed: Seed of random values
+        :type seed: int.
+    '''
+
+    def __init__(self, cpus=4, ifaces=2, disks=2, days=1, interval=600,
+                 ampm=False, restarts=0, start_date=datetime.date(2016, 8, 20),
+                 hostname='sarbench', seed=0):
+
+        self.cpus = cpus
+        self.ifaces = ['lo'] + ['eth%d' % (i,) for i in range(ifaces)]
+        self.disks = ['dev8-%d' % (i * 16,) for i in range(disks)]
+        self.days = days
+        self.interval = interval
+        self.ampm = ampm
+        self.restarts = restarts
+        self.start_date = start_date
+        self.hostname = hostname
+        self.seed = seed
+
+        self.__random = random.Random(seed)
+        self.__timestamps = {}
+        '''Seconds since midnight => formatted timestamp cache'''
+
+    def write(self, out):
+        '''
+        Writes generated SAR output
+            :param out: File-like object to write to
+        '''
+        for day in range(self.days):
+            date = self.start_date + datetime.timedelta(days=day)
+            self.__write_day(out, date)
+
+    def generate(self, filename):
+        '''
+        Writes generated SAR output to a file
+            :param filename: Name of the output file
+            :type filename: str.
+            :return: Size of written file, in bytes
+        '''
+        with open(filename, 'w') as out:
+            self.write(out)
+            return out.tell()
+
+    def segments(self):
+        '''
+        Returns sample times of a day, split into segments by restarts
+            :return: ``List`` of ``List`` of seconds since midnight
+        '''
+        times = list(range(self.interval, 86400, self.interval))
+        segments = []
+        step = len(times) // (self.restarts + 1)
+        for i in range(self.restarts + 1):
+            segment = times[i * step:(i + 1) * step if i < self.restarts
+                            else len(times)]
+            if (i > 0):
+                # Box is down for the sample it restarted at
+                segment = segment[1:]
+            if (segment):
+                segments.append(segment)
+
+        return segments
+
+    def __timestamp(self, seconds):
+        '''
+        Formats SAR timestamp
+            :param seconds: Seconds since midnight
+            :return: ``HH:MM:SS`` or ``HH:MM:SS AM`` timestamp
+        '''
+        try:
+            return self.__timestamps[seconds]
+        except KeyError:
+            hours = seconds // 3600
+            rest = (seconds // 60 % 60, seconds % 60)
+            if (self.ampm):
+                stamp = '%02d:%02d:%02d %s' % (
+                    (hours % 12) or 12, rest[0], rest[1],
+                    'AM' if hours < 12 else 'PM')
+            else:
+                stamp = '%02d:%02d:%02d' % ((hours,) + rest)
+            self.__timestamps[seconds] = stamp
+            return stamp
+
+    def __average_label(self):
+        '''
+        Returns label of "Average:" rows, padded like timestamps
+        '''
+        return 'Average:' + ' ' * (3 if self.ampm else 0)
+
+    def __write_day(self, out, date):
+        '''
+        Writes SAR output of a single day
+        '''
+        out.write('Linux %s (%s) \t%s \t_x86_64_\t(%d CPU)\n\n' % (
+            KERNEL, self.hostname, date.strftime('%m/%d/%Y'), self.cpus))
+
+        cpu_entities = ['all'] + [str(i) for i in range(self.cpus)]
+        sections = [
+            ('CPU', ['%usr', '%nice', '%sys', '%iowait', '%steal', '%irq',
+                     '%soft', '%guest', '%idle'], cpu_entities, self.__cpu),
+            (None, ['proc/s', 'cswch/s'], None, self.__rates(2, 5000.0)),
+            (None, ['pswpin/s', 'pswpout/s'], None, self.__rates(2, 10.0)),
+            (None, ['pgpgin/s', 'pgpgout/s', 'fault/s', 'majflt/s',
+                    'pgfree/s', 'pgscank/s', 'pgscand/s', 'pgsteal/s',
+                    '%vmeff'], None, self.__rates(9, 2000.0)),
+            (None, ['tps', 'rtps', 'wtps', 'bread/s', 'bwrtn/s'], None,
+             self.__rates(5, 500.0)),
+            (None, ['kbmemfree', 'kbmemused', '%memused', 'kbbuffers',
+                    'kbcached', 'kbcommit', '%commit'], None, self.__mem),
+            (None, ['kbswpfree', 'kbswpused', '%swpused', 'kbswpcad',
+                    '%swpcad'], None, self.__swap),
+            ('DEV', ['tps', 'rd_sec/s', 'wr_sec/s', 'avgrq-sz', 'avgqu-sz',
+                     'await', 'svctm', '%util'], self.disks,
+             self.__rates(8, 100.0)),
+            ('IFACE', ['rxpck/s', 'txpck/s', 'rxkB/s', 'txkB/s', 'rxcmp/s',
+                       'txcmp/s', 'rxmcst/s'], self.ifaces,
+             self.__rates(7, 1000.0)),
+        ]
+
+        segments = self.segments()
+        for entity_column, columns, entities, values in sections:
+            self.__write_section(out, segments, entity_column, columns,
+                                 entities, values)
+
+    def __write_section(self, out, segments, entity_column, columns,
+                        entities, values):
+        '''
+        Writes a single activity section of a day
+        '''
+        header_columns = ([entity_column] if entity_column else []) + columns
+        header = ''.join('%10s' % (c,) for c in header_columns)
+        row_entities = entities or [None]
+        sums = dict((entity, [0.0] * len(columns)) for entity in row_entities)
+        count = 0
+        int_columns = [False] * len(columns)
+        write = out.write
+
+        for i, segment in enumerate(segments):
+            if (i > 0):
+                write('\n%s       LINUX RESTART\n\n' %
+                      (self.__timestamp(segment[0] - self.interval),))
+            write('%s%s\n' % (self.__timestamp(segment[0] - self.interval),
+                              header))
+
+            for seconds in segment:
+                stamp = self.__timestamp(seconds)
+                count += 1
+                for entity in row_entities:
+                    row = values(entity)
+                    entity_sums = sums[entity]
+                    for j, value in enumerate(row):
+                        entity_sums[j] += value
+                    if (count == 1):
+                        int_columns = [isinstance(v, int) for v in row]
+                    write('%s%s%s\n' % (
+                        stamp, '%10s' % (entity,) if entity else '',
+                        ''.join(self.__format(v) for v in row)))
+
+        write('\n%s%s\n' % (self.__average_label(), header))
+        for entity in row_entities:
+            write('%s%s%s\n' % (
+                self.__average_label(), '%10s' % (entity,) if entity else '',
+                ''.join(self.__format(int(s / max(count, 1)) if is_int
+                                      else s / max(count, 1))
+                        for s, is_int in zip(sums[entity], int_columns))))
+        write('\n')
+
+    def __format(self, value):
+        '''
+        Formats a single value column, the way SAR does (counters in kB
+        are integers, everything else has two decimals)
+        '''
+        if (isinstance(value, int)):
+            return '%10d' % (value,)
+        return '%10.2f' % (value,)
+
+    def __cpu(self, entity):
+        '''
+        Generates CPU usage row, percentages adding up to 100
+        '''
+        rand = self.__random.random
+        usr = rand() * 60
+        sys = rand() * 20
+        iowait = rand() * 10
+        soft = rand()
+        return [usr, 0.0, sys, iowait, 0.0, 0.0, soft, 0.0,
+                100.0 - usr - sys - iowait - soft]
+
+    def __rates(self, width, scale):
+        '''
+        Returns generator of rows of random rates
+            :param width: Number of columns
+            :param scale: Maximum value
+        '''
+        rand = self.__random.random
+
+        def rates(entity):
+            return [rand() * scale for i in range(width)]
+
+        return rates
+
+    def __mem(self, entity):
+        '''
+        Generates memory usage row
+        '''
+        used = int(MEM_TOTAL * (0.3 + self.__random.random() * 0.6))
+        buffers = used // 20
+        cached = used // 3
+        commit = used + used // 4
+        return [MEM_TOTAL - used, used, used * 100.0 / MEM_TOTAL, buffers,
+                cached, commit, commit * 100.0 / (MEM_TOTAL + SWAP_TOTAL)]
+
+    def __swap(self, entity):
+        '''
+        Generates swap usage row
+        '''
+        used = int(SWAP_TOTAL * self.__random.random() * 0.1)
+        return [SWAP_TOTAL - used, used, used * 100.0 / SWAP_TOTAL,
+                used // 10, 10.0]
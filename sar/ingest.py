@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.ingest` is a module containing ingestion of many, possibly
+overlapping, SAR files of many hosts into one time-sorted columnar series
+per host and section.
+
+Host and date of each file are taken from its banner line. Every ingested
+day of a section is kept as a run sorted by (timestamp, entity), runs are
+combined with a k-way merge and samples with the same timestamp (and
+entity) are kept only once, from the file ingested first.
+
+Timestamps are seconds since epoch of the wall clock time SAR recorded,
+taken as if it was UTC, like in :mod:`sar.store`.
+'''
+
+from sar import SECTION_FIELDS, ENTITY_SECTIONS
+from sar.timeutil import parse_date, time_to_seconds, to_epoch
+import sar.multiparser as sarmultiparse
+import sar.parser as sarparse
+import heapq
+
+
+class Ingester(object):
+    '''
+    Merges SAR files of many hosts into time-sorted columnar series
+        :param resample: Fold samples into buckets of this length while
+            parsing, see :class:`sar.parser.Parser`
+        :type resample: int. or str.
+        :param agg: How samples in a bucket are folded, see
+            :class:`sar.parser.Parser`
+        :type agg: str.
+    '''
+
+    def __init__(self, resample=None, agg='mean'):
+
+        self.resample = resample
+        '''Resampling interval passed to parsers'''
+        self.agg = agg
+        '''Resampling aggregation passed to parsers'''
+        self.files = []
+        '''``List`` of (filename, host, ISO dates) of ingested files'''
+        self.duplicates = {}
+        '''(host, section) => number of samples dropped by last merge as
+           duplicates'''
+
+        self.__runs = {}
+        '''Host => section => ``List`` of sorted runs of (ts, entity,
+           sequence, sample)'''
+        self.__sequence = 0
+        '''Number of ingested days, orders runs with same timestamps'''
+
+    def add_file(self, filename, host=None, combined=False):
+        '''
+        Parses and adds a SAR file
+            :param filename: SAR ASCII file
+            :type filename: str.
+            :param host: Host name, taken from SAR file banner if not given
+            :type host: str.
+            :param combined: File contains several days of SAR output, see
+                :class:`sar.multiparser.Multiparser`
+            :type combined: bool.
+            :return: (host, ``List`` of ISO dates) of added data, ``False``
+                if parsing failed
+        '''
+        insar = sarparse.Parser(filename, resample=self.resample,
+                                agg=self.agg)
+        if (host is None):
+            host = insar.get_hostname()
+        if (not host):
+            return False
+
+        days = []
+        if (combined):
+            combo = sarmultiparse.Multiparser(
+                filename, resample=self.resample, agg=self.agg)
+            if (not combo.load_file()):
+                return False
+            for datestr, sar_info in combo.get_sar_info().items():
+                days.append((parse_date(datestr), sar_info))
+        else:
+            sar_info = insar.get_sar_info()
+            if (sar_info is False):
+                return False
+            days.append((parse_date(insar.get_filedate()), sar_info))
+
+        dates = []
+        for date, sar_info in sorted(days, key=lambda day: day[0]):
+            self.add_sar_info(host, date, sar_info)
+            dates.append(date.isoformat())
+
+        self.files.append((filename, host, dates))
+
+        return (host, dates)
+
+    def add_sar_info(self, host, date, sar_info):
+        '''
+        Adds parsed SAR data of a single day
+            :param host: Host name
+            :type host: str.
+            :param date: Day the data was recorded on
+            :type date: ``datetime.date``
+            :param sar_info: ``Dictionary``-style SAR data, as returned by
+                :meth:`sar.parser.Parser.get_sar_info`
+        '''
+        if (date is None):
+            raise ValueError('Unknown date of SAR data for host %s' % (host,))
+
+        midnight = to_epoch(date)
+        sequence = self.__sequence
+        self.__sequence += 1
+        sections = self.__runs.setdefault(host, {})
+
+        for section in SECTION_FIELDS:
+            samples = sar_info.get(section)
+            if (not samples):
+                continue
+
+            if (section in ENTITY_SECTIONS):
+                run = [(midnight + time_to_seconds(full_time), entity,
+                        sequence, row)
+                       for full_time, sample in samples.items()
+                       for entity, row in sample.items()]
+            else:
+                run = [(midnight + time_to_seconds(full_time), '', sequence,
+                        sample)
+                       for full_time, sample in samples.items()]
+            # (ts, entity, sequence) is unique, samples are never compared
+            run.sort()
+            sections.setdefault(section, []).append(run)
+
+    def hosts(self):
+        '''
+        Returns names of hosts with added data
+            :return: ``List`` of host names
+        '''
+        return sorted(self.__runs.keys())
+
+    def merge(self, host, section, fields=None):
+        '''
+        Merges all added data of a host's section into one series
+            :param host: Host name
+            :type host: str.
+            :param section: Name of SAR section (``cpu``, ``mem``, ...)
+            :type section: str.
+            :param fields: Field names to return, all by default
+            :type fields: list.
+            :return: ``Dictionary`` of columns (``list``), ``ts`` with
+                seconds since epoch, ``entity`` (for ``cpu`` and ``net``)
+                and one per field, ordered by time, like
+                :meth:`sar.store.Store.query` returns
+        '''
+        if (section not in SECTION_FIELDS):
+            raise ValueError('Unknown SAR section: %s' % (section,))
+        if (fields is None):
+            fields = SECTION_FIELDS[section]
+
+        runs = self.__runs.get(host, {}).get(section, [])
+        timestamps = []
+        entities = []
+        values = [[] for fieldname in fields]
+        duplicates = 0
+        last = None
+
+        for ts, entity, sequence, row in heapq.merge(*runs):
+            if (last is not None and last[0] == ts and last[1] == entity):
+                duplicates += 1
+                continue
+            last = (ts, entity)
+
+            timestamps.append(ts)
+            entities.append(entity)
+            for column, fieldname in zip(values, fields):
+                column.append(row.get(fieldname))
+
+        self.duplicates[(host, section)] = duplicates
+
+        columns = dict(zip(fields, values))
+        columns['ts'] = timestamps
+        if (section in ENTITY_SECTIONS):
+            columns['entity'] = entities
+
+        return columns
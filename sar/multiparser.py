@@ -15,11 +15,12 @@ files where multiple files are merged into one huge file.
 '''
 
 import sar.parser as sarparse
-from sar import PATTERN_MULTISPLIT
+from sar.dayindex import DayIndex
+from sar.resample import parse_interval
+from sar.timeutil import parse_date, time_to_seconds, seconds_to_time
 import mmap
 import os
 import traceback
-from types import StringType
 
 
 class Multiparser(object):
@@ -27,17 +28,48 @@ class Multiparser(object):
     Multifile parser for SAR files. Derives from SAR Parser class
         :param filename: Name of the SAR output file, with combined data
         :type filename: str.
+        :param resample: Fold samples of each day into buckets of this
+            length while parsing, see :class:`sar.parser.Parser`
+        :type resample: int. or str.
+        :param agg: How samples in a bucket are folded, see
+            :class:`sar.parser.Parser`
+        :type agg: str.
+        :param start: First day to load, ``datetime.date`` or ISO date
+            string, ``None`` for first day in file
+        :param end: Last day to load (inclusive), ``None`` for last day in
+            file
+        :param sidecar: Keep index of days in sidecar file next to the
+            combined file (so it is written only on request), see
+            :mod:`sar.dayindex`
+        :type sidecar: bool.
     '''
 
-    def __init__(self, combo_filename=''):
+    def __init__(self, combo_filename='', resample=None, agg='mean',
+                 start=None, end=None, sidecar=False):
 
         self.__sarinfos = {}
         '''Dictionary for multiple dictionaries from
            :class:`com.nimium.sys.util.sar.parser.Parser`'''
-        self.__splitpointers = []
-        '''List of pointers inside combo file where each file starts'''
+        self.__hostnames = {}
+        '''Date => hostname, from banner line of each day'''
+        self.__dayindex = None
+        '''Index of days inside combo file'''
+        self.__start = start
+        '''First day to load'''
+        self.__end = end
+        '''Last day to load'''
+        self.__sidecar = sidecar
+        '''Whether index of days is kept in sidecar file'''
         self.__filename = combo_filename
         '''SAR output filename to be parsed'''
+        self.__resample = resample
+        '''Resampling interval passed to each day's parser'''
+        self.__agg = agg
+        '''Resampling aggregation passed to each day's parser'''
+        self.__parser = None
+        '''Parser of the day being parsed'''
+        self.__cancelled = False
+        '''Whether parsing was cancelled, see :meth:`cancel`'''
 
         return None
 
@@ -47,36 +79,70 @@ class Multiparser(object):
             :return: ``True`` if loading and parsing of file went fine, \
             ``False`` if it failed (at any point)
         '''
-        daychunks = self.__split_file()
+        days = self.__split_file()
 
-        if (daychunks):
+        if (days):
 
-            maxcount = len(self.__splitpointers)
-            for i in range(maxcount):
-                start = self.__splitpointers[i]
-                end = None
-                if (i < (maxcount - 1)):
-                    end = self.__splitpointers[i + 1]
+            fhandle = open(self.__filename, 'rb')
+            sarmap = mmap.mmap(fhandle.fileno(), 0, access=mmap.ACCESS_READ)
 
-                chunk = self.__get_chunk(start, end)
+            try:
+                for date, offset, length in days:
+                    if (self.__cancelled):
+                        return False
+
+                    chunk = sarmap[offset:offset + length]
+
+                    parser = self.__parser = sarparse.Parser(
+                        resample=self.__resample, agg=self.__agg)
+                    if (self.__cancelled):
+                        return False
+                    cpu_usage, mem_usage, swp_usage, io_usage, paging_stats, \
+                        net_usage = parser._parse_file(parser._split_file(chunk))
+                    self.__parser = None
+                    if (self.__cancelled):
+                        return False
+
+                    part = sarparse.decode_text(chunk)
+                    datevalue = self.__get_part_date(part)
+                    self.__hostnames[datevalue] = \
+                        self.__get_part_hostname(part)
+                    self.__sarinfos[datevalue] = {
+                        "cpu": cpu_usage,
+                        "mem": mem_usage,
+                        "swap": swp_usage,
+                        "io": io_usage,
+                        "paging": paging_stats,
+                        "net": net_usage
+                    }
+                    del(cpu_usage)
+                    del(mem_usage)
+                    del(swp_usage)
+                    del(io_usage)
+                    del(paging_stats)
+                    del(net_usage)
+                    del(parser)
+                    del(part)
+                    del(chunk)
+
+            finally:
+                sarmap.close()
+                fhandle.close()
 
-                parser = sarparse.Parser()
-                cpu_usage, mem_usage, swp_usage, io_usage = \
-                    parser._parse_file(parser._split_file(chunk))
+            return(True)
 
-                self.__sarinfos[self.__get_part_date(chunk)] = {
-                    "cpu": cpu_usage,
-                    "mem": mem_usage,
-                    "swap": swp_usage,
-                    "io": io_usage
-                }
-                del(cpu_usage)
-                del(mem_usage)
-                del(swp_usage)
-                del(io_usage)
-                del(parser)
+        return False
 
-            return(True)
+    def cancel(self):
+        '''
+        Cancels parsing, which may be running in another thread. Parsing
+        stops before the next SAR part and :meth:`load_file` returns
+        ``False``.
+        '''
+        self.__cancelled = True
+        parser = self.__parser
+        if (parser is not None):
+            parser.cancel()
 
     def get_sar_info(self):
         '''
@@ -85,97 +151,90 @@ class Multiparser(object):
         '''
         return self.__sarinfos
 
-    def __get_chunk(self, start=0, end=None):
+    def get_hostnames(self):
         '''
-        Gets chunk from the sar combo file, from start to end
-            :param start: where to start a pulled chunk
-            :type start: int.
-            :param end: where to end a pulled chunk
-            :type end: int.
-            :return: str.
+        Returns hostnames of the machine each day was recorded on
+            :return: ``Dictionary`` of date (as keys of
+                :meth:`get_sar_info`) => hostname, as found in banner line
+                of the day
         '''
-        piece = False
-
-        if (self.__filename and os.access(self.__filename, os.R_OK)):
-
-            fhandle = None
+        return self.__hostnames
 
-            try:
-                fhandle = os.open(self.__filename, os.O_RDONLY)
-            except OSError:
-                print(("Couldn't open file %s" % (self.__filename)))
-                fhandle = None
-
-            if (fhandle):
-
-                try:
-                    sarmap = mmap.mmap(fhandle, length=0, prot=mmap.PROT_READ)
-                except (TypeError, IndexError):
-                    os.close(fhandle)
-                    traceback.print_exc()
-                    #sys.exit(-1)
-                    return False
-
-                if (not end):
-                    end = sarmap.size()
-
-                try:
-                    sarmap.seek(start)
-                    piece = sarmap.read(end - start)
-                except:
-                    traceback.print_exc()
-
-            os.close(fhandle)
+    def get_rollup(self, section, fieldname, entity=None):
+        '''
+        Returns values of a single field across all days, as one series
+        ordered by date and time. With ``resample`` set, buckets of all days
+        share the same grid and missing buckets are filled with ``None``,
+        so the series can be charted as is.
+            :param section: Name of SAR section (``cpu``, ``mem``, ...)
+            :type section: str.
+            :param fieldname: Name of the field (``usr``, ``memused``, ...)
+            :type fieldname: str.
+            :param entity: CPU id / interface name for ``cpu`` and ``net``
+            :type entity: str.
+            :return: ``List`` of (``YYYY-MM-DD HH:MM:SS``, value) tuples
+        '''
+        days = []
+        for datestr, sarinfo in self.__sarinfos.items():
+            date = parse_date(datestr)
+            if (date is not None and sarinfo.get(section)):
+                days.append((date, sarinfo[section]))
+        days.sort()
+
+        if (not days):
+            return []
+
+        interval = None
+        if (self.__resample is not None):
+            interval = parse_interval(self.__resample)
+
+        rollup = []
+        for date, samples in days:
+            if (interval is None):
+                full_times = sorted(samples.keys())
+            else:
+                # Whole day grid on first and last day is trimmed to data
+                seconds = [time_to_seconds(t) for t in samples.keys()]
+                start = 0 if date != days[0][0] else min(seconds)
+                end = 86400 if date != days[-1][0] else max(seconds) + 1
+                full_times = [seconds_to_time(s)
+                              for s in range(start, end, interval)]
+
+            for full_time in full_times:
+                value = None
+                row = samples.get(full_time)
+                if (row is not None and entity is not None):
+                    row = row.get(entity)
+                if (row is not None):
+                    value = row.get(fieldname)
+                rollup.append(('%s %s' % (date.isoformat(), full_time),
+                               value))
+
+        return rollup
+
+    def get_days(self):
+        '''
+        Returns days found in the combo file, whether loaded or not
+            :return: ``List`` of (ISO date, offset, length) of days, in
+                file order
+        '''
+        if (self.__dayindex is None):
+            self.__dayindex = DayIndex(self.__filename, self.__sidecar)
+            self.__dayindex.load()
 
-        return(piece)
+        return self.__dayindex.entries
 
     def __split_file(self):
         '''
-        Splits combined SAR output file (in ASCII format) in order to
-        extract info we need for it, in the format we want.
-            :return: ``List``-style of SAR file sections separated by
-                the type of info they contain (SAR file sections) without
-                parsing what is exactly what at this point
+        Finds days to load in combined SAR output file, by its index of
+        days (built if needed)
+            :return: ``List`` of (ISO date, offset, length) of days within
+                requested date range, ``False`` if file can't be read
         '''
         # Filename passed checks through __init__
         if (self.__filename and os.access(self.__filename, os.R_OK)):
-
-            fhandle = None
-
-            try:
-                fhandle = os.open(self.__filename, os.O_RDONLY)
-            except OSError:
-                print(("Couldn't open file %s" % (self.__filename)))
-                fhandle = None
-
-            if (fhandle):
-
-                try:
-                    sarmap = mmap.mmap(fhandle, length=0, prot=mmap.PROT_READ)
-                except (TypeError, IndexError):
-                    os.close(fhandle)
-                    traceback.print_exc()
-                    #sys.exit(-1)
-                    return False
-
-            sfpos = sarmap.find(PATTERN_MULTISPLIT, 0)
-
-            while (sfpos > -1):
-
-                '''Split by day found'''
-                self.__splitpointers.append(sfpos)
-
-                # Iterate for new position
-                try:
-                    sfpos = sarmap.find(PATTERN_MULTISPLIT, (sfpos + 1))
-                except ValueError:
-                    print("ValueError on mmap.find()")
-                    return True
-
-            if (self.__splitpointers):
-                # Not sure if this will work - if empty set
-                # goes back as True here
-                return True
+            self.get_days()
+            return self.__dayindex.select(self.__start, self.__end)
 
         return False
 
@@ -187,7 +246,7 @@ class Multiparser(object):
             :type part: str.
             :return: string containing date in ISO format (YYY-MM-DD)
         '''
-        if (type(part) is not StringType):
+        if (not isinstance(part, str)):
             # We can cope with strings only
             return False
 
@@ -207,3 +266,17 @@ class Multiparser(object):
             datevalue = False
 
         return(datevalue)
+
+    def __get_part_hostname(self, part=''):
+        '''
+        Retrieves hostname of the combo part from its banner line
+            :param part: Part of the combo file (parsed out whole SAR file
+                from the combo
+            :type part: str.
+            :return: Hostname, ``''`` if banner line has none
+        '''
+        info = part.split("\n", 1)[0].split()
+        if (len(info) < 3):
+            return ''
+
+        return info[2].strip('()')
@@ -6,19 +6,121 @@
    Parses SAR ASCII output only, not binary files!
 '''
 
-from sar import PART_CPU, PART_MEM, PART_SWP, PART_IO, PART_PAGING, PART_NET, \
-    PATTERN_CPU, PATTERN_MEM, PATTERN_SWP, PATTERN_IO, PATTERN_PAGING, PATTERN_NET, PATTERN_RESTART, \
+from sar import PART_CPU, PART_MEM, PART_SWP, PART_IO, PART_PAGING, PART_NET, PART_NAMES, \
+    PATTERN_BANNER, PATTERN_CPU, PATTERN_MEM, PATTERN_SWP, PATTERN_IO, PATTERN_PAGING, PATTERN_NET, PATTERN_RESTART, \
     FIELDS_CPU, FIELD_PAIRS_CPU, FIELDS_MEM, FIELD_PAIRS_MEM, FIELDS_SWP, \
     FIELD_PAIRS_SWP, FIELDS_IO, FIELD_PAIRS_IO, FIELDS_PAGING, FIELD_PAIRS_PAGING, \
     FIELDS_NET, FIELD_PAIRS_NET
+from sar.stats import Summary
+from sar.resample import Resampler, parse_interval
+from sar.profiling import NULL_PROFILE
+from sar.records import RECORDS, EntityRows, intern
+from sar.timeutil import MERIDIEMS, clock_to_seconds, seconds_to_time, \
+    time_to_seconds
+from bisect import bisect_left, bisect_right
+from fnmatch import fnmatchcase
 import mmap
 import os
 import re
 import traceback
 import logging
-from types import ListType
 import platform
 
+"""Compiled header regexps of SAR parts, in order blocks are matched"""
+PART_PATTERNS = [
+    (PART_CPU, re.compile(PATTERN_CPU)), (PART_MEM, re.compile(PATTERN_MEM)),
+    (PART_SWP, re.compile(PATTERN_SWP)), (PART_IO, re.compile(PATTERN_IO)),
+    (PART_PAGING, re.compile(PATTERN_PAGING)),
+    (PART_NET, re.compile(PATTERN_NET))
+]
+
+"""Compiled regexp of restart notices"""
+RESTART_PATTERN = re.compile(PATTERN_RESTART)
+
+"""Compiled regexp of SAR banner line"""
+BANNER_PATTERN = re.compile(PATTERN_BANNER)
+
+"""Size of windows rows are streamed from, if ``window`` isn't given"""
+STREAM_WINDOW = 64 * 1024
+
+"""Number of distinct timestamps conversions are cached for, per part"""
+TIME_KEYS_LIMIT = 4096
+
+"""Number of distinct values compact rows share conversions of, per part"""
+VALUES_LIMIT = 65536
+
+"""Regexp of SAR block header lines, first non-empty lines of the file and
+after empty lines"""
+PATTERN_BLOCK_HEADER = re.compile(br'(?:\A|\n\n)\n*([^\n]+)')
+
+"""Kinds of pools sections are decoded in, see ``workers`` of
+:class:`Parser`"""
+POOLS = ('process', 'thread')
+
+"""Default size of row ranges large sections are split into, in bytes"""
+DEFAULT_SPLIT_SIZE = 4 * 1024 * 1024
+
+
+def decode_text(data):
+    '''
+    Returns text of data read from a file (or its memory map), which is
+    ``bytes`` on Python 3 and already text on Python 2
+        :param data: Data read from a file
+        :return: ``str``
+    '''
+    if (isinstance(data, str)):
+        return data
+    return data.decode('utf-8', 'replace')
+
+
+class PartState(object):
+    '''
+    State of a SAR part (section) being decoded, possibly fed in pieces
+        :param part_type: Value of a constant which tells us which SAR part
+            is decoded
+        :param pattern_re: Compiled header line regexp of the part
+        :param fields: ``Dictionary`` of field regexp => column index
+        :param pairs: ``Dictionary`` of field name => field regexp
+        :param resampler: :class:`sar.resample.Resampler` samples are
+            folded with, ``None`` for keeping all samples
+        :param record: :class:`sar.records.Record` class rows are kept as,
+            ``None`` for ``dict`` rows
+    '''
+
+    __slots__ = ('part_type', 'pattern_re', 'fields', 'pairs', 'resampler',
+                 'record', 'rows', 'averages', 'is_12hr', 'time_keys',
+                 'key_seconds', 'values', 'decoded_rows')
+
+    def __init__(self, part_type, pattern_re, fields, pairs,
+                 resampler=None, record=None):
+
+        self.part_type = part_type
+        '''Value of a constant which tells us which SAR part is decoded'''
+        self.pattern_re = pattern_re
+        '''Compiled header line regexp of the part'''
+        self.fields = fields
+        '''Field regexp => column index'''
+        self.pairs = pairs
+        '''Field name => field regexp'''
+        self.resampler = resampler
+        '''Resampler samples are folded with'''
+        self.record = record
+        '''Record class rows are kept as, None for dict rows'''
+        self.rows = {}
+        '''Time => decoded row'''
+        self.averages = {}
+        '''Decoded "Average:" row'''
+        self.is_12hr = False
+        '''Whether part has 12hr AM/PM timestamps'''
+        self.time_keys = {}
+        '''(clock, meridiem) => 24hr time key'''
+        self.key_seconds = {}
+        '''Time key => seconds since midnight'''
+        self.values = {} if record is not None else None
+        '''Field text => value shared by records, None for dict rows'''
+        self.decoded_rows = 0
+        '''Number of rows decoded so far'''
+
 
 class Parser(object):
     '''
@@ -26,14 +128,115 @@ class Parser(object):
     its output
         :param filename: Name of the SAR output file
         :type filename: str.
+        :param stats_only: Don't keep parsed samples, only their running
+            summary (see :meth:`summarize`)
+        :type stats_only: bool.
+        :param resample: Fold samples into buckets of this length while
+            parsing (seconds, or string like ``60s``, ``5m``, ``1h``)
+        :type resample: int. or str.
+        :param agg: How samples in a bucket are folded, one of ``mean``,
+            ``max``, ``min``, ``last``
+        :type agg: str.
+        :param profile: Collects per stage figures (``split_file``,
+            ``classify``, ``decode``) of parsing
+        :type profile: :class:`sar.profiling.Profile`
+        :param window: Read file in windows of this many bytes, decoding
+            SAR blocks as they are read instead of splitting whole file
+            first. Raw text held at once stays within about twice the
+            window (plus the longest SAR block), whatever the file size.
+            ``None`` for reading whole file at once.
+        :type window: int.
+        :param workers: Decode sections in a pool of this many workers.
+            File is indexed first, then each section (large ones split
+            into row ranges) is decoded by a worker reading its own
+            ranges. ``None`` for decoding in the calling thread.
+        :type workers: int.
+        :param pool: Kind of worker pool, ``process`` or ``thread``
+        :type pool: str.
+        :param split_size: Split sections into row ranges of about this
+            many bytes, decoded by different workers. ``None`` for one
+            range per section. Resampled sections are never split.
+        :type split_size: int.
+        :param compact: Keep rows as :class:`sar.records.Record`s (read
+            like ``dict``s, but with field names shared by all rows of a
+            section) and intern timestamps and CPU / interface names
+        :type compact: bool.
+        :param ifaces: Keep only network interfaces matching one of these
+            glob patterns (e.g. ``['eth*', 'bond*']``), all by default.
+            Rows of other interfaces are skipped while decoding.
+        :type ifaces: list.
+        :param exclude_ifaces: Skip network interfaces matching one of
+            these glob patterns (e.g. ``['veth*', 'lo']``)
+        :type exclude_ifaces: list.
     '''
 
-    def __init__(self, filename=''):
+    def __init__(self, filename='', stats_only=False, resample=None,
+                 agg='mean', profile=None, window=None, workers=None,
+                 pool='process', split_size=DEFAULT_SPLIT_SIZE,
+                 compact=False, ifaces=None, exclude_ifaces=None):
 
         self._sarinfo = {}
         '''Hash with SAR info'''
+        self._averages = {}
+        '''Hash with SAR "Average:" summary rows, per section'''
+        self._timelines = {}
+        '''Section => (sorted seconds since midnight, matching time keys)'''
+        self._summary = None
+        '''Running summary of SAR data, built while parsing'''
+        self.__stats_only = stats_only
+        '''Whether to keep only running summary of parsed samples'''
+        self.__summary = None
+        '''Running summary being built by the current parse'''
+        self.__resample = None
+        '''Resampling interval in seconds, None for keeping all samples'''
+        if (resample is not None):
+            self.__resample = parse_interval(resample)
+            # Fail early on unknown aggregation
+            Resampler(self.__resample, agg)
+        self.__agg = agg
+        '''Aggregation of samples in resampled buckets'''
+        self.profile = profile
+        '''Per stage figures of parsing, None if not profiling'''
+        self.__profiler = profile if profile is not None else NULL_PROFILE
+        '''Profile stages are measured with'''
+        self.__decoded_rows = 0
+        '''Number of rows decoded from the last split SAR part'''
+        self.__cancelled = False
+        '''Whether parsing was cancelled, see :meth:`cancel`'''
+        if (window is not None and window <= 0):
+            raise ValueError('Window must be positive: %s' % (window,))
+        self.__window = window
+        '''Size of windows file is read in, None for reading it at once'''
+        if (workers is not None and workers <= 0):
+            raise ValueError('Number of workers must be positive: %s' %
+                             (workers,))
+        if (workers is not None and window is not None):
+            raise ValueError('Parsing in windows and in workers can\'t be '
+                             'combined')
+        if (pool not in POOLS):
+            raise ValueError('Unknown pool %s, expected one of %s' %
+                             (pool, ', '.join(POOLS)))
+        if (split_size is not None and split_size <= 0):
+            raise ValueError('Split size must be positive: %s' %
+                             (split_size,))
+        self.__workers = workers
+        '''Number of workers sections are decoded in, None for none'''
+        self.__pool = pool
+        '''Kind of worker pool'''
+        self.__split_size = split_size
+        '''Size of row ranges sections are split into for workers'''
+        self.__compact = compact
+        '''Whether rows are kept as records'''
+        self.__ifaces = ifaces
+        '''Glob patterns of kept network interfaces, None for all'''
+        self.__exclude_ifaces = exclude_ifaces
+        '''Glob patterns of skipped network interfaces, None for none'''
+        self.__kept_ifaces = {}
+        '''Interface name => whether its rows are kept'''
         self.__file_date = ''
         '''String which contains date of SAR file'''
+        self.__hostname = ''
+        '''String which contains hostname of SAR file'''
         self.__restart_times = []
         '''List with box restart times'''
         self.__filename = filename
@@ -61,8 +264,17 @@ class Parser(object):
             ``False`` if it failed (at any point)
         '''
 
+        if (self.__window is not None):
+            return self.__load_windows()
+        if (self.__workers is not None):
+            return self.__load_parallel()
+
         # We first split file into pieces
-        searchunks = self._split_file()
+        with self.__profiler.stage('split_file') as run:
+            searchunks = self._split_file()
+            if (searchunks):
+                run.bytes = os.path.getsize(self.__filename)
+                run.rows = len(searchunks)
 
         if (searchunks):
 
@@ -70,9 +282,11 @@ class Parser(object):
             cpu_usage, mem_usage, swp_usage, io_usage, paging_stats, net_usage = \
                 self._parse_file(searchunks)
 
-            if (cpu_usage is False):
+            if (cpu_usage is False or self.__cancelled):
                 return False
 
+            self._summary = self.__summary
+
             self._sarinfo = {
                 "cpu": cpu_usage,
                 "mem": mem_usage,
@@ -93,6 +307,436 @@ class Parser(object):
         else:
             return False
 
+    def __load_windows(self):
+        '''
+        Loads SAR file window by window, see :meth:`__read_blocks`
+            :return: ``True`` if loading and parsing of file went fine, \
+            ``False`` if it failed or was cancelled
+        '''
+        try:
+            fhandle = open(self.__filename, 'r')
+        except (IOError, OSError):
+            print(("Couldn't open file %s" % (self.__filename)))
+            return False
+
+        self.__summary = Summary()
+        states = {}
+
+        try:
+            if (os.fstat(fhandle.fileno()).st_size == 0):
+                return False
+
+            for state, lines in self.__read_blocks(
+                    fhandle, states, self.__window):
+                if (self.__cancelled):
+                    return False
+                with self.__profiler.stage('decode') as run:
+                    run.rows = self.__feed_part(state, lines)
+        finally:
+            fhandle.close()
+
+        self.__finish_states(states)
+
+        return True
+
+    def iter_rows(self, sections=None, fhandle=None):
+        '''
+        Yields rows of SAR file as they are decoded, without keeping them.
+        File is read in windows (``window``, or :data:`STREAM_WINDOW`
+        bytes), so memory stays bounded whatever the file size. "Average:"
+        rows are not yielded, see :meth:`get_averages`.
+            :param sections: Names of sections to yield (``cpu``, ``mem``,
+                ...), all by default
+            :type sections: list.
+            :param fhandle: File object to read SAR output from (e.g.
+                ``sys.stdin``) instead of the file
+            :return: Generator of (section, ``HH:MM:SS``, entity, row)
+                ``tuple``s, entity being CPU id / interface name or
+                ``None``; rows of a block come in time (and entity) order
+        '''
+        if (self.__stats_only or self.__resample is not None):
+            raise ValueError('Rows can\'t be streamed when resampling or '
+                             'keeping only summary')
+
+        part_types = None
+        if (sections is not None):
+            part_types = set(part_type for part_type, name
+                             in PART_NAMES.items() if name in sections)
+
+        own_fhandle = fhandle is None
+        if (own_fhandle):
+            fhandle = open(self.__filename, 'r')
+
+        self.__summary = None
+        states = {}
+
+        try:
+            for state, lines in self.__read_blocks(
+                    fhandle, states, self.__window or STREAM_WINDOW):
+                if (self.__cancelled):
+                    return
+                if (part_types is not None and
+                        state.part_type not in part_types):
+                    continue
+
+                self.__feed_part(state, lines)
+
+                section = PART_NAMES[state.part_type]
+                by_entity = (state.part_type == PART_CPU or
+                             state.part_type == PART_NET)
+                rows = sorted(state.rows.items())
+                state.rows.clear()
+                state.key_seconds.clear()
+
+                for full_time, row in rows:
+                    if (by_entity):
+                        for entity, entity_row in sorted(row.items()):
+                            yield (section, full_time, entity, entity_row)
+                    else:
+                        yield (section, full_time, None, row)
+        finally:
+            if (own_fhandle):
+                fhandle.close()
+
+    def __read_blocks(self, fhandle, states, window):
+        '''
+        Reads SAR output window by window. Complete lines are handed out as
+        soon as they are read, with state of the part (section) the header
+        line of their block (lines between empty lines) belongs to, so
+        blocks may span any number of windows; line cut by the end of a
+        window is carried over to the next one.
+            :param fhandle: File object to read from
+            :param states: ``Dictionary`` of part type => :class:`PartState`
+                of parts seen so far, parts seen for the first time are
+                added to it
+            :param window: Number of bytes to read at once
+            :type window: int.
+            :return: Generator of (:class:`PartState`, ``List`` of lines)
+                ``tuple``s
+        '''
+        # Parts current block belongs to, None between blocks
+        part_types = None
+        pending = ''
+
+        while (True):
+            with self.__profiler.stage('split_file') as run:
+                data = fhandle.read(window)
+                run.bytes = len(data)
+                lines = (pending + data).split("\n")
+                # Last line may continue in the next window
+                pending = lines.pop() if data else ''
+                run.rows = len(lines)
+
+            line_count = len(lines)
+            first = 0
+            while (first < line_count):
+                if (lines[first].strip() == ''):
+                    part_types = None
+                    first += 1
+                    continue
+
+                if (part_types is None):
+                    if (self.__file_date == '' and
+                            BANNER_PATTERN.match(lines[first])):
+                        self.__set_banner(lines[first])
+                    part_types = self.__classify_header(
+                        lines[first], states)
+
+                last = first + 1
+                while (last < line_count and lines[last].strip() != ''):
+                    last += 1
+
+                if (part_types):
+                    block_lines = lines[first:last]
+                    for part_type in part_types:
+                        yield (states[part_type], block_lines)
+                    del(block_lines)
+
+                first = last
+
+            del(lines)
+
+            if (not data):
+                break
+
+    def __finish_states(self, states):
+        '''
+        Finishes decoding of all SAR parts and keeps their data
+            :param states: ``Dictionary`` of part type => :class:`PartState`
+                of parts found in the file
+        '''
+        self._summary = self.__summary
+
+        self._sarinfo = {}
+        for part_type, name in PART_NAMES.items():
+            state = states.get(part_type)
+            if (state is None):
+                state = self.__start_part(part_type)
+            self._sarinfo[name] = self.__finish_part(state)
+
+    def __load_parallel(self):
+        '''
+        Loads SAR file by decoding its sections in a pool of workers. File
+        is indexed first (see :meth:`__index_parts`), decoded pieces are
+        merged in file order, so data is the same as of sequential parsing.
+            :return: ``True`` if loading and parsing of file went fine, \
+            ``False`` if it failed or was cancelled
+        '''
+        with self.__profiler.stage('index') as run:
+            states = {}
+            tasks = self.__index_parts(states)
+            if (tasks is False):
+                return False
+            run.bytes = os.path.getsize(self.__filename)
+            run.rows = len(tasks)
+
+        self.__summary = Summary()
+        # Pools are needed by workers only, keep plain imports fast
+        if (self.__pool == 'thread'):
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(self.__workers)
+        else:
+            import multiprocessing
+            pool = multiprocessing.Pool(self.__workers)
+
+        try:
+            with self.__profiler.stage('decode') as run:
+                results = pool.imap(_decode_task, tasks)
+                for task, result in zip(tasks, results):
+                    if (self.__cancelled):
+                        return False
+                    run.bytes += sum(end - start for start, end in task[5])
+                    run.rows += result[3]
+                    self.__merge_result(states[task[2]], result)
+        finally:
+            if (self.__cancelled):
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+
+        self.__finish_states(states)
+
+        return True
+
+    def __index_parts(self, states):
+        '''
+        Indexes SAR blocks of the file by their header lines, without
+        decoding them, and splits them into decoding tasks
+            :param states: ``Dictionary`` part type => :class:`PartState`,
+                filled with (empty) states of parts found in the file
+            :return: ``List`` of tasks for :func:`_decode_task`, ``False``
+                if the file can't be read or is empty
+        '''
+        try:
+            fhandle = open(self.__filename, 'r')
+        except (IOError, OSError):
+            print(("Couldn't open file %s" % (self.__filename)))
+            return False
+
+        ranges = {}
+        is_12hr = {}
+
+        try:
+            try:
+                sarmap = mmap.mmap(fhandle.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file can't be mapped
+                return False
+
+            try:
+                size = sarmap.size()
+                # Blocks run from their header to the next header
+                starts = []
+                for match in PATTERN_BLOCK_HEADER.finditer(sarmap):
+                    header = decode_text(match.group(1))
+                    part_types = self.__classify_header(header, states)
+                    starts.append((match.start(1), part_types))
+                    for part_type in part_types:
+                        if (part_type not in is_12hr):
+                            elems = header.split()
+                            is_12hr[part_type] = \
+                                len(elems) > 1 and elems[1] in MERIDIEMS
+
+                for i, (start, part_types) in enumerate(starts):
+                    end = starts[i + 1][0] if i + 1 < len(starts) else size
+                    for part_type in part_types:
+                        ranges.setdefault(part_type, []).extend(
+                            self.__split_range(sarmap, start, end))
+            finally:
+                sarmap.close()
+        finally:
+            fhandle.close()
+
+        options = {'stats_only': self.__stats_only,
+                   'resample': self.__resample, 'agg': self.__agg,
+                   'compact': self.__compact, 'ifaces': self.__ifaces,
+                   'exclude_ifaces': self.__exclude_ifaces}
+        split_size = self.__split_size
+        if (self.__resample is not None):
+            # Buckets can't be folded in pieces
+            split_size = None
+
+        tasks = []
+        for part_type in sorted(ranges.keys()):
+            state = states[part_type]
+            task_ranges = []
+            task_size = 0
+            for start, end in ranges[part_type]:
+                task_ranges.append((start, end))
+                task_size += end - start
+                if (split_size is not None and task_size >= split_size):
+                    tasks.append((self.__filename, options, part_type,
+                                  state.fields, is_12hr[part_type],
+                                  task_ranges))
+                    task_ranges = []
+                    task_size = 0
+            if (task_ranges):
+                tasks.append((self.__filename, options, part_type,
+                              state.fields, is_12hr[part_type], task_ranges))
+
+        return tasks
+
+    def __split_range(self, sarmap, start, end):
+        '''
+        Splits byte range of a SAR block into ranges of whole lines
+        shorter than the split size (or about as long, for long lines)
+            :return: ``List`` of (start, end) ``tuple``s
+        '''
+        if (self.__split_size is None or self.__resample is not None):
+            return [(start, end)]
+
+        ranges = []
+        while (end - start > self.__split_size):
+            cut = sarmap.find(b"\n", start + self.__split_size, end)
+            if (cut == -1):
+                break
+            ranges.append((start, cut + 1))
+            start = cut + 1
+        ranges.append((start, end))
+
+        return ranges
+
+    def _decode_ranges(self, part_type, fields, is_12hr, ranges):
+        '''
+        Decodes byte ranges of a single SAR part of the file, as a worker
+        of :meth:`__load_parallel`
+            :param part_type: Value of a constant which tells us which SAR
+                part is decoded
+            :param fields: ``Dictionary`` of field regexp => column index,
+                found in the header line of the part
+            :param is_12hr: Whether part has 12hr AM/PM timestamps
+            :type is_12hr: bool.
+            :param ranges: ``List`` of (start, end) byte ranges
+            :return: (rows, averages, time key => seconds, number of
+                decoded rows, :class:`sar.stats.Summary` or ``None``)
+                ``tuple``
+        '''
+        self.__summary = Summary()
+        state = self.__start_part(part_type, fields)
+        state.is_12hr = is_12hr
+
+        with open(self.__filename, 'rb') as fhandle:
+            for start, end in ranges:
+                fhandle.seek(start)
+                self.__feed_part(
+                    state, decode_text(fhandle.read(end - start)).split("\n"))
+
+        key_seconds = state.key_seconds
+        if (state.resampler is not None):
+            state.resampler.finish(state.rows)
+            if (state.record is not None):
+                self.__records_of(state, state.rows)
+            key_seconds = dict(
+                (key, time_to_seconds(key)) for key in state.rows)
+
+        return (state.rows, state.averages, key_seconds, state.decoded_rows,
+                self.__summary)
+
+    def __merge_result(self, state, result):
+        '''
+        Merges rows decoded by a worker into state of their part. Rows of
+        the same time (split across ranges) are merged, later rows
+        replacing earlier ones of the same CPU / interface, as in
+        sequential decoding (where every row sets all fields).
+            :param state: State of the part
+            :type state: :class:`PartState`
+            :param result: Result of :meth:`_decode_ranges`
+        '''
+        rows, averages, key_seconds, decoded_rows, summary = result
+        by_entity = (state.part_type == PART_CPU or
+                     state.part_type == PART_NET)
+
+        # Workers have already folded their buckets
+        state.resampler = None
+        for full_time, row in rows.items():
+            if (by_entity and full_time in state.rows):
+                state.rows[full_time].update(row)
+            else:
+                state.rows[full_time] = row
+        state.averages.update(averages)
+        state.key_seconds.update(key_seconds)
+        state.decoded_rows += decoded_rows
+        if (summary is not None):
+            self.__summary.merge(summary)
+
+    def __classify_header(self, first_line, states):
+        '''
+        Classifies SAR block by its first line, like :meth:`_parse_file`
+        classifies whole blocks
+            :param first_line: First line of SAR block
+            :type first_line: str.
+            :param states: ``Dictionary`` of part type =>
+                :class:`PartState` of parts seen so far, parts seen for the
+                first time are added to it
+            :return: ``List`` of part types the block belongs to
+        '''
+        with self.__profiler.stage('classify', len(first_line)) as run:
+            run.rows = 1
+            part_types = [part_type for part_type, pattern_re
+                          in PART_PATTERNS if pattern_re.search(first_line)]
+            if (RESTART_PATTERN.search(first_line)):
+                self.__restart_times.append(first_line.split()[0])
+
+        for part_type in part_types:
+            if (part_type not in states):
+                # Columns are found from header of the first block
+                self.__set_fields(part_type, first_line)
+                states[part_type] = self.__start_part(part_type)
+
+        return part_types
+
+    def __set_fields(self, part_type, first_line):
+        '''
+        Finds columns of a SAR part from its header line
+            :param part_type: Value of a constant which tells us which SAR
+                part the header belongs to
+            :param first_line: Header line of the SAR part
+            :type first_line: str.
+        '''
+        if (part_type == PART_CPU):
+            self.__cpu_fields = self.__find_column(FIELDS_CPU, first_line)
+        elif (part_type == PART_MEM):
+            self.__mem_fields = self.__find_column(FIELDS_MEM, first_line)
+        elif (part_type == PART_SWP):
+            self.__swp_fields = self.__find_column(FIELDS_SWP, first_line)
+        elif (part_type == PART_IO):
+            self.__io_fields = self.__find_column(FIELDS_IO, first_line)
+        elif (part_type == PART_PAGING):
+            self.__paging_fields = \
+                self.__find_column(FIELDS_PAGING, first_line)
+        elif (part_type == PART_NET):
+            self.__net_fields = self.__find_column(FIELDS_NET, first_line)
+
+    def cancel(self):
+        '''
+        Cancels parsing, which may be running in another thread. Parsing
+        stops before the next SAR part and :meth:`load_file` returns
+        ``False``.
+        '''
+        self.__cancelled = True
+
     def get_filedate(self):
         '''
         Returns file date of SAR file
@@ -104,6 +748,17 @@ class Parser(object):
 
         return self.__file_date
 
+    def get_hostname(self):
+        '''
+        Returns hostname of the machine SAR file was recorded on
+            :return: Hostname, as found in SAR file header line
+        '''
+        if (self.__hostname == ''):
+            # If not already parsed out, parse it.
+            self.__get_filedate()
+
+        return self.__hostname
+
     def get_sar_info(self):
         '''
         Returns parsed sar info
@@ -128,6 +783,124 @@ class Parser(object):
 
         return self._sarinfo
 
+    def get_range(self, section, start=None, end=None):
+        '''
+        Returns samples of a section within a time range, in time order.
+        Samples are found by bisecting, without scanning the section.
+            :param section: Name of the section (``cpu``, ``mem``, ...)
+            :type section: str.
+            :param start: First time point, as ``HH:MM:SS`` or seconds since
+                midnight, ``None`` for beginning of the day
+            :param end: Last time point (inclusive), ``None`` for end of the
+                day
+            :return: ``List`` of (``HH:MM:SS``, sample) ``tuple``s, ``False``
+                if loading failed
+        '''
+        sar_info = self.get_sar_info()
+        if (sar_info is False):
+            return False
+
+        seconds, keys = self._timelines.get(section, ([], []))
+        first = 0
+        if (start is not None):
+            if (not isinstance(start, int)):
+                start = time_to_seconds(start)
+            first = bisect_left(seconds, start)
+        last = len(seconds)
+        if (end is not None):
+            if (not isinstance(end, int)):
+                end = time_to_seconds(end)
+            last = bisect_right(seconds, end)
+
+        samples = sar_info[section]
+        return [(key, samples[key]) for key in keys[first:last]]
+
+    def get_averages(self):
+        '''
+        Returns "Average:" summary rows SAR prints at the end of each section
+            :return: ``Dictionary``-style list of SAR averages, per section.
+                Each section is shaped like a single time point of
+                :meth:`get_sar_info` (per CPU / interface for ``cpu`` and
+                ``net``). Sections without "Average:" rows are left out.
+        '''
+        if (self.get_sar_info() is False):
+            return False
+
+        return self._averages
+
+    def get_summary(self):
+        '''
+        Returns summary (count, mean, min, max, stddev and quantiles) of
+        every field of parsed SAR data. Mean is taken from SAR "Average:"
+        rows where they exist; where they don't (e.g. file cut short, or
+        merged across restarts), it is computed from samples, just like
+        other figures.
+            :return: ``Dictionary``-style list of summaries, shaped like
+                :meth:`get_averages`, with ``Dictionary`` of figures in
+                place of each field value
+        '''
+        summary = self.__running_summary()
+
+        if (summary is False):
+            return False
+
+        summary = summary.as_dict()
+
+        for section, averages in self._averages.items():
+            section_summary = summary.get(section, {})
+            if (section == PART_NAMES[PART_CPU] or
+                    section == PART_NAMES[PART_NET]):
+                for entity, row in averages.items():
+                    self.__apply_averages(
+                        section_summary.get(entity, {}), row)
+            else:
+                self.__apply_averages(section_summary, averages)
+
+        return summary
+
+    def summarize(self):
+        '''
+        Returns running summary of parsed SAR data, built while parsing
+        (with ``stats_only`` without keeping samples). Summary is a copy,
+        merging other files into it leaves the parser's own intact.
+            :return: :class:`sar.stats.Summary` (mergeable with summaries of
+                other files), ``False`` if parsing failed
+        '''
+        summary = self.__running_summary()
+
+        if (summary is False):
+            return False
+
+        return Summary(summary.relative_accuracy).merge(summary)
+
+    def __running_summary(self):
+        '''
+        Returns the parser's own running summary of parsed SAR data,
+        computing it from :meth:`get_sar_info` data if parsing didn't build
+        it
+            :return: :class:`sar.stats.Summary`, ``False`` if parsing failed
+        '''
+        sarinfo = self.get_sar_info()
+
+        if (sarinfo is False):
+            return False
+
+        if (self._summary is None):
+            self._summary = Summary()
+            self._summary.push_sar_info(sarinfo)
+
+        return self._summary
+
+    def __apply_averages(self, row_summary, averages):
+        '''
+        Replaces means in a row summary with SAR's own averages
+            :param row_summary: ``Dictionary`` of field name => figures
+            :param averages: ``Dictionary`` of field name => SAR average
+        '''
+        for fieldname, figures in row_summary.items():
+            if (fieldname in averages):
+                figures['mean'] = averages[fieldname]
+
     def _split_file(self, data=''):
         '''
         Splits SAR output or SAR output file (in ASCII format) in order to
@@ -138,21 +911,24 @@ class Parser(object):
                 the type of info they contain (SAR file sections) without
                 parsing what is exactly what at this point
         '''
+        if (not isinstance(data, bytes)):
+            # Data is mapped (and searched) as bytes on Python 3
+            data = data.encode('utf-8')
 
         # Filename passed checks through __init__
         if ((self.__filename and os.access(self.__filename, os.R_OK))
-                or data != ''):
+                or data != b''):
 
             fhandle = None
 
-            if (data == ''):
+            if (data == b''):
                 try:
                     fhandle = os.open(self.__filename, os.O_RDONLY)
                 except OSError:
                     print(("Couldn't open file %s" % (self.__filename)))
                     fhandle = None
 
-            if (fhandle or data != ''):
+            if (fhandle or data != b''):
 
                 datalength = 0
                 
@@ -162,7 +938,7 @@ class Parser(object):
                 else:
                     dataprot = mmap.PROT_READ
 
-                if (data != ''):
+                if (data != b''):
                     fhandle = -1
                     datalength = len(data)
                     
@@ -180,14 +956,14 @@ class Parser(object):
                         sarmap = mmap.mmap(
                             fhandle, length=datalength, prot=dataprot
                         )
-                    if (data != ''):
+                    if (data != b''):
 
                         sarmap.write(data)
                         sarmap.flush()
                         sarmap.seek(0, os.SEEK_SET)
 
                 except (TypeError, IndexError):
-                    if (data == ''):
+                    if (data == b''):
                         os.close(fhandle)
                     traceback.print_exc()
                     #sys.exit(-1)
@@ -196,10 +972,10 @@ class Parser(object):
                 # Here we'll store chunks of SAR file, unparsed
                 searchunks = []
                 oldchunkpos = 0
-                dlpos = sarmap.find("\n\n", 0)
+                dlpos = sarmap.find(b"\n\n", 0)
                 size = 0
 
-                if (data == ''):
+                if (data == b''):
                     # We can do mmap.size() only on read-only mmaps
                     size = sarmap.size()
                 else:
@@ -212,7 +988,7 @@ class Parser(object):
                 while (dlpos > -1):  # mmap.find() returns -1 on failure.
 
                     tempchunk = sarmap.read(dlpos - oldchunkpos)
-                    searchunks.append(tempchunk.strip())
+                    searchunks.append(decode_text(tempchunk.strip()))
 
                     # We remember position, add 2 for 2 DD's
                     # (newspaces in production). We have to remember
@@ -226,12 +1002,12 @@ class Parser(object):
                     except ValueError:
                         print(("Out of bounds (%s)!\n" % (sarmap.tell())))
                     # Now we repeat find.
-                    dlpos = sarmap.find("\n\n")
+                    dlpos = sarmap.find(b"\n\n")
 
                 # If it wasn't the end of file, we want last piece of it
                 if (oldchunkpos < size):
                     tempchunk = sarmap[(oldchunkpos):]
-                    searchunks.append(tempchunk.strip())
+                    searchunks.append(decode_text(tempchunk.strip()))
 
                 sarmap.close()
 
@@ -254,13 +1030,14 @@ class Parser(object):
         '''
         cpu_usage = ''
         mem_usage = ''
+        self.__summary = Summary()
         swp_usage = ''
         io_usage = ''
         paging_stats = ''
         net_usage = ''
 
         # If sar_parts is a list
-        if (type(sar_parts) is ListType):
+        if (isinstance(sar_parts, list)):
             # We will find CPU section by looking for typical line in CPU
             # section of SAR output
             cpu_pattern = re.compile(PATTERN_CPU)
@@ -277,110 +1054,115 @@ class Parser(object):
             ''' IF SYSTEM WAS REBOOTED DURING THE DAY                '''
             ''' !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! '''
 
-            for part in sar_parts:
-                logging.debug(part)
-                # Try to match CPU usage SAR file sections
-                if (cpu_pattern.search(part)):
-                    if (cpu_usage == ''):
-                        cpu_usage = part
-                        try:
-                            first_line = part.split("\n")[0]
-                        except IndexError:
-                            first_line = part
+            with self.__profiler.stage('classify') as run:
+                for part in sar_parts:
+                    if (self.__cancelled):
+                        return (False, False, False, False, False, False)
+                    logging.debug(part)
+                    run.bytes += len(part)
+                    run.rows += 1
+                    # Try to match CPU usage SAR file sections
+                    if (cpu_pattern.search(part)):
+                        if (cpu_usage == ''):
+                            cpu_usage = part
+                            try:
+                                first_line = part.split("\n")[0]
+                            except IndexError:
+                                first_line = part
 
-                        self.__cpu_fields = \
-                            self.__find_column(FIELDS_CPU, first_line)
+                            self.__cpu_fields = \
+                                self.__find_column(FIELDS_CPU, first_line)
 
-                    else:
-                        cpu_usage += "\n" + part
+                        else:
+                            cpu_usage += "\n" + part
 
-                # Try to match memory usage SAR file sections
-                if (mem_pattern.search(part)):
-                    if (mem_usage == ''):
-                        mem_usage = part
-                        try:
-                            first_line = part.split("\n")[0]
-                        except IndexError:
-                            first_line = part
+                    # Try to match memory usage SAR file sections
+                    if (mem_pattern.search(part)):
+                        if (mem_usage == ''):
+                            mem_usage = part
+                            try:
+                                first_line = part.split("\n")[0]
+                            except IndexError:
+                                first_line = part
 
-                        self.__mem_fields = \
-                            self.__find_column(FIELDS_MEM, first_line)
+                            self.__mem_fields = \
+                                self.__find_column(FIELDS_MEM, first_line)
 
-                    else:
-                        mem_usage += "\n" + part
+                        else:
+                            mem_usage += "\n" + part
 
-                # Try to match swap usage SAR file sections
-                if (swp_pattern.search(part)):
-                    if (swp_usage == ''):
-                        swp_usage = part
-                        try:
-                            first_line = part.split("\n")[0]
-                        except IndexError:
-                            first_line = part
+                    # Try to match swap usage SAR file sections
+                    if (swp_pattern.search(part)):
+                        if (swp_usage == ''):
+                            swp_usage = part
+                            try:
+                                first_line = part.split("\n")[0]
+                            except IndexError:
+                                first_line = part
 
-                        self.__swp_fields = \
-                            self.__find_column(FIELDS_SWP, first_line)
-                    else:
-                        swp_usage += "\n" + part
+                            self.__swp_fields = \
+                                self.__find_column(FIELDS_SWP, first_line)
+                        else:
+                            swp_usage += "\n" + part
 
-                # Try to match IO usage SAR file sections
-                if (io_pattern.search(part)):
-                    if (io_usage == ''):
-                        io_usage = part
-                        try:
-                            first_line = part.split("\n")[0]
-                        except IndexError:
-                            first_line = part
+                    # Try to match IO usage SAR file sections
+                    if (io_pattern.search(part)):
+                        if (io_usage == ''):
+                            io_usage = part
+                            try:
+                                first_line = part.split("\n")[0]
+                            except IndexError:
+                                first_line = part
 
-                        self.__io_fields = \
-                            self.__find_column(FIELDS_IO, first_line)
-                    else:
-                        io_usage += "\n" + part
+                            self.__io_fields = \
+                                self.__find_column(FIELDS_IO, first_line)
+                        else:
+                            io_usage += "\n" + part
 
-                # Try to match paging stats SAR file sections
-                if (paging_pattern.search(part)):
-                    if (paging_stats == ''):
-                        paging_stats = part
-                        try:
-                            first_line = part.split("\n")[0]
-                        except IndexError:
-                            first_line = part
+                    # Try to match paging stats SAR file sections
+                    if (paging_pattern.search(part)):
+                        if (paging_stats == ''):
+                            paging_stats = part
+                            try:
+                                first_line = part.split("\n")[0]
+                            except IndexError:
+                                first_line = part
 
-                        self.__paging_fields = \
-                            self.__find_column(FIELDS_PAGING, first_line)
-                    else:
-                        paging_stats += "\n" + part
+                            self.__paging_fields = \
+                                self.__find_column(FIELDS_PAGING, first_line)
+                        else:
+                            paging_stats += "\n" + part
 
-                # Try to match network usage SAR file sections
-                if (net_pattern.search(part)):
-                    if (net_usage == ''):
-                        net_usage = part
-                        try:
-                            first_line = part.split("\n")[0]
-                        except IndexError:
-                            first_line = part
+                    # Try to match network usage SAR file sections
+                    if (net_pattern.search(part)):
+                        if (net_usage == ''):
+                            net_usage = part
+                            try:
+                                first_line = part.split("\n")[0]
+                            except IndexError:
+                                first_line = part
 
-                        self.__net_fields = \
-                        self.__find_column(FIELDS_NET, first_line)
-                    else:
-                        net_usage += "\n" + part
+                            self.__net_fields = \
+                            self.__find_column(FIELDS_NET, first_line)
+                        else:
+                            net_usage += "\n" + part
 
-                # Try to match restart time
-                if (restart_pattern.search(part)):
-                    pieces = part.split()
-                    self.__restart_times.append(pieces[0])
-                    del(pieces)
+                    # Try to match restart time
+                    if (restart_pattern.search(part)):
+                        pieces = part.split()
+                        self.__restart_times.append(pieces[0])
+                        del(pieces)
 
             del(sar_parts)
 
             # Now we have parts pulled out and combined, do further
             # processing.
-            cpu_output = self.__split_info(cpu_usage, PART_CPU)
-            mem_output = self.__split_info(mem_usage, PART_MEM)
-            swp_output = self.__split_info(swp_usage, PART_SWP)
-            io_output = self.__split_info(io_usage, PART_IO)
-            paging_output = self.__split_info(paging_stats, PART_PAGING)
-            net_output = self.__split_info(net_usage, PART_NET) 
+            cpu_output = self.__decode(cpu_usage, PART_CPU)
+            mem_output = self.__decode(mem_usage, PART_MEM)
+            swp_output = self.__decode(swp_usage, PART_SWP)
+            io_output = self.__decode(io_usage, PART_IO)
+            paging_output = self.__decode(paging_stats, PART_PAGING)
+            net_output = self.__decode(net_usage, PART_NET)
 
             del(cpu_usage)
             del(mem_usage)
@@ -393,6 +1175,24 @@ class Parser(object):
 
         return (False, False, False, False, False, False)
 
+    def __decode(self, info_part, part_type):
+        '''
+        Splits info from SAR part into logical stuff, measured as ``decode``
+        stage if profiling
+        :param info_part: Part of SAR output we want to split into usable data
+        :param part_type: Value of a constant which tells us which SAR part \
+            we're parsing
+        :return: See :meth:`__split_info`, ``False`` if parsing was cancelled
+        '''
+        if (self.__cancelled):
+            return False
+
+        with self.__profiler.stage('decode', len(info_part)) as run:
+            output = self.__split_info(info_part, part_type)
+            run.rows += self.__decoded_rows
+
+        return output
+
     def __find_column(self, column_names, part_first_line):
         '''
         Finds the column for the column_name in sar type definition,
@@ -438,138 +1238,317 @@ class Parser(object):
         :return: ``List``-style info from SAR files, now finally \
             completely parsed into meaningful data for further processing
         '''
+        state = self.__start_part(part_type)
+
+        if (state is None):
+            return False
+
+        self.__feed_part(state, info_part.split("\n"))
 
+        return self.__finish_part(state)
+
+    def __start_part(self, part_type, fields=None):
+        '''
+        Prepares decoding of a SAR part, which may then be fed in pieces
+        :param part_type: Value of a constant which tells us which SAR part \
+            we're parsing
+        :param fields: Field regexp => column index, instead of the ones \
+            found by parsing
+        :return: :class:`PartState`, ``None`` for unknown part type
+        '''
         pattern = ''
+        part_fields = None
+        pairs = None
 
         if (part_type == PART_CPU):
             pattern = PATTERN_CPU
+            part_fields = self.__cpu_fields
+            pairs = FIELD_PAIRS_CPU
         elif (part_type == PART_MEM):
             pattern = PATTERN_MEM
+            part_fields = self.__mem_fields
+            pairs = FIELD_PAIRS_MEM
         elif (part_type == PART_SWP):
             pattern = PATTERN_SWP
+            part_fields = self.__swp_fields
+            pairs = FIELD_PAIRS_SWP
         elif (part_type == PART_IO):
             pattern = PATTERN_IO
+            part_fields = self.__io_fields
+            pairs = FIELD_PAIRS_IO
         elif (part_type == PART_PAGING):
             pattern = PATTERN_PAGING
+            part_fields = self.__paging_fields
+            pairs = FIELD_PAIRS_PAGING
         elif (part_type == PART_NET):
             pattern = PATTERN_NET
+            part_fields = self.__net_fields
+            pairs = FIELD_PAIRS_NET
 
         if (pattern == ''):
-            return False
+            return None
 
-        return_dict = {}
+        if (fields is None):
+            fields = part_fields
 
-        pattern_re = re.compile(pattern)
+        resampler = None
+        if (self.__resample is not None and not self.__stats_only):
+            resampler = Resampler(self.__resample, self.__agg)
 
-        for part_line in info_part.split("\n"):
-            pattern = ''
+        record = RECORDS[part_type] if self.__compact else None
 
-            if (part_line.strip() != '') and \
-                    not pattern_re.search(part_line):
+        return PartState(part_type, re.compile(pattern), fields, pairs,
+                         resampler, record)
 
-                # Take care of AM/PM timestamps in SAR file
-                is_24hr = True
-                is_AM = False
+    def __keep_iface(self, iface):
+        '''
+        Tells whether rows of a network interface are kept, see ``ifaces``
+        and ``exclude_ifaces`` of :class:`Parser`
+            :param iface: Interface name
+            :type iface: str.
+            :return: ``True`` if rows of the interface are kept
+        '''
+        try:
+            return self.__kept_ifaces[iface]
+        except KeyError:
+            pass
 
-                if part_line[9:11] == 'AM':
-                    is_24hr = False
-                    is_AM = True
-                elif part_line[9:11] == 'PM':
-                    is_24hr = False
-                    is_AM = False
+        keep = True
+        if (self.__ifaces is not None):
+            keep = any(fnmatchcase(iface, pattern)
+                       for pattern in self.__ifaces)
+        if (keep and self.__exclude_ifaces is not None):
+            keep = not any(fnmatchcase(iface, pattern)
+                           for pattern in self.__exclude_ifaces)
+        self.__kept_ifaces[iface] = keep
 
-                if is_24hr is False:
-                    part_line =  \
-                        ('%s_%s XX %s' % (
-                            part_line[:8], part_line[9:11], part_line[12:]
-                        ))
+        return keep
+
+    def __feed_part(self, state, lines):
+        '''
+        Decodes lines of (a piece of) SAR part into its state
+        :param state: State of the part, see :meth:`__start_part`
+        :type state: :class:`PartState`
+        :param lines: Lines of SAR part
+        :type lines: list.
+        :return: Number of decoded rows
+        '''
+        part_type = state.part_type
+        pattern_re = state.pattern_re
+        fields = state.fields
+        pairs = state.pairs
+        return_dict = state.rows
+        average_dict = state.averages
+        is_12hr_part = state.is_12hr
+        time_keys = state.time_keys
+        key_seconds = state.key_seconds
+        resampler = state.resampler
+        record = state.record
+        values = state.values
+        section = PART_NAMES[part_type]
+        summary = self.__summary
+        keep_rows = not self.__stats_only and resampler is None
+        # Records are made of complete rows, decoded into a scratch dict
+        keep_dicts = keep_rows and record is None
+        filter_ifaces = part_type == PART_NET and (
+            self.__ifaces is not None or self.__exclude_ifaces is not None)
+        decoded_rows = 0
+
+        for part_line in lines:
+
+            if (part_line.strip() != '') and \
+                    not pattern_re.search(part_line):
 
                 # Line is not empty, nor it's header.
                 # let's hit the road Jack!
                 elems = part_line.split()
-                full_time = elems[0].strip()
+                full_time = elems[0]
+
+                if (filter_ifaces):
+                    # Interface follows the time (and AM/PM, which
+                    # "Average:" rows don't have)
+                    iface = elems[2 if elems[1] in MERIDIEMS else 1]
+                    if (not self.__keep_iface(iface)):
+                        continue
+
+                decoded_rows += 1
 
-                if (full_time != "Average:"):
+                if (full_time == "Average:"):
 
-                    # Convert time to 24hr format if needed
-                    if is_24hr is False:
-                        full_time = full_time[:-3]
+                    # Averages have no AM/PM column, so pad them to keep
+                    # column indexes found in the 12hr header line valid
+                    is_24hr = not is_12hr_part
+                    if is_12hr_part is True:
+                        elems.insert(1, 'XX')
+                    row_dict = average_dict
 
-                        # 12 is a bitch in AM/PM notation
-                        if full_time[:2] == '12':
-                            if is_AM is True:
-                                full_time = ('%s:%s' % ('00', full_time[3:]))
-                            is_AM = not is_AM
+                else:
 
-                        if is_AM is False and full_time[0:2] != '00':
-                            hours = int(full_time[:2]) + 12
-                            hours = ('%02d' % (hours,))
-                            full_time = ('%s:%s' % (hours, full_time[3:]))
+                    # Timestamps are converted once per distinct one, rows
+                    # sharing it (one per CPU, interface) just look it up
+                    meridiem = None
+                    if (len(elems) > 1 and elems[1] in MERIDIEMS):
+                        meridiem = elems[1]
+                        is_12hr_part = True
+                    is_24hr = meridiem is None
 
                     try:
-                        blah = return_dict[full_time]
-                        del(blah)
+                        full_time = time_keys[(full_time, meridiem)]
                     except KeyError:
-                        return_dict[full_time] = {}
-
-                    # Common assigner
-                    fields = None
-                    pairs = None
-                    if part_type == PART_CPU:
-                        fields = self.__cpu_fields
-                        pairs = FIELD_PAIRS_CPU
-                    elif part_type == PART_MEM:
-                        fields = self.__mem_fields
-                        pairs = FIELD_PAIRS_MEM
-                    elif part_type == PART_SWP:
-                        fields = self.__swp_fields
-                        pairs = FIELD_PAIRS_SWP
-                    elif part_type == PART_IO:
-                        fields = self.__io_fields
-                        pairs = FIELD_PAIRS_IO
-                    elif part_type == PART_PAGING:
-                        fields = self.__paging_fields
-                        pairs = FIELD_PAIRS_PAGING
-                    elif part_type == PART_NET:
-                        fields = self.__net_fields
-                        pairs = FIELD_PAIRS_NET
-
-                    for sectionname in pairs.iterkeys():
-
-                        value = elems[fields[pairs[sectionname]]]
-
-                        if sectionname == 'membuffer' or \
-                                sectionname == 'memcache' or \
-                                sectionname == 'memfree' or \
-                                sectionname == 'memused' or \
-                                sectionname == 'swapfree' or \
-                                sectionname == 'swapused':
-                            value = int(value)
-                        elif sectionname == 'iface':
-                            value = str(value)
-                        else:
-                            value = float(value)
+                        # Rows sharing a timestamp are adjacent, so the
+                        # cache doesn't have to keep every timestamp
+                        if (len(time_keys) >= TIME_KEYS_LIMIT):
+                            time_keys.clear()
+                        seconds = clock_to_seconds(full_time, meridiem)
+                        full_time = seconds_to_time(seconds)
+                        if (record is not None):
+                            full_time = intern(full_time)
+                        time_keys[(elems[0], meridiem)] = full_time
+                        if (keep_rows):
+                            key_seconds[full_time] = seconds
+
+                    if (not keep_dicts):
+                        row_dict = {}
+                    else:
+                        try:
+                            row_dict = return_dict[full_time]
+                        except KeyError:
+                            row_dict = return_dict[full_time] = {}
+
+                entity = None
+                if part_type == PART_CPU or part_type == PART_NET:
+                    entity = elems[(1 if is_24hr is True else 2)]
+                    if (record is not None):
+                        entity = intern(entity)
+                    try:
+                        entity_dict = row_dict[entity]
+                    except KeyError:
+                        entity_dict = row_dict[entity] = {}
+                else:
+                    entity_dict = row_dict
+
+                for sectionname in pairs.keys():
+
+                    value = elems[fields[pairs[sectionname]]]
+
+                    if sectionname == 'membuffer' or \
+                            sectionname == 'memcache' or \
+                            sectionname == 'memfree' or \
+                            sectionname == 'memused' or \
+                            sectionname == 'swapfree' or \
+                            sectionname == 'swapused':
+                        value = int(value)
+                    elif sectionname == 'iface':
+                        value = str(value)
+                        if (record is not None):
+                            value = intern(value)
+                    elif (values is None):
+                        value = float(value)
+                    else:
+                        # Records share values of same figures
+                        try:
+                            value = values[value]
+                        except KeyError:
+                            if (len(values) >= VALUES_LIMIT):
+                                values.clear()
+                            text = value
+                            value = float(text)
+                            values[text] = value
+
+                    entity_dict[sectionname] = value
+
+                if (row_dict is not average_dict):
+                    if (summary is not None):
+                        summary.push_row(section, entity, entity_dict)
+                    if (resampler is not None):
+                        resampler.fold(
+                            return_dict, full_time, entity, entity_dict)
+                    elif (record is not None and keep_rows):
+                        self.__keep_record(return_dict, full_time, entity,
+                                           record(entity_dict))
+
+        state.is_12hr = is_12hr_part
+        state.decoded_rows += decoded_rows
+
+        return decoded_rows
+
+    def __records_of(self, state, return_dict):
+        '''
+        Turns resampled ``dict`` rows of a section into records, in place
+        :param state: State of the part
+        :type state: :class:`PartState`
+        :param return_dict: Section dictionary, bucket time => row
+        '''
+        by_entity = (state.part_type == PART_CPU or
+                     state.part_type == PART_NET)
+        record = state.record
+
+        for full_time in list(return_dict.keys()):
+            row = return_dict.pop(full_time)
+            full_time = intern(full_time)
+            if (by_entity):
+                return_dict[full_time] = dict(
+                    (intern(entity), record(entity_row))
+                    for entity, entity_row in row.items())
+            else:
+                return_dict[full_time] = record(row)
 
-                        if part_type == PART_CPU:
-                            cpuid = elems[(1 if is_24hr is True else 2)]
-                            try:
-                                blah = return_dict[full_time][cpuid]
-                                del(blah)
-                            except KeyError:
-                                return_dict[full_time][cpuid] = {}
-                            return_dict[full_time][cpuid][sectionname] = \
-                                value
-                        elif part_type == PART_NET:
-                            iface = elems[(1 if is_24hr is True else 2)]
-                            try:
-                                blah = return_dict[full_time][iface]
-                                del(blah)
-                            except KeyError:
-                                return_dict[full_time][iface] = {}
-                            return_dict[full_time][iface][sectionname] = \
-                                value
-                        else:
-                            return_dict[full_time][sectionname] = value
+    def __keep_record(self, return_dict, full_time, entity, row):
+        '''
+        Keeps decoded row as a record
+        :param return_dict: Section dictionary, time => row
+        :param full_time: Interned time of the row
+        :param entity: Interned CPU id / interface name, ``None`` if not \
+            applicable for the section
+        :param row: Decoded row
+        :type row: :class:`sar.records.Record`
+        '''
+        if (entity is None):
+            return_dict[full_time] = row
+            return
+
+        try:
+            return_dict[full_time][entity] = row
+        except KeyError:
+            return_dict[full_time] = {entity: row}
+
+    def __finish_part(self, state):
+        '''
+        Finishes decoding of a SAR part: folds last resampled buckets,
+        builds its timeline and keeps its averages
+        :param state: State of the part, see :meth:`__start_part`
+        :type state: :class:`PartState`
+        :return: ``Dictionary`` of time => parsed data of the part
+        '''
+        section = PART_NAMES[state.part_type]
+        return_dict = state.rows
+
+        if (state.resampler is not None):
+            state.resampler.finish(return_dict)
+            if (state.record is not None):
+                self.__records_of(state, return_dict)
+            timeline = sorted(
+                (time_to_seconds(key), key) for key in return_dict)
+        else:
+            key_seconds = state.key_seconds
+            timeline = sorted(
+                (key_seconds[key], key) for key in return_dict)
+        self._timelines[section] = (
+            [seconds for seconds, key in timeline],
+            [key for seconds, key in timeline])
+
+        if (state.record is not None and
+                (state.part_type == PART_CPU or
+                 state.part_type == PART_NET)):
+            # Rows of a time are complete now
+            indexes = {}
+            for full_time, row in return_dict.items():
+                return_dict[full_time] = EntityRows.freeze(row, indexes)
+
+        self.__decoded_rows = state.decoded_rows
+
+        if (state.averages):
+            self._averages[section] = state.averages
 
         return (return_dict)
 
@@ -596,21 +1575,42 @@ class Parser(object):
                 return False
 
             firstline = sar_file.readline()
-            info = firstline.split()
             sar_file.close()
 
-            try:
-                self.__file_date = info[3]
+            return self.__set_banner(firstline)
 
-            except KeyError:
-                self.__file_date = ''
-                return False
+        return False
 
-            except:
-                ### DEBUG
-                traceback.print_exc()
-                return False
+    def __set_banner(self, firstline):
+        '''
+        Takes date and hostname of SAR data from SAR banner line
+            :param firstline: Banner (first) line of SAR output
+            :type firstline: str.
+            :return: ``True`` if banner line was recognized
+        '''
+        info = firstline.split()
 
-            return True
+        try:
+            self.__file_date = info[3]
+            self.__hostname = info[2].strip('()')
 
-        return False
+        except IndexError:
+            self.__file_date = ''
+            self.__hostname = ''
+            return False
+
+        return True
+
+
+def _decode_task(task):
+    '''
+    Decodes byte ranges of a single SAR part, in a worker of
+    :class:`Parser` pool
+        :param task: (filename, ``Dictionary`` of :class:`Parser` options,
+            part type, fields, 12hr flag, ranges) ``tuple``
+        :return: See :meth:`Parser._decode_ranges`
+    '''
+    filename, options, part_type, fields, is_12hr, ranges = task
+
+    return Parser(filename, **options)._decode_ranges(
+        part_type, fields, is_12hr, ranges)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.profiling` is a module containing opt-in instrumentation of SAR
+parsing and visualization stages: wall time, bytes processed, rows
+decoded and (where :mod:`tracemalloc` is available and tracing) peak
+allocations, per stage.
+'''
+
+import logging
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 has no tracemalloc, allocations are not measured there
+    tracemalloc = None
+
+try:
+    perf_counter = time.perf_counter
+except AttributeError:
+    perf_counter = time.time
+
+
+class StageStats(object):
+    '''
+    Accumulated figures of a single stage
+        :param name: Name of the stage
+        :type name: str.
+    '''
+
+    __slots__ = ('name', 'calls', 'seconds', 'bytes', 'rows', 'peak_alloc')
+
+    def __init__(self, name):
+
+        self.name = name
+        '''Name of the stage'''
+        self.calls = 0
+        '''How many times the stage ran'''
+        self.seconds = 0.0
+        '''Total wall time, in seconds'''
+        self.bytes = 0
+        '''Total bytes processed'''
+        self.rows = 0
+        '''Total rows decoded'''
+        self.peak_alloc = None
+        '''Largest peak of allocations during a single run, in bytes,
+           ``None`` if not measured'''
+
+    def as_dict(self):
+        '''
+        Returns figures of the stage
+            :return: ``Dictionary`` of figures
+        '''
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class StageRun(object):
+    '''
+    Single run of a stage, handed out by :meth:`Profile.stage`. Code being
+    measured adds rows (and bytes) it processed to it.
+    '''
+
+    __slots__ = ('name', 'seconds', 'bytes', 'rows', 'peak_alloc',
+                 '_start', '_alloc_start')
+
+    def __init__(self, name, nbytes=0):
+
+        self.name = name
+        self.seconds = 0.0
+        self.bytes = nbytes
+        self.rows = 0
+        self.peak_alloc = None
+        self._start = None
+        self._alloc_start = None
+
+    def as_dict(self):
+        '''
+        Returns figures of the run
+            :return: ``Dictionary`` of figures
+        '''
+        return {'stage': self.name, 'seconds': self.seconds,
+                'bytes': self.bytes, 'rows': self.rows,
+                'peak_alloc': self.peak_alloc}
+
+
+class Profile(object):
+    '''
+    Collects figures of instrumented stages
+        :param callback: Called with figures (``Dictionary``) of every
+            finished stage run
+        :type callback: callable
+        :param log: Log figures of every finished stage run through
+            :mod:`logging` (``sar.profile`` logger, ``INFO`` level)
+        :type log: bool.
+        :param trace_memory: Start :mod:`tracemalloc` (if not yet tracing)
+            to measure peak allocations; costly, off by default
+        :type trace_memory: bool.
+    '''
+
+    def __init__(self, callback=None, log=False, trace_memory=False):
+
+        self.stages = {}
+        '''Stage name => :class:`StageStats`'''
+        self.order = []
+        '''Stage names, in order of their first run'''
+        self.callback = callback
+        '''Called with figures of every finished stage run'''
+        self.logger = logging.getLogger('sar.profile') if log else None
+        '''Logger figures are emitted through'''
+
+        if (trace_memory and tracemalloc is not None and
+                not tracemalloc.is_tracing()):
+            tracemalloc.start()
+
+    def stage(self, name, nbytes=0):
+        '''
+        Returns context manager measuring a single run of a stage
+            :param name: Name of the stage
+            :type name: str.
+            :param nbytes: Bytes the run is going to process
+            :type nbytes: int.
+            :return: :class:`StageRun`-yielding context manager
+        '''
+        return _StageContext(self, StageRun(name, nbytes))
+
+    def record(self, run):
+        '''
+        Adds figures of a finished run to its stage and emits them
+            :param run: Finished run
+            :type run: :class:`StageRun`
+        '''
+        try:
+            stats = self.stages[run.name]
+        except KeyError:
+            stats = self.stages[run.name] = StageStats(run.name)
+            self.order.append(run.name)
+
+        stats.calls += 1
+        stats.seconds += run.seconds
+        stats.bytes += run.bytes
+        stats.rows += run.rows
+        if (run.peak_alloc is not None):
+            stats.peak_alloc = max(stats.peak_alloc or 0, run.peak_alloc)
+
+        if (self.logger is not None):
+            self.logger.info(
+                '%s: %.6fs, %d bytes, %d rows, peak alloc %s', run.name,
+                run.seconds, run.bytes, run.rows, run.peak_alloc)
+        if (self.callback is not None):
+            self.callback(run.as_dict())
+
+    def as_dict(self):
+        '''
+        Returns figures of all stages
+            :return: ``Dictionary`` of stage name => figures
+        '''
+        return dict((name, stats.as_dict())
+                    for name, stats in self.stages.items())
+
+    def __str__(self):
+        lines = ['%-12s %6s %10s %12s %10s %12s' % (
+            'stage', 'calls', 'seconds', 'bytes', 'rows', 'peak alloc')]
+        for name in self.order:
+            stats = self.stages[name]
+            lines.append('%-12s %6d %10.4f %12d %10d %12s' % (
+                name, stats.calls, stats.seconds, stats.bytes, stats.rows,
+                '-' if stats.peak_alloc is None else stats.peak_alloc))
+        return '\n'.join(lines)
+
+
+class _StageContext(object):
+    '''
+    Context manager timing a single stage run
+    '''
+
+    __slots__ = ('profile', 'run')
+
+    def __init__(self, profile, run):
+        self.profile = profile
+        self.run = run
+
+    def __enter__(self):
+        run = self.run
+        if (tracemalloc is not None and tracemalloc.is_tracing()):
+            if (hasattr(tracemalloc, 'reset_peak')):
+                tracemalloc.reset_peak()
+            run._alloc_start = tracemalloc.get_traced_memory()[0]
+        run._start = perf_counter()
+        return run
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        run = self.run
+        run.seconds = perf_counter() - run._start
+        if (run._alloc_start is not None):
+            run.peak_alloc = max(
+                tracemalloc.get_traced_memory()[1] - run._alloc_start, 0)
+        self.profile.record(run)
+        return False
+
+
+class _NullRun(object):
+    '''
+    Stage run standing in for :class:`StageRun` when profiling is off.
+    Figures added to it are dropped, so a single run can be shared by all
+    stages and threads.
+    '''
+
+    __slots__ = ()
+
+    name = None
+    seconds = 0.0
+    bytes = 0
+    rows = 0
+    peak_alloc = None
+
+    def __setattr__(self, name, value):
+        pass
+
+    def as_dict(self):
+        '''
+        Returns figures of the run, see :meth:`StageRun.as_dict`
+        '''
+        return {'stage': self.name, 'seconds': self.seconds,
+                'bytes': self.bytes, 'rows': self.rows,
+                'peak_alloc': self.peak_alloc}
+
+
+class _NullContext(object):
+    '''
+    Context manager standing in for stage runs when profiling is off
+    '''
+
+    __slots__ = ()
+
+    __run = _NullRun()
+
+    def __enter__(self):
+        return self.__run
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+
+class NullProfile(object):
+    '''
+    Profile that measures nothing, used when profiling is off
+    '''
+
+    __context = _NullContext()
+
+    def stage(self, name, nbytes=0):
+        '''
+        Returns context manager doing nothing, see :meth:`Profile.stage`
+        '''
+        return self.__context
+
+
+"""Shared profile that measures nothing"""
+NULL_PROFILE = NullProfile()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.records` is a module containing compact rows of parsed SAR data.
+
+Every parsed row is a ``dict`` by default, so every row repeats its field
+names and carries the overhead of a hash table. Records keep values in
+``__slots__`` of a class per section instead (field names are shared by
+all rows of the section) and still read like ``dict``s, so code written
+for ``dict`` rows keeps working. Rows of all CPUs (interfaces) of a time
+are kept in :class:`EntityRows`, sharing tuple of CPU ids (interface
+names) with other times.
+'''
+
+from sar import PART_CPU, PART_MEM, PART_SWP, PART_IO, PART_PAGING, \
+    PART_NET, FIELD_PAIRS_CPU, FIELD_PAIRS_MEM, FIELD_PAIRS_SWP, \
+    FIELD_PAIRS_IO, FIELD_PAIRS_PAGING, FIELD_PAIRS_NET
+
+try:
+    from sys import intern
+except ImportError:
+    # Python 2 has intern() as a builtin
+    intern = intern
+
+
+class Record(object):
+    '''
+    Read-only ``dict``-like row of parsed SAR data. Subclasses (one per
+    section) list field names in ``__slots__``.
+        :param row: ``Dictionary`` of field name => value, with every field
+            of the section
+    '''
+
+    __slots__ = ()
+
+    def __init__(self, row):
+
+        for fieldname in self.__slots__:
+            setattr(self, fieldname, row[fieldname])
+
+    def __getitem__(self, fieldname):
+        try:
+            return getattr(self, fieldname)
+        except (AttributeError, TypeError):
+            raise KeyError(fieldname)
+
+    def __contains__(self, fieldname):
+        return fieldname in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        try:
+            return (len(other) == len(self.__slots__) and
+                    all(other[fieldname] == getattr(self, fieldname)
+                        for fieldname in self.__slots__))
+        except (KeyError, TypeError):
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return tuple(getattr(self, fieldname) for fieldname in self.__slots__)
+
+    def __setstate__(self, state):
+        for fieldname, value in zip(self.__slots__, state):
+            setattr(self, fieldname, value)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.as_dict())
+
+    def get(self, fieldname, default=None):
+        '''
+        Returns value of a field
+            :param fieldname: Name of the field
+            :param default: Returned for unknown fields
+        '''
+        try:
+            return getattr(self, fieldname)
+        except (AttributeError, TypeError):
+            return default
+
+    def keys(self):
+        '''
+        Returns field names, shared by all records of the section
+            :return: ``tuple`` of field names
+        '''
+        return self.__slots__
+
+    def values(self):
+        '''
+        Returns field values
+            :return: ``List`` of values, in order of :meth:`keys`
+        '''
+        return [getattr(self, fieldname) for fieldname in self.__slots__]
+
+    def items(self):
+        '''
+        Returns fields
+            :return: ``List`` of (field name, value) ``tuple``s
+        '''
+        return [(fieldname, getattr(self, fieldname))
+                for fieldname in self.__slots__]
+
+    def as_dict(self):
+        '''
+        Returns the record as a plain ``dict`` (e.g. for JSON)
+            :return: ``Dictionary`` of field name => value
+        '''
+        return dict(self.items())
+
+
+class EntityRows(object):
+    '''
+    Read-only ``dict``-like rows of all CPUs (or interfaces) of a single
+    time
+        :param entities: ``tuple`` of CPU ids / interface names, shared by
+            all times with the same ones
+        :param index: ``Dictionary`` of entity => position in
+            ``entities``, shared like ``entities``
+        :param rows: ``tuple`` of rows, in order of ``entities``
+    '''
+
+    __slots__ = ('entities', 'index', 'rows')
+
+    def __init__(self, entities, index, rows):
+
+        self.entities = entities
+        '''CPU ids / interface names'''
+        self.index = index
+        '''Entity => position'''
+        self.rows = rows
+        '''Rows, in order of entities'''
+
+    @classmethod
+    def freeze(cls, row, indexes):
+        '''
+        Creates rows of a time from a ``dict``
+            :param row: ``Dictionary`` of entity => row
+            :param indexes: ``Dictionary`` of entities ``tuple`` => index,
+                shared by rows being frozen, so times with the same
+                entities share them
+            :return: :class:`EntityRows`
+        '''
+        entities = tuple(sorted(row.keys()))
+        try:
+            entities, index = indexes[entities]
+        except KeyError:
+            index = dict((entity, position)
+                         for position, entity in enumerate(entities))
+            indexes[entities] = (entities, index)
+
+        return cls(entities, index,
+                   tuple(row[entity] for entity in entities))
+
+    def __getitem__(self, entity):
+        return self.rows[self.index[entity]]
+
+    def __contains__(self, entity):
+        return entity in self.index
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __eq__(self, other):
+        try:
+            return (len(other) == len(self.entities) and
+                    all(other[entity] == row
+                        for entity, row in zip(self.entities, self.rows)))
+        except (KeyError, TypeError):
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return (self.entities, self.rows)
+
+    def __setstate__(self, state):
+        self.entities, self.rows = state
+        self.index = dict((entity, position)
+                          for position, entity in enumerate(self.entities))
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self.items()))
+
+    def get(self, entity, default=None):
+        '''
+        Returns row of a CPU / interface
+            :param entity: CPU id / interface name
+            :param default: Returned for unknown entities
+        '''
+        try:
+            return self.rows[self.index[entity]]
+        except KeyError:
+            return default
+
+    def keys(self):
+        '''
+        Returns CPU ids / interface names
+            :return: ``tuple`` of entities
+        '''
+        return self.entities
+
+    def values(self):
+        '''
+        Returns rows
+            :return: ``tuple`` of rows, in order of :meth:`keys`
+        '''
+        return self.rows
+
+    def items(self):
+        '''
+        Returns rows with their CPU ids / interface names
+            :return: ``List`` of (entity, row) ``tuple``s
+        '''
+        return list(zip(self.entities, self.rows))
+
+
+def _record_class(name, field_pairs):
+    '''
+    Creates record class of a section
+        :param name: Class name, under which it is bound in this module
+            (records are pickled by name)
+        :param field_pairs: ``Dictionary`` of field name => regexp of the
+            section
+    '''
+    return type(name, (Record,), {
+        '__slots__': tuple(sorted(field_pairs.keys())),
+        '__module__': __name__,
+    })
+
+
+CpuRecord = _record_class('CpuRecord', FIELD_PAIRS_CPU)
+MemRecord = _record_class('MemRecord', FIELD_PAIRS_MEM)
+SwapRecord = _record_class('SwapRecord', FIELD_PAIRS_SWP)
+IoRecord = _record_class('IoRecord', FIELD_PAIRS_IO)
+PagingRecord = _record_class('PagingRecord', FIELD_PAIRS_PAGING)
+NetRecord = _record_class('NetRecord', FIELD_PAIRS_NET)
+
+"""Record classes of SAR parts"""
+RECORDS = {
+    PART_CPU: CpuRecord, PART_MEM: MemRecord, PART_SWP: SwapRecord,
+    PART_IO: IoRecord, PART_PAGING: PagingRecord, PART_NET: NetRecord
+}
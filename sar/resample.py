@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.resample` is a module containing helpers for folding SAR samples
+into fixed time buckets while they are being parsed.
+'''
+
+import re
+
+from sar.timeutil import time_to_seconds, seconds_to_time
+
+"""Supported aggregations of samples falling into the same bucket"""
+AGGREGATIONS = ('mean', 'max', 'min', 'last')
+
+"""Regexp for resampling interval specification (e.g. ``60s``, ``5m``)"""
+PATTERN_INTERVAL = re.compile(r'^\s*([0-9]+)\s*([smh]?)\s*$')
+
+"""Interval unit suffixes, in seconds"""
+INTERVAL_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_interval(interval):
+    '''
+    Parses resampling interval specification
+        :param interval: Interval in seconds, or string with ``s``, ``m``
+            or ``h`` suffix (e.g. ``60s``, ``5m``)
+        :type interval: int. or str.
+        :return: Interval length in seconds
+    '''
+    if (isinstance(interval, int)):
+        seconds = interval
+    else:
+        match = PATTERN_INTERVAL.match(str(interval))
+        if (not match):
+            raise ValueError('Invalid resampling interval: %s' % (interval,))
+        seconds = int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+
+    if (seconds <= 0):
+        raise ValueError('Resampling interval must be positive: %s' %
+                         (interval,))
+
+    return seconds
+
+
+class Resampler(object):
+    '''
+    Folds parsed SAR rows into time buckets, keeping only one aggregated
+    row per bucket (and per CPU / interface). Buckets are aligned to
+    midnight, so buckets of different days line up.
+        :param interval: Bucket length, see :func:`parse_interval`
+        :param agg: Aggregation of samples in a bucket, one of
+            :data:`AGGREGATIONS`
+        :type agg: str.
+    '''
+
+    def __init__(self, interval, agg='mean'):
+
+        if (agg not in AGGREGATIONS):
+            raise ValueError('Unknown aggregation %s, expected one of %s' %
+                             (agg, ', '.join(AGGREGATIONS)))
+
+        self.interval = parse_interval(interval)
+        '''Bucket length in seconds'''
+        self.agg = agg
+        '''Aggregation of samples in a bucket'''
+        self.__counts = {}
+        '''(bucket, entity) => number of samples, for means'''
+        self.__buckets = {}
+        '''Timestamp => bucket timestamp cache'''
+
+    def bucket(self, full_time):
+        '''
+        Returns timestamp of the bucket a sample falls into
+            :param full_time: Sample timestamp in ``HH:MM:SS`` format
+            :type full_time: str.
+            :return: Bucket start timestamp in ``HH:MM:SS`` format
+        '''
+        try:
+            return self.__buckets[full_time]
+        except KeyError:
+            seconds = time_to_seconds(full_time)
+            bucket = seconds_to_time(seconds - seconds % self.interval)
+            self.__buckets[full_time] = bucket
+            return bucket
+
+    def fold(self, return_dict, full_time, entity, row):
+        '''
+        Folds a single parsed row into its bucket
+            :param return_dict: Section dictionary, bucket timestamp => row
+            :param full_time: Sample timestamp in ``HH:MM:SS`` format
+            :param entity: CPU id / interface name, ``None`` if not
+                applicable for the section
+            :param row: ``Dictionary`` of field name => value
+        '''
+        bucket = self.bucket(full_time)
+
+        try:
+            target = return_dict[bucket]
+        except KeyError:
+            target = return_dict[bucket] = {}
+
+        if (entity is not None):
+            try:
+                target = target[entity]
+            except KeyError:
+                target[entity] = {}
+                target = target[entity]
+
+        if (not target):
+            target.update(row)
+            self.__counts[(bucket, entity)] = 1
+            return
+
+        self.__counts[(bucket, entity)] += 1
+        agg = self.agg
+
+        for fieldname, value in row.items():
+            if (isinstance(value, str) or agg == 'last'):
+                target[fieldname] = value
+            elif (agg == 'mean'):
+                target[fieldname] += value
+            elif (agg == 'max'):
+                if (value > target[fieldname]):
+                    target[fieldname] = value
+            elif (value < target[fieldname]):
+                target[fieldname] = value
+
+    def finish(self, return_dict):
+        '''
+        Finalizes aggregation of all folded buckets (turns sums into means)
+            :param return_dict: Section dictionary, bucket timestamp => row
+            :return: ``return_dict``
+        '''
+        if (self.agg == 'mean'):
+            for (bucket, entity), count in self.__counts.items():
+                target = return_dict[bucket]
+                if (entity is not None):
+                    target = target[entity]
+                for fieldname, value in target.items():
+                    if (not isinstance(value, str)):
+                        target[fieldname] = float(value) / count
+
+        self.__counts = {}
+
+        return return_dict
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.rules` is a module containing threshold and anomaly rules over
+parsed SAR data, such as "CPU iowait > 30% for 5+ minutes", "major fault
+spikes" or "swap in use".
+
+Rules are evaluated with NumPy over whole columns of a section (one per
+CPU / interface for ``cpu`` and ``net``) and return intervals where they
+fired, as :class:`Event` objects which :class:`sar.viz.Visualization` can
+shade on its charts.
+'''
+
+from sar import ENTITY_SECTIONS, SECTION_FIELDS
+from sar.timeutil import seconds_to_time, time_to_seconds
+
+"""Comparison operators of threshold rules"""
+OPERATORS = ('>', '>=', '<', '<=')
+
+"""Detectors of rules: plain threshold, rolling z-score, EWMA deviation"""
+DETECTORS = ('threshold', 'zscore', 'ewma')
+
+"""Length of blocks EWMA is computed in, keeps powers of (1 - alpha)
+from underflowing"""
+EWMA_BLOCK = 128
+
+
+class Event(object):
+    '''
+    Interval where a rule fired
+    '''
+
+    __slots__ = ('rule', 'section', 'entity', 'start', 'end', 'peak')
+
+    def __init__(self, rule, section, entity, start, end, peak):
+
+        self.rule = rule
+        '''Name of the rule'''
+        self.section = section
+        '''Section of SAR data'''
+        self.entity = entity
+        '''CPU id / interface name for ``cpu`` and ``net``, else ``None``'''
+        self.start = start
+        '''First sample time, in seconds (since midnight for parsed days)'''
+        self.end = end
+        '''Last sample time'''
+        self.peak = peak
+        '''Most extreme value of the field (or score) during the event'''
+
+    def as_dict(self):
+        '''
+        Returns event as ``Dictionary``, with times as ``HH:MM:SS`` if they
+        are within a day
+        '''
+        event = dict((name, getattr(self, name)) for name in self.__slots__)
+        if (self.end < 86400):
+            event['start'] = seconds_to_time(int(self.start))
+            event['end'] = seconds_to_time(int(self.end))
+        return event
+
+    def __repr__(self):
+        return 'Event(%r, %r, %r, %r, %r, %r)' % tuple(
+            getattr(self, name) for name in self.__slots__)
+
+
+class Rule(object):
+    '''
+    Single rule over a field of a SAR section
+        :param name: Name of the rule, reported in events
+        :type name: str.
+        :param section: Name of SAR section (``cpu``, ``mem``, ...)
+        :type section: str.
+        :param field: Field name (``iowait``, ``majflt``, ...)
+        :type field: str.
+        :param threshold: Value (``threshold`` detector) or score
+            (``zscore``, ``ewma`` detectors) the field is compared with
+        :type threshold: float.
+        :param op: Comparison with threshold, one of :data:`OPERATORS`;
+            scores are compared by their absolute value
+        :type op: str.
+        :param min_duration: Fire only when condition holds for at least
+            this many seconds (first to last matching sample)
+        :type min_duration: int.
+        :param entity: CPU id / interface name for ``cpu`` and ``net``, all
+            of them if ``None``
+        :type entity: str.
+        :param detector: One of :data:`DETECTORS`
+        :type detector: str.
+        :param window: Number of preceding samples of rolling z-score
+        :type window: int.
+        :param alpha: Smoothing factor of EWMA
+        :type alpha: float.
+    '''
+
+    def __init__(self, name, section, field, threshold, op='>',
+                 min_duration=0, entity=None, detector='threshold',
+                 window=60, alpha=0.1):
+
+        if (section not in SECTION_FIELDS):
+            raise ValueError('Unknown SAR section: %s' % (section,))
+        if (field not in SECTION_FIELDS[section]):
+            raise ValueError('Unknown field %s in section %s' %
+                             (field, section))
+        if (op not in OPERATORS):
+            raise ValueError('Unknown operator: %s' % (op,))
+        if (detector not in DETECTORS):
+            raise ValueError('Unknown detector: %s' % (detector,))
+        if (window < 2):
+            raise ValueError('Window must span at least 2 samples')
+        if (not 0 < alpha <= 1):
+            raise ValueError('EWMA alpha must be within (0, 1]')
+
+        self.name = name
+        '''Name of the rule'''
+        self.section = section
+        '''Name of SAR section'''
+        self.field = field
+        '''Field name'''
+        self.threshold = threshold
+        '''Value or score the field is compared with'''
+        self.op = op
+        '''Comparison with threshold'''
+        self.min_duration = min_duration
+        '''Minimum duration of events, in seconds'''
+        self.entity = entity
+        '''CPU id / interface name, all of them if ``None``'''
+        self.detector = detector
+        '''Detector, one of :data:`DETECTORS`'''
+        self.window = window
+        '''Number of preceding samples of rolling z-score'''
+        self.alpha = alpha
+        '''Smoothing factor of EWMA'''
+
+    def scan(self, times, values):
+        '''
+        Finds intervals where the rule fires in a single series
+            :param times: Sorted sample times, in seconds
+            :type times: ``numpy.ndarray``
+            :param values: Field values (``NaN`` for missing ones)
+            :type values: ``numpy.ndarray``
+            :return: ``List`` of (start, end, peak) ``tuple``s
+        '''
+        import numpy as np
+
+        if (not len(values)):
+            return []
+
+        if (self.detector == 'zscore'):
+            scores = np.abs(_rolling_zscore(values, self.window))
+        elif (self.detector == 'ewma'):
+            scores = np.abs(_ewma_score(values, self.alpha))
+        else:
+            scores = values
+
+        with np.errstate(invalid='ignore'):
+            if (self.op == '>'):
+                mask = scores > self.threshold
+            elif (self.op == '>='):
+                mask = scores >= self.threshold
+            elif (self.op == '<'):
+                mask = scores < self.threshold
+            else:
+                mask = scores <= self.threshold
+
+        # Runs of matching samples, from rising and falling edges
+        edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1) - 1
+        if (not len(starts)):
+            return []
+
+        # Peak of each run in one pass, samples between runs are masked out
+        if (self.op in ('<', '<=') and self.detector == 'threshold'):
+            peaks = np.minimum.reduceat(np.where(mask, scores, np.inf),
+                                        starts)
+        else:
+            peaks = np.maximum.reduceat(np.where(mask, scores, -np.inf),
+                                        starts)
+
+        keep = times[ends] - times[starts] >= self.min_duration
+
+        return list(zip(times[starts[keep]].tolist(),
+                        times[ends[keep]].tolist(), peaks[keep].tolist()))
+
+
+class RuleSet(object):
+    '''
+    Set of rules evaluated together
+        :param rules: Rules to evaluate
+        :type rules: ``List`` of :class:`Rule`
+    '''
+
+    def __init__(self, rules=None):
+
+        self.rules = list(rules or [])
+        '''Rules to evaluate'''
+
+    def add(self, rule):
+        '''
+        Adds a rule
+            :param rule: Rule to add
+            :type rule: :class:`Rule`
+        '''
+        self.rules.append(rule)
+
+    def evaluate(self, sar_info):
+        '''
+        Evaluates rules over parsed SAR data of a day
+            :param sar_info: ``Dictionary``-style SAR data, as returned by
+                :meth:`sar.parser.Parser.get_sar_info`
+            :return: ``List`` of :class:`Event`, ordered by start time, with
+                times in seconds since midnight
+        '''
+        events = []
+        series = {}
+        for rule in self.rules:
+            samples = sar_info.get(rule.section)
+            if (not samples):
+                continue
+            for entity, times, values in _day_series(
+                    samples, rule, series):
+                events.extend(Event(rule.name, rule.section, entity, *found)
+                              for found in rule.scan(times, values))
+
+        events.sort(key=lambda event: (event.start, event.rule))
+        return events
+
+    def evaluate_columns(self, columns):
+        '''
+        Evaluates rules over columnar SAR data, spanning any time range
+            :param columns: Section name => columns, as returned by
+                :meth:`sar.store.Store.query` (of a single host) or
+                :meth:`sar.ingest.Ingester.merge`
+            :return: ``List`` of :class:`Event`, ordered by start time, with
+                times in seconds since epoch
+        '''
+        import numpy as np
+
+        events = []
+        for rule in self.rules:
+            section_columns = columns.get(rule.section)
+            if (not section_columns or rule.field not in section_columns):
+                continue
+
+            times = np.asarray(section_columns['ts'], dtype=float)
+            values = np.array(section_columns[rule.field], dtype=float)
+
+            if (rule.section in ENTITY_SECTIONS):
+                entities = np.asarray(section_columns['entity'])
+                wanted = [rule.entity] if rule.entity is not None \
+                    else np.unique(entities).tolist()
+                groups = [(entity, entities == entity) for entity in wanted]
+            else:
+                groups = [(None, slice(None))]
+
+            for entity, selected in groups:
+                events.extend(
+                    Event(rule.name, rule.section, entity, *found)
+                    for found in rule.scan(times[selected],
+                                           values[selected]))
+
+        events.sort(key=lambda event: (event.start, event.rule))
+        return events
+
+
+def _day_series(samples, rule, cache):
+    '''
+    Extracts series a rule is evaluated over from a parsed section, shared
+    between rules over the same field
+        :return: ``List`` of (entity, times, values)
+    '''
+    import numpy as np
+
+    key = (rule.section, rule.field, rule.entity)
+    if (key in cache):
+        return cache[key]
+
+    full_times = sorted(samples.keys())
+    times = np.array([time_to_seconds(t) for t in full_times], dtype=float)
+    field = rule.field
+
+    if (rule.section in ENTITY_SECTIONS):
+        entities = [rule.entity] if rule.entity is not None else \
+            sorted(set(entity for sample in samples.values()
+                       for entity in sample))
+        nan = float('nan')
+        series = []
+        for entity in entities:
+            values = np.array([samples[t].get(entity, {}).get(field, nan)
+                               for t in full_times], dtype=float)
+            series.append((entity, times, values))
+    else:
+        series = [(None, times, np.array(
+            [samples[t].get(field) for t in full_times], dtype=float))]
+
+    cache[key] = series
+    return series
+
+
+def _rolling_zscore(values, window):
+    '''
+    Z-score of each sample against mean and deviation of ``window``
+    preceding samples, from cumulative sums. Missing (``NaN``) samples are
+    left out of the windows.
+        :return: ``numpy.ndarray`` of scores, ``NaN`` for first samples
+    '''
+    import numpy as np
+
+    count = len(values)
+    scores = np.full(count, np.nan)
+    valid = ~np.isnan(values)
+    if (count <= window or not valid.any()):
+        return scores
+
+    # Sums of deviations from the overall mean keep their precision on
+    # long series of large, barely changing values, where sums of the
+    # values themselves would cancel out in the variance
+    centered = np.where(valid, values - values[valid].mean(), 0.0)
+    sums = np.concatenate(([0.0], np.cumsum(centered)))
+    squares = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+
+    # Window of sample i is [i - window, i)
+    ends = np.arange(window, count)
+    samples = counts[ends] - counts[ends - window]
+    total = sums[ends] - sums[ends - window]
+    total_sq = squares[ends] - squares[ends - window]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / samples
+        variance = np.maximum(total_sq / samples - mean * mean, 0.0)
+        std = np.sqrt(variance)
+        scores[window:] = np.where(
+            std > 0, (centered[window:] - mean) / std, np.nan)
+    scores[~valid] = np.nan
+    return scores
+
+
+def _ewma(values, alpha):
+    '''
+    Exponentially weighted moving average, vectorized within blocks of
+    :data:`EWMA_BLOCK` samples
+        :return: ``numpy.ndarray``
+    '''
+    import numpy as np
+
+    count = len(values)
+    result = np.empty(count)
+    decay = 1.0 - alpha
+    powers = decay ** np.arange(1, EWMA_BLOCK + 1)
+    # weights[i, j] = alpha * decay^(i - j) for j <= i
+    offsets = np.arange(EWMA_BLOCK)[:, None] - np.arange(EWMA_BLOCK)[None, :]
+    weights = np.where(offsets >= 0, alpha * decay ** np.maximum(offsets, 0),
+                       0.0)
+
+    state = values[0]
+    for start in range(0, count, EWMA_BLOCK):
+        block = values[start:start + EWMA_BLOCK]
+        size = len(block)
+        smoothed = weights[:size, :size].dot(block) + powers[:size] * state
+        result[start:start + size] = smoothed
+        state = smoothed[-1]
+
+    return result
+
+
+def _ewma_score(values, alpha):
+    '''
+    Deviation of each sample from EWMA of preceding samples, in units of
+    exponentially weighted standard deviation
+        :return: ``numpy.ndarray`` of scores, ``NaN`` where undefined
+    '''
+    import numpy as np
+
+    filled = values.copy()
+    missing = np.isnan(filled)
+    if (missing.all()):
+        return filled
+    if (missing.any()):
+        # Carry last known value over gaps
+        index = np.where(~missing, np.arange(len(filled)), 0)
+        np.maximum.accumulate(index, out=index)
+        filled = filled[index]
+        filled[:np.argmax(~missing)] = filled[np.argmax(~missing)]
+
+    mean = _ewma(filled, alpha)
+    previous = np.concatenate(([filled[0]], mean[:-1]))
+    deviation = filled - previous
+    variance = _ewma(deviation * deviation, alpha)
+    std = np.sqrt(np.concatenate(([0.0], variance[:-1])))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(std > 0, deviation / std, np.nan)
+    scores[missing] = np.nan
+    return scores
@@ -0,0 +1,421 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.server` is a module containing small HTTP report service over a
+directory of SAR ASCII files.
+
+Files are found by their header line (host name and date). Parsed files
+are kept in the process-wide parser cache (see :mod:`sar.cache`), rendered
+charts in an in-memory LRU keyed on file identity and render options.
+Charts are rendered in a pool of worker processes, so concurrent requests
+don't wait on each other. Endpoints::
+
+    GET /hosts                          hosts and their dates
+    GET /stats                          hit/miss/eviction counters of caches
+    GET /data/<host>/<date>             parsed data, as JSON
+    GET /summary/<host>/<date>          summary of parsed data, as JSON
+    GET /chart/<host>/<date>.png        rendered chart (also .svg)
+
+Dates are ISO formatted (``YYYY-MM-DD``). ``/data`` takes ``section``
+(comma separated), ``/chart`` takes ``charts`` (comma separated, out of
+``cpu``, ``mem``, ``paging``, ``net``, ``disk``), both take ``start`` and
+``end`` (``HH:MM[:SS]``, inclusive). Run locally with::
+
+    python -m sar.server ./data --port 8000
+'''
+
+from sar.cache import LRUCache, file_identity
+import sar.cache as sarcache
+from sar.timeutil import parse_date
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+"""Charts available in rendered images, with Visualization switches"""
+CHARTS = {'cpu': 'cpu', 'mem': 'mem', 'paging': 'paging', 'net': 'network',
+          'disk': 'disk'}
+
+"""Charts rendered when request doesn't say"""
+DEFAULT_CHARTS = ('cpu', 'mem')
+
+"""Image formats and their content types"""
+IMAGE_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+"""Number of chart rasters kept by each rendering process"""
+PANEL_CACHE_SIZE = 64
+
+"""Chart rasters of this rendering process, see :func:`render_chart`"""
+_panel_cache = None
+
+"""Time of day in request parameters"""
+PATTERN_TIME = re.compile(r'^([0-9]{1,2}):([0-9]{2})(?::([0-9]{2}))?$')
+
+"""Request paths"""
+PATTERN_PATH = re.compile(
+    r'^/(data|summary|chart)/([^/]+)/([0-9]{4}-[0-9]{2}-[0-9]{2})'
+    r'(?:\.(png|svg))?$')
+
+
+class RequestError(Exception):
+    '''
+    Request can't be served, carries HTTP status for the response
+    '''
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def render_chart(sar_info, charts, image_format):
+    '''
+    Renders chart image of parsed SAR data. Runs in worker processes.
+    PNG images are composited from rasters of single charts kept by the
+    process, so switching a chart on or off renders only that chart.
+        :param sar_info: ``Dictionary``-style SAR data
+        :param charts: Names of charts to render, see :data:`CHARTS`
+        :param image_format: ``png`` or ``svg``
+        :return: Image bytes
+    '''
+    from sar import viz
+    global _panel_cache
+
+    switches = dict((switch, name in charts)
+                    for name, switch in CHARTS.items())
+    output_type = viz.Visualization.PNG_OUTPUT
+    if (image_format == 'svg'):
+        output_type = viz.Visualization.SVG_OUTPUT
+    elif (_panel_cache is None):
+        _panel_cache = LRUCache(PANEL_CACHE_SIZE)
+
+    output = io.BytesIO()
+    viz.Visualization(sar_info, panel_cache=_panel_cache,
+                      **switches).save(output, output_type)
+
+    return output.getvalue()
+
+
+def slice_sar_info(sar_info, start=None, end=None, sections=None):
+    '''
+    Returns parsed SAR data limited to a time range and set of sections
+        :param sar_info: ``Dictionary``-style SAR data
+        :param start: First time point (``HH:MM:SS``) to keep
+        :param end: Last time point (``HH:MM:SS``) to keep
+        :param sections: Names of sections to keep, all by default
+        :return: ``Dictionary``-style SAR data
+    '''
+    sliced = {}
+    for section, samples in sar_info.items():
+        if (sections is not None and section not in sections):
+            continue
+        if (start is None and end is None):
+            sliced[section] = samples
+            continue
+        sliced[section] = dict(
+            (full_time, sample) for full_time, sample in samples.items()
+            if ((start is None or full_time >= start) and
+                (end is None or full_time <= end)))
+
+    return sliced
+
+
+class ReportService(object):
+    '''
+    SAR report service over a directory of SAR ASCII files, independent of
+    the HTTP layer
+        :param data_dir: Directory with SAR files (searched recursively)
+        :type data_dir: str.
+        :param workers: Number of chart rendering processes
+        :type workers: int.
+        :param image_cache_size: Number of rendered images kept in memory
+        :type image_cache_size: int.
+    '''
+
+    def __init__(self, data_dir, workers=2, image_cache_size=64):
+
+        self.data_dir = data_dir
+        '''Directory with SAR files'''
+        self.parsed = sarcache.parsers
+        '''Process-wide cache of parsers with loaded data'''
+        self.images = LRUCache(image_cache_size, sizeof=len)
+        '''(file identity, render options) => image bytes'''
+        self.pool = multiprocessing.Pool(workers)
+        '''Chart rendering processes'''
+
+        self.__catalog = {}
+        '''(host, ISO date) => file name'''
+        self.__headers = {}
+        '''File name => (mtime, host, ISO date) of already read headers'''
+        self.__lock = threading.Lock()
+        '''Guards catalog'''
+
+    def close(self):
+        '''
+        Stops rendering processes
+        '''
+        self.pool.close()
+        self.pool.join()
+
+    def scan(self):
+        '''
+        Rescans data directory for SAR files
+            :return: ``Dictionary`` of host => sorted ``List`` of ISO dates
+        '''
+        catalog = {}
+        headers = {}
+        for dirpath, dirnames, filenames in os.walk(self.data_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                header = self.__read_header(path)
+                if (header is not None):
+                    headers[path] = header
+                    catalog[(header[1], header[2])] = path
+
+        with self.__lock:
+            self.__catalog = catalog
+            self.__headers = headers
+
+        hosts = {}
+        for host, date in catalog:
+            hosts.setdefault(host, []).append(date)
+        for dates in hosts.values():
+            dates.sort()
+
+        return hosts
+
+    def stats(self):
+        '''
+        Returns counters of caches
+            :return: ``Dictionary`` of ``parsed`` and ``images`` counters,
+                see :meth:`sar.cache.LRUCache.stats`
+        '''
+        return {'parsed': self.parsed.stats(), 'images': self.images.stats()}
+
+    def data(self, host, date, sections=None, start=None, end=None):
+        '''
+        Returns parsed SAR data of a host and day
+            :return: ``Dictionary``-style SAR data
+        '''
+        parser = self.__parser(host, date)
+        return slice_sar_info(parser.get_sar_info(), start, end, sections)
+
+    def summary(self, host, date):
+        '''
+        Returns summary of SAR data of a host and day
+            :return: See :meth:`sar.parser.Parser.get_summary`
+        '''
+        return self.__parser(host, date).get_summary()
+
+    def chart(self, host, date, image_format='png', charts=DEFAULT_CHARTS,
+              start=None, end=None):
+        '''
+        Returns rendered chart of SAR data of a host and day
+            :return: Image bytes
+        '''
+        path = self.__find(host, date)
+        key = (file_identity(path), image_format, tuple(sorted(charts)),
+               start, end)
+
+        image = self.images.get(key)
+        if (image is None):
+            sar_info = slice_sar_info(
+                self.__parser(host, date).get_sar_info(), start, end)
+            if (not any(sar_info.get(section)
+                        for section in ('cpu', 'mem', 'paging', 'net',
+                                        'io'))):
+                raise RequestError(404, 'No data in requested range')
+            image = self.pool.apply_async(
+                render_chart, (sar_info, charts, image_format)).get()
+            self.images.put(key, image)
+
+        return image
+
+    def __parser(self, host, date):
+        '''
+        Returns parser with loaded data of a host and day, from cache if
+        the file didn't change since it was parsed
+        '''
+        path = self.__find(host, date)
+
+        parser = sarcache.get_parser(path)
+        if (parser is False):
+            raise RequestError(500, 'Failed to parse %s' % (path,))
+
+        return parser
+
+    def __find(self, host, date):
+        '''
+        Returns name of SAR file of a host and day, rescanning data
+        directory if it is not known yet
+        '''
+        with self.__lock:
+            path = self.__catalog.get((host, date))
+        if (path is None or not os.path.exists(path)):
+            self.scan()
+            with self.__lock:
+                path = self.__catalog.get((host, date))
+        if (path is None):
+            raise RequestError(404, 'No SAR data of %s on %s' % (host, date))
+
+        return path
+
+    def __read_header(self, path):
+        '''
+        Reads host name and date from SAR file header line
+            :return: (mtime, host, ISO date), ``None`` if not a SAR file
+        '''
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        known = self.__headers.get(path)
+        if (known is not None and known[0] == mtime):
+            return known
+
+        try:
+            with open(path, 'rb') as fhandle:
+                info = fhandle.readline(4096).decode('ascii', 'replace') \
+                    .split()
+        except (IOError, OSError):
+            return None
+
+        if (len(info) < 4 or info[0] != 'Linux'):
+            return None
+        date = parse_date(info[3])
+        if (date is None):
+            return None
+
+        return (mtime, info[2].strip('()'), date.isoformat())
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    '''
+    HTTP request handler of :class:`ReportService` endpoints
+    '''
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        query = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+
+        try:
+            if (url.path in ('/', '/hosts')):
+                return self.__send_json(service.scan())
+            if (url.path == '/stats'):
+                return self.__send_json(service.stats())
+
+            match = PATTERN_PATH.match(url.path)
+            if (not match):
+                raise RequestError(404, 'Unknown path %s' % (url.path,))
+            endpoint, host, date, image_format = match.groups()
+
+            start = self.__time_param(query, 'start', '00')
+            end = self.__time_param(query, 'end', '59')
+
+            if (endpoint == 'data' and image_format is None):
+                sections = None
+                if ('section' in query):
+                    sections = query['section'].split(',')
+                self.__send_json(
+                    service.data(host, date, sections, start, end))
+            elif (endpoint == 'summary' and image_format is None):
+                self.__send_json(service.summary(host, date))
+            elif (endpoint == 'chart' and image_format is not None):
+                charts = DEFAULT_CHARTS
+                if ('charts' in query):
+                    charts = query['charts'].split(',')
+                    for chart in charts:
+                        if (chart not in CHARTS):
+                            raise RequestError(400, 'Unknown chart %s' %
+                                               (chart,))
+                self.__send(200, IMAGE_TYPES[image_format], service.chart(
+                    host, date, image_format, charts, start, end))
+            else:
+                raise RequestError(404, 'Unknown path %s' % (url.path,))
+
+        except RequestError as exc:
+            self.__send_json({'error': str(exc)}, exc.status)
+
+        except Exception as exc:
+            logging.exception('Failed to serve %s', self.path)
+            self.__send_json({'error': repr(exc)}, 500)
+
+    def __time_param(self, query, name, seconds):
+        '''
+        Returns time of day parameter as ``HH:MM:SS``, ``None`` if not given
+            :param seconds: Seconds used when parameter has none
+        '''
+        value = query.get(name)
+        if (value is None):
+            return None
+
+        match = PATTERN_TIME.match(value)
+        if (not match):
+            raise RequestError(400, 'Invalid %s time %s' % (name, value))
+        hours, minutes, secs = match.groups()
+
+        return '%02d:%s:%s' % (int(hours), minutes, secs or seconds)
+
+    def __send_json(self, payload, status=200):
+        self.__send(status, 'application/json',
+                    json.dumps(payload, sort_keys=True).encode('utf-8'))
+
+    def __send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ReportServer(ThreadingMixIn, HTTPServer):
+    '''
+    Threaded HTTP server of a :class:`ReportService`
+        :param address: (host, port) to listen on
+        :param service: Service serving the requests
+        :type service: :class:`ReportService`
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        HTTPServer.__init__(self, address, ReportRequestHandler)
+        self.service = service
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(
+        description='HTTP report service over a directory of SAR files')
+    argparser.add_argument('data_dir')
+    argparser.add_argument('--host', default='127.0.0.1')
+    argparser.add_argument('--port', type=int, default=8000)
+    argparser.add_argument('--workers', type=int, default=2,
+                           help='chart rendering processes')
+    options = argparser.parse_args(argv)
+
+    service = ReportService(options.data_dir, workers=options.workers)
+    server = ReportServer((options.host, options.port), service)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.stats` is a module containing helpers for computing summary
+statistics over SAR data in a single pass.
+'''
+
+import math
+
+
+class RunningStats(object):
+    '''
+    Online mean, standard deviation, minimum and maximum of a series of
+    values (Welford's algorithm). Values are pushed one by one, nothing
+    but the running figures is kept in memory.
+    '''
+
+    __slots__ = ('count', 'mean', 'min', 'max', '_m2')
+
+    def __init__(self):
+
+        self.count = 0
+        '''Number of values pushed so far'''
+        self.mean = 0.0
+        '''Running mean'''
+        self.min = None
+        '''Smallest value seen, ``None`` if no values were pushed'''
+        self.max = None
+        '''Largest value seen, ``None`` if no values were pushed'''
+        self._m2 = 0.0
+        '''Sum of squared differences from the running mean'''
+
+    def push(self, value):
+        '''
+        Adds value to the running statistics
+            :param value: Value to add
+            :type value: float.
+        '''
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        if (self.min is None or value < self.min):
+            self.min = value
+        if (self.max is None or value > self.max):
+            self.max = value
+
+    def merge(self, other):
+        '''
+        Merges statistics of another :class:`RunningStats` into this one
+        (Chan's parallel variance formula).
+            :param other: Statistics to merge in
+            :type other: :class:`RunningStats`
+            :return: ``self``, for chaining
+        '''
+        if (other.count == 0):
+            return self
+
+        if (self.count == 0):
+            self.count = other.count
+            self.mean = other.mean
+            self.min = other.min
+            self.max = other.max
+            self._m2 = other._m2
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + \
+            delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        return self
+
+    @property
+    def variance(self):
+        '''Population variance of pushed values'''
+        if (self.count == 0):
+            return 0.0
+        return self._m2 / self.count
+
+    @property
+    def stddev(self):
+        '''Population standard deviation of pushed values'''
+        return math.sqrt(self.variance)
+
+    def as_dict(self):
+        '''
+        Returns the running figures
+            :return: ``Dictionary`` with ``count``, ``mean``, ``min``,
+                ``max`` and ``stddev`` keys
+        '''
+        return {
+            'count': self.count, 'mean': self.mean, 'min': self.min,
+            'max': self.max, 'stddev': self.stddev
+        }
+
+
+class QuantileSketch(object):
+    '''
+    Mergeable quantile sketch with relative error guarantee (DDSketch
+    style). Values are counted in logarithmically sized buckets, so memory
+    depends on the range of values and not on how many of them there are.
+        :param relative_accuracy: Relative error of returned quantiles
+        :type relative_accuracy: float.
+        :param max_buckets: Maximum number of buckets per sign, lowest
+            buckets are collapsed together once it is reached
+        :type max_buckets: int.
+    '''
+
+    """Values closer to zero than this are counted as zeros"""
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+
+        self.relative_accuracy = relative_accuracy
+        '''Relative error of returned quantiles'''
+        self.max_buckets = max_buckets
+        '''Maximum number of buckets per sign'''
+        self.count = 0
+        '''Number of values added so far'''
+
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive = {}
+        '''Bucket index => count, for positive values'''
+        self._negative = {}
+        '''Bucket index => count, for negative values (by magnitude)'''
+        self._zeros = 0
+        '''Count of values too close to zero to be bucketed'''
+
+    def add(self, value):
+        '''
+        Adds value to the sketch
+            :param value: Value to add
+            :type value: float.
+        '''
+        self.count += 1
+
+        if (value > self.MIN_VALUE):
+            store = self._positive
+        elif (value < -self.MIN_VALUE):
+            store = self._negative
+            value = -value
+        else:
+            self._zeros += 1
+            return
+
+        key = int(math.ceil(math.log(value) / self._log_gamma))
+        try:
+            store[key] += 1
+        except KeyError:
+            store[key] = 1
+            if (len(store) > self.max_buckets):
+                self.__collapse(store)
+
+    def merge(self, other):
+        '''
+        Merges another sketch (of the same accuracy) into this one
+            :param other: Sketch to merge in
+            :type other: :class:`QuantileSketch`
+            :return: ``self``, for chaining
+        '''
+        if (other.relative_accuracy != self.relative_accuracy):
+            raise ValueError(
+                'Cannot merge sketches of different accuracy (%s vs %s)' %
+                (self.relative_accuracy, other.relative_accuracy))
+
+        for store, other_store in ((self._positive, other._positive),
+                                   (self._negative, other._negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+            if (len(store) > self.max_buckets):
+                self.__collapse(store)
+
+        self._zeros += other._zeros
+        self.count += other.count
+
+        return self
+
+    def quantile(self, q):
+        '''
+        Returns estimated value at the given quantile
+            :param q: Quantile, between 0 and 1
+            :type q: float.
+            :return: Estimated value, ``None`` if sketch is empty
+        '''
+        if (self.count == 0):
+            return None
+
+        rank = q * (self.count - 1)
+        seen = 0
+
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if (seen > rank):
+                return -self.__bucket_value(key)
+
+        seen += self._zeros
+        if (seen > rank):
+            return 0.0
+
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if (seen > rank):
+                return self.__bucket_value(key)
+
+        return self.__bucket_value(max(self._positive))
+
+    def __bucket_value(self, key):
+        '''
+        Returns representative value of a bucket
+            :param key: Bucket index
+            :type key: int.
+            :return: float.
+        '''
+        return 2 * math.pow(self._gamma, key) / (self._gamma + 1)
+
+    def __collapse(self, store):
+        '''
+        Collapses lowest buckets of a store into one, so it stays within
+        :attr:`max_buckets`
+            :param store: Bucket store (``Dictionary``) to collapse
+        '''
+        keys = sorted(store)
+        excess = keys[:len(keys) - self.max_buckets + 1]
+        target = keys[len(excess)]
+        for key in excess:
+            store[target] += store.pop(key)
+
+
+class Summary(object):
+    '''
+    Running summary of SAR data: count, mean, min, max, standard deviation
+    and quantiles per (section, entity, field), where entity is CPU id or
+    network interface for per-CPU and per-interface sections and ``None``
+    otherwise. Summaries of different files can be merged.
+        :param relative_accuracy: Relative error of quantiles
+        :type relative_accuracy: float.
+    '''
+
+    """Quantiles reported by :meth:`as_dict`"""
+    QUANTILES = (0.95, 0.99)
+
+    def __init__(self, relative_accuracy=0.01):
+
+        self.relative_accuracy = relative_accuracy
+        '''Relative error of quantiles'''
+        self.fields = {}
+        '''(section, entity, field) => (RunningStats, QuantileSketch)'''
+
+    def push(self, section, entity, fieldname, value):
+        '''
+        Adds a single value to the summary
+            :param section: Name of SAR section (``cpu``, ``mem``, ...)
+            :param entity: CPU id / interface name, ``None`` if not
+                applicable for the section
+            :param fieldname: Name of the field
+            :param value: Value to add
+        '''
+        try:
+            stats, sketch = self.fields[(section, entity, fieldname)]
+        except KeyError:
+            stats, sketch = self.fields[(section, entity, fieldname)] = \
+                (RunningStats(), QuantileSketch(self.relative_accuracy))
+
+        stats.push(value)
+        sketch.add(value)
+
+    def push_row(self, section, entity, row):
+        '''
+        Adds numeric values of a single parsed SAR row to the summary
+            :param section: Name of SAR section (``cpu``, ``mem``, ...)
+            :param entity: CPU id / interface name, ``None`` if not
+                applicable for the section
+            :param row: ``Dictionary`` of field name => value
+        '''
+        for fieldname, value in row.items():
+            if (not isinstance(value, str)):
+                self.push(section, entity, fieldname, value)
+
+    def push_sar_info(self, sar_info):
+        '''
+        Adds every sample of already parsed SAR data to the summary
+            :param sar_info: ``Dictionary``-style SAR data, as returned by
+                :meth:`sar.parser.Parser.get_sar_info`
+        '''
+        for section, samples in sar_info.items():
+            for sample in samples.values():
+                if (section == 'cpu' or section == 'net'):
+                    for entity, row in sample.items():
+                        self.push_row(section, entity, row)
+                else:
+                    self.push_row(section, None, sample)
+
+    def merge(self, other):
+        '''
+        Merges another summary into this one
+            :param other: Summary to merge in
+            :type other: :class:`Summary`
+            :return: ``self``, for chaining
+        '''
+        for key, (stats, sketch) in other.fields.items():
+            try:
+                own_stats, own_sketch = self.fields[key]
+            except KeyError:
+                own_stats, own_sketch = self.fields[key] = \
+                    (RunningStats(), QuantileSketch(self.relative_accuracy))
+            own_stats.merge(stats)
+            own_sketch.merge(sketch)
+
+        return self
+
+    def get(self, section, fieldname, entity=None, quantiles=QUANTILES):
+        '''
+        Returns summary figures of a single field
+            :param section: Name of SAR section (``cpu``, ``mem``, ...)
+            :param fieldname: Name of the field
+            :param entity: CPU id / interface name for ``cpu`` and ``net``
+            :param quantiles: Quantiles to include, as ``pXX`` keys
+            :return: ``Dictionary`` with ``count``, ``mean``, ``min``,
+                ``max``, ``stddev`` and quantile keys, ``None`` if the field
+                was never seen
+        '''
+        try:
+            stats, sketch = self.fields[(section, entity, fieldname)]
+        except KeyError:
+            return None
+
+        figures = stats.as_dict()
+        for q in quantiles:
+            # Sketch is accurate to a relative error only, exact extremes
+            # are known though
+            figures['p%g' % (q * 100)] = \
+                min(max(sketch.quantile(q), stats.min), stats.max)
+
+        return figures
+
+    def as_dict(self, quantiles=QUANTILES):
+        '''
+        Returns all summary figures
+            :param quantiles: Quantiles to include, as ``pXX`` keys
+            :return: ``Dictionary``-style summary, section => [entity =>]
+                field => figures (see :meth:`get`)
+        '''
+        summary = {}
+
+        for (section, entity, fieldname) in self.fields:
+            target = summary.setdefault(section, {})
+            if (entity is not None):
+                target = target.setdefault(entity, {})
+            target[fieldname] = \
+                self.get(section, fieldname, entity, quantiles)
+
+        return summary
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.store` is a module containing SQLite backed storage for parsed
+SAR data, indexed for time range queries over many hosts and days.
+
+Timestamps are stored as seconds since epoch of the wall clock time SAR
+recorded, taken as if it was UTC (SAR files carry no timezone).
+'''
+
+from sar import SECTION_FIELDS, ENTITY_SECTIONS
+from sar.timeutil import parse_date, time_to_seconds, to_epoch
+import sar.parser as sarparse
+import sar.multiparser as sarmultiparse
+import hashlib
+import os
+import sqlite3
+
+"""Size of blocks read while hashing ingested files"""
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class Store(object):
+    '''
+    SQLite store for parsed SAR data. Each section goes to its own table,
+    indexed on (host, ts, entity). Files are ingested only once, tracked
+    by their size, modification time and content hash.
+        :param path: Path of SQLite database file
+        :type path: str.
+    '''
+
+    def __init__(self, path):
+
+        self.path = path
+        '''Path of SQLite database file'''
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        '''Connection to the database'''
+
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self.__create_schema()
+
+    def close(self):
+        '''
+        Closes the database connection
+        '''
+        self._conn.close()
+
+    def ingest_file(self, filename, host=None, combined=False):
+        '''
+        Parses and stores a SAR file, unless it was already stored
+            :param filename: SAR ASCII file
+            :type filename: str.
+            :param host: Host name, taken from SAR file header (banner line
+                of each day for combined files) if not given
+            :type host: str.
+            :param combined: File contains several days of SAR output, see
+                :class:`sar.multiparser.Multiparser`
+            :type combined: bool.
+            :return: Number of stored rows, ``0`` if file was already
+                stored, ``False`` if parsing failed
+        '''
+        filename = os.path.abspath(filename)
+        filestat = os.stat(filename)
+
+        known = self._conn.execute(
+            'SELECT size, mtime FROM files WHERE path = ?',
+            (filename,)).fetchone()
+        if (known and known[0] == filestat.st_size and
+                known[1] == filestat.st_mtime):
+            return 0
+
+        digest = self.__hash_file(filename)
+        if (self._conn.execute('SELECT 1 FROM files WHERE sha1 = ?',
+                               (digest,)).fetchone()):
+            # Same content already stored under another path or mtime
+            self.__remember_file(filename, filestat, digest, host)
+            return 0
+
+        if (combined):
+            insar = sarmultiparse.Multiparser(filename)
+            if (not insar.load_file()):
+                return False
+            hostnames = insar.get_hostnames()
+            days = []
+            for datestr, sar_info in insar.get_sar_info().items():
+                day_host = host
+                if (day_host is None):
+                    day_host = hostnames.get(datestr)
+                if (not day_host):
+                    raise ValueError('Unknown host of SAR data on %s in %s' %
+                                     (datestr, filename))
+                days.append((day_host, parse_date(datestr), sar_info))
+            rows = 0
+            for day_host, date, sar_info in days:
+                rows += self.ingest_sar_info(day_host, date, sar_info)
+            if (host is None and
+                    len(set(day[0] for day in days)) == 1):
+                host = days[0][0]
+        else:
+            insar = sarparse.Parser(filename)
+            sar_info = insar.get_sar_info()
+            if (sar_info is False):
+                return False
+            if (host is None):
+                host = insar.get_hostname()
+            rows = self.ingest_sar_info(
+                host, parse_date(insar.get_filedate()), sar_info)
+
+        self.__remember_file(filename, filestat, digest, host)
+
+        return rows
+
+    def ingest_sar_info(self, host, date, sar_info):
+        '''
+        Stores parsed SAR data of a single day, in one transaction
+            :param host: Host name
+            :type host: str.
+            :param date: Day the data was recorded on
+            :type date: ``datetime.date``
+            :param sar_info: ``Dictionary``-style SAR data, as returned by
+                :meth:`sar.parser.Parser.get_sar_info`
+            :return: Number of stored rows
+        '''
+        if (date is None):
+            raise ValueError('Unknown date of SAR data for host %s' % (host,))
+
+        midnight = to_epoch(date)
+        rows = 0
+
+        with self._conn:
+            for section, fieldnames in SECTION_FIELDS.items():
+                samples = sar_info.get(section)
+                if (not samples):
+                    continue
+
+                statement = 'INSERT OR REPLACE INTO sar_%s ' \
+                    '(host, ts, entity, %s) VALUES (?, ?, ?, %s)' % (
+                        section, ', '.join(fieldnames),
+                        ', '.join('?' * len(fieldnames)))
+
+                batch = list(self.__section_rows(
+                    host, midnight, section, fieldnames, samples))
+                self._conn.executemany(statement, batch)
+                rows += len(batch)
+
+        return rows
+
+    def query(self, section, fields=None, host=None, start=None, end=None,
+              entity=None):
+        '''
+        Queries stored data of a section over a time range
+            :param section: Name of SAR section (``cpu``, ``mem``, ...)
+            :type section: str.
+            :param fields: Field names to return, all by default
+            :type fields: list.
+            :param host: Host name, all hosts by default
+            :type host: str.
+            :param start: Start of range (inclusive), ``datetime`` or
+                seconds since epoch
+            :param end: End of range (exclusive), ``datetime`` or seconds
+                since epoch
+            :param entity: CPU id / interface name for ``cpu`` and ``net``,
+                all by default
+            :type entity: str.
+            :return: ``Dictionary`` of columns (``list``), ``ts`` with
+                seconds since epoch, ``host``, ``entity`` (for ``cpu`` and
+                ``net``) and one per field, ordered by time
+        '''
+        if (section not in SECTION_FIELDS):
+            raise ValueError('Unknown SAR section: %s' % (section,))
+
+        if (fields is None):
+            fields = SECTION_FIELDS[section]
+        for fieldname in fields:
+            if (fieldname not in SECTION_FIELDS[section]):
+                raise ValueError('Unknown field %s in section %s' %
+                                 (fieldname, section))
+
+        conditions = []
+        params = []
+        if (host is not None):
+            conditions.append('host = ?')
+            params.append(host)
+        if (start is not None):
+            conditions.append('ts >= ?')
+            params.append(to_epoch(start))
+        if (end is not None):
+            conditions.append('ts < ?')
+            params.append(to_epoch(end))
+        if (entity is not None):
+            conditions.append('entity = ?')
+            params.append(entity)
+
+        statement = 'SELECT host, ts, entity, %s FROM sar_%s' % (
+            ', '.join(fields), section)
+        if (conditions):
+            statement += ' WHERE ' + ' AND '.join(conditions)
+        statement += ' ORDER BY ts, host, entity'
+
+        names = ['host', 'ts', 'entity'] + list(fields)
+        rows = self._conn.execute(statement, params).fetchall()
+        if (rows):
+            columns = dict(zip(names, [list(c) for c in zip(*rows)]))
+        else:
+            columns = dict((name, []) for name in names)
+
+        if (section not in ENTITY_SECTIONS):
+            del(columns['entity'])
+
+        return columns
+
+    def hosts(self):
+        '''
+        Returns names of hosts with stored data
+            :return: ``List`` of host names
+        '''
+        statement = ' UNION '.join(
+            'SELECT DISTINCT host FROM sar_%s' % (section,)
+            for section in SECTION_FIELDS)
+
+        return sorted(row[0] for row in self._conn.execute(statement))
+
+    def __section_rows(self, host, midnight, section, fieldnames, samples):
+        '''
+        Generates table rows of a parsed section
+            :return: Generator of (host, ts, entity, fields...) tuples
+        '''
+        has_entities = section in ENTITY_SECTIONS
+
+        for full_time, sample in samples.items():
+            ts = midnight + time_to_seconds(full_time)
+            if (has_entities):
+                for entity, row in sample.items():
+                    yield (host, ts, entity) + \
+                        tuple(row.get(f) for f in fieldnames)
+            else:
+                yield (host, ts, '') + \
+                    tuple(sample.get(f) for f in fieldnames)
+
+    def __hash_file(self, filename):
+        '''
+        Computes SHA-1 digest of file content
+            :param filename: File to hash
+            :return: Hex digest
+        '''
+        digest = hashlib.sha1()
+        with open(filename, 'rb') as fhandle:
+            block = fhandle.read(HASH_BLOCK_SIZE)
+            while (block):
+                digest.update(block)
+                block = fhandle.read(HASH_BLOCK_SIZE)
+
+        return digest.hexdigest()
+
+    def __remember_file(self, filename, filestat, digest, host):
+        '''
+        Records ingested file, so it is skipped next time
+        '''
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO files (path, size, mtime, sha1, host)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (filename, filestat.st_size, filestat.st_mtime, digest, host))
+
+    def __create_schema(self):
+        '''
+        Creates tables and indexes, if they don't exist yet
+        '''
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, '
+                'size INTEGER, mtime REAL, sha1 TEXT, host TEXT)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS files_sha1 ON files (sha1)')
+
+            for section, fieldnames in SECTION_FIELDS.items():
+                self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS sar_%s (host TEXT NOT NULL, '
+                    'ts INTEGER NOT NULL, entity TEXT NOT NULL, %s)' % (
+                        section, ', '.join('%s REAL' % f for f in fieldnames)))
+                self._conn.execute(
+                    'CREATE UNIQUE INDEX IF NOT EXISTS sar_%s_host_ts_entity '
+                    'ON sar_%s (host, ts, entity)' % (section, section))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+'''
+:mod:`sar.timeutil` is a module containing helpers for handling SAR
+timestamps and dates.
+'''
+
+import calendar
+import datetime
+
+"""Date formats SAR uses in its header line, depending on locale"""
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%d.%m.%Y']
+
+"""Meridiem columns of 12hr SAR timestamps"""
+MERIDIEMS = ('AM', 'PM')
+
+"""Seconds since midnight of 12hr clock hours, by (``HH``, meridiem)"""
+MERIDIEM_HOURS = dict(
+    (('%02d' % (hour,), meridiem),
+     (hour % 12 + (12 if meridiem == 'PM' else 0)) * 3600)
+    for hour in range(13) for meridiem in MERIDIEMS)
+
+
+def time_to_seconds(full_time):
+    '''
+    Converts SAR 24hr timestamp into number of seconds since midnight
+        :param full_time: Timestamp in ``HH:MM:SS`` format
+        :type full_time: str.
+        :return: int.
+    '''
+    return int(full_time[0:2]) * 3600 + int(full_time[3:5]) * 60 + \
+        int(full_time[6:8])
+
+
+def clock_to_seconds(clock, meridiem=None):
+    '''
+    Converts SAR timestamp, 24hr or 12hr one, into number of seconds since
+    midnight
+        :param clock: Timestamp in ``HH:MM:SS`` format
+        :type clock: str.
+        :param meridiem: ``AM`` or ``PM`` for 12hr timestamps, ``None`` for
+            24hr ones
+        :type meridiem: str.
+        :return: int.
+    '''
+    if (meridiem is None):
+        hours = int(clock[0:2]) * 3600
+    else:
+        hours = MERIDIEM_HOURS[(clock[0:2], meridiem)]
+
+    return hours + int(clock[3:5]) * 60 + int(clock[6:8])
+
+
+def seconds_to_time(seconds):
+    '''
+    Converts number of seconds since midnight into SAR 24hr timestamp
+        :param seconds: Seconds since midnight
+        :type seconds: int.
+        :return: Timestamp in ``HH:MM:SS`` format
+    '''
+    return '%02d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60,
+                               seconds % 60)
+
+
+def parse_date(datestr):
+    '''
+    Parses date from SAR header line, whichever locale format it is in
+        :param datestr: Date as found in SAR header
+        :type datestr: str.
+        :return: ``datetime.date``, ``None`` if date is not recognized
+    '''
+    for dateformat in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(datestr, dateformat).date()
+        except (ValueError, TypeError):
+            continue
+
+    return None
+
+
+def to_epoch(value):
+    '''
+    Converts point in time into seconds since epoch. SAR files carry no
+    timezone, so dates and times are taken as if they were UTC.
+        :param value: ``datetime.datetime``, ``datetime.date`` or number of
+            seconds since epoch
+        :return: int.
+    '''
+    if (isinstance(value, datetime.date)):
+        return calendar.timegm(value.timetuple())
+    return int(value)
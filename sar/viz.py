@@ -3,21 +3,108 @@
 :mod:`sar.viz` is a module containing classes for visualizing sar logs.
 '''
 
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.patches as mpatches
-import matplotlib.pyplot as plt
+import bisect
+import hashlib
+import os
+import sys
+import time
 
-import numpy as np
+from sar import canvas
+from sar.profiling import NULL_PROFILE
+
+"""matplotlib backend used for rendering, unless ``MPLBACKEND`` is set or
+``matplotlib.pyplot`` was already imported with another one"""
+BACKEND = 'Agg'
+
+"""Height of a single chart, in inches"""
+PANEL_HEIGHT = 4
+
+"""Number of busiest interfaces drawn on network chart, by default"""
+TOP_IFACES = 8
+
+
+def _pyplot():
+    """Import matplotlib on first render rather than on module import.
+
+    Parse-only users of the package never pay for matplotlib, and rendering
+    uses the non-interactive :data:`BACKEND` instead of probing for a
+    display.
+
+    Returns:
+        module: ``matplotlib.pyplot``
+    """
+    if 'matplotlib.pyplot' not in sys.modules and \
+            not os.environ.get('MPLBACKEND'):
+        import matplotlib
+        matplotlib.use(BACKEND)
+
+    import matplotlib.pyplot as plt
+    return plt
+
+
+"""Visualization charts are drawn from in this rendering process, see
+:func:`_render_panel_task`"""
+_worker_visualization = None
+
+
+def _init_panel_worker(visualization):
+    """Keep the visualization charts are drawn from in a rendering process.
+
+    Args:
+        visualization (:obj:`Visualization`): Preprocessed visualization
+    """
+    global _worker_visualization
+    _worker_visualization = visualization
+
+
+def _render_panel_task(name):
+    """Render a single chart in a rendering process.
+
+    Args:
+        name (str): Name of the chart, drawn by ``_draw_<name>`` of
+            :class:`Visualization`
+
+    Returns:
+        :obj:`numpy.ndarray`: height x width x 4 RGBA raster
+    """
+    visualization = _worker_visualization
+    return visualization._render_panel(
+        getattr(visualization, '_draw_' + name))
+
+
+def _save_figure(fig, output_path, output_type):
+    """Write a figure into a file and close it.
+
+    Args:
+        fig (:obj:`matplotlib.figure.Figure`): Figure to write
+        output_path (:obj:`str` or file-like object): Output file
+        output_type (int): One of ``Visualization.PDF_OUTPUT``,
+            ``Visualization.PNG_OUTPUT``, ``Visualization.SVG_OUTPUT``
+    """
+    if output_type == Visualization.PDF_OUTPUT:
+        from matplotlib.backends.backend_pdf import PdfPages
+        pp = PdfPages(output_path)
+        pp.savefig(fig)
+        pp.close()
+    elif output_type == Visualization.PNG_OUTPUT:
+        fig.savefig(output_path, format='png')
+    elif output_type == Visualization.SVG_OUTPUT:
+        fig.savefig(output_path, format='svg')
+    _pyplot().close(fig)
 
 
 class Visualization(object):
     PDF_OUTPUT = 0
     PNG_OUTPUT = 1
+    SVG_OUTPUT = 2
+    HTML_OUTPUT = 3
     SAR_TYPES = ['cpu', 'mem', 'io', 'paging', 'net']
     PLT_XTICK_LABEL_ROTATION = 'vertical'
 
     def __init__(self, sar_data, cpu=True, mem=True, paging=False, disk=False,
-                 network=False):
+                 network=False, profile=None, events=None, cpu_heatmap=False,
+                 top_cpus=0, panel_cache=None, workers=None,
+                 top_ifaces=TOP_IFACES):
         """Create a sar log visualization.
 
         Only CPU and memory usage charts are enabled by default.
@@ -29,6 +116,27 @@ class Visualization(object):
             paging (:obj:`bool`, optional): Enable paging activity charts
             disk (:obj:`bool`, optional): Enable disk usage charts
             network (:obj:`bool`, optional): Enable network usage charts
+            profile (:obj:`sar.profiling.Profile`, optional): Collects per
+                stage figures (``preprocess``, ``draw``, ``savefig``)
+            events (:obj:`list` of :obj:`sar.rules.Event`, optional): Rule
+                events to shade on charts of their sections
+            cpu_heatmap (:obj:`bool`, optional): Enable CPU x time heatmap
+                of busy percentage (100 - idle) of every core
+            top_cpus (:obj:`int`, optional): Enable chart of this many
+                busiest cores (by mean busy percentage)
+            panel_cache (:obj:`sar.cache.LRUCache`, optional): Cache of
+                chart rasters, keyed on data and options of each chart.
+                When given, PNG output is composited from rasters of single
+                charts, so only charts missing from the cache are rendered.
+            workers (:obj:`int`, optional): Render charts of PNG output in
+                this many processes (with the Agg backend), each chart on
+                its own, and stitch them into one image
+            top_ifaces (:obj:`int`, optional): Draw this many busiest
+                interfaces (by total throughput) on network chart, the rest
+                summed up as ``other``. None for drawing all of them.
+                Interfaces can be left out while parsing already, see
+                ``ifaces`` and ``exclude_ifaces`` of
+                :class:`sar.parser.Parser`.
         """
 
         if not isinstance(sar_data, dict):
@@ -41,8 +149,11 @@ class Visualization(object):
         self.enable_cpu = cpu
         self.enable_mem = mem
         self.enable_disk = disk
-        self.enable_net = disk
+        self.enable_net = network
         self.enable_paging = paging
+        self.enable_cpu_heatmap = cpu_heatmap
+        self.top_cpus = top_cpus
+        self.top_ifaces = top_ifaces
 
         self.time_points = []
         """(:obj:`list` of :obj:`str`): time points which system activity was
@@ -67,15 +178,93 @@ class Visualization(object):
         self.mem_used_mb = []
         self.mem_cached_mb = []
         self.mem_buffer_mb = []
-        self.kb_rcv_per_sec = {}
-        self.kb_trans_per_sec = {}
+        self.net_ifaces = []
+        """(:obj:`list` of :obj:`str`): interface names, in rows order of
+            ``net_rx`` and ``net_tx``"""
+        self.net_rx = None
+        """(:obj:`numpy.ndarray`): interface x time received KB/s, ``NaN``
+            for missing samples"""
+        self.net_tx = None
+        """(:obj:`numpy.ndarray`): interface x time transmitted KB/s,
+            ``NaN`` for missing samples"""
+        self.net_shown = None
+        """(:obj:`list` of :obj:`str`): interfaces to draw, busiest
+            ``top_ifaces`` ones if None"""
         self.breads_per_sec = []
         self.bwrites_per_sec = []
+        self.cpu_ids = []
+        """(:obj:`list` of :obj:`str`): CPU ids, in rows order of
+            ``cpu_busy``"""
+        self.cpu_busy = None
+        """(:obj:`numpy.ndarray`): CPU x time busy percentage, ``NaN`` for
+            missing samples"""
         self.fig_height = 0
         self.num_plots = 0
 
+        self.profile = profile
+        """:obj:`sar.profiling.Profile`: per stage figures, None if not
+            profiling"""
+        self._profiler = profile if profile is not None else NULL_PROFILE
+
+        self.events = events or []
+        """(:obj:`list` of :obj:`sar.rules.Event`): events shaded on charts"""
+
+        self.panel_cache = panel_cache
+        """:obj:`sar.cache.LRUCache`: cache of chart rasters, None for
+            rendering whole figure at once"""
+
+        if workers is not None and workers < 1:
+            raise ValueError('Number of workers must be positive')
+        self.workers = workers
+        """int: number of processes rendering charts, None for rendering
+            in this process"""
+
         self._calculate_plot_height()
-        self._preprocess_sar_data()
+        with self._profiler.stage('preprocess') as run:
+            self._preprocess_sar_data()
+            run.rows = len(self.time_points)
+
+    def __getstate__(self):
+        # Rendering processes need preprocessed data only
+        state = self.__dict__.copy()
+        state.update(sar_data={}, profile=None, _profiler=NULL_PROFILE,
+                     panel_cache=None, workers=None)
+        return state
+
+    @classmethod
+    def from_columns(cls, columns, **kwargs):
+        """Create a sar log visualization from columnar sar data.
+
+        Args:
+            columns (dict): Section name => columns (``ts`` in seconds since
+                epoch, ``entity`` for cpu and net, one column per field), as
+                returned by :meth:`sar.store.Store.query`
+            **kwargs: Chart switches, see :class:`Visualization`
+        """
+        days = set()
+        for section_columns in columns.values():
+            days.update(ts // 86400 for ts in section_columns['ts'])
+        time_format = '%Y-%m-%d %H:%M:%S' if len(days) > 1 else '%H:%M:%S'
+
+        sar_data = {}
+        time_points = {}
+        for section, section_columns in columns.items():
+            data = sar_data[section] = {}
+            entities = section_columns.get('entity')
+            field_names = [f for f in section_columns
+                           if f not in ('ts', 'host', 'entity')]
+
+            for i, ts in enumerate(section_columns['ts']):
+                if ts not in time_points:
+                    time_points[ts] = time.strftime(time_format,
+                                                    time.gmtime(ts))
+                row = dict((f, section_columns[f][i]) for f in field_names)
+                if entities is None:
+                    data[time_points[ts]] = row
+                else:
+                    data.setdefault(time_points[ts], {})[entities[i]] = row
+
+        return cls(sar_data, **kwargs)
 
     def _calculate_plot_height(self):
         num_plots = 0
@@ -83,6 +272,12 @@ class Visualization(object):
         if self.enable_cpu:
             num_plots += 1
 
+        if self.enable_cpu_heatmap:
+            num_plots += 1
+
+        if self.top_cpus:
+            num_plots += 1
+
         if self.enable_disk:
             num_plots += 1
 
@@ -101,15 +296,14 @@ class Visualization(object):
     def _preprocess_sar_data(self):
         for t in Visualization.SAR_TYPES:
             if t in self.sar_data:
-                time_points = self.sar_data[t].keys()
-                time_points.sort()
+                time_points = sorted(self.sar_data[t].keys())
                 self.time_points = time_points
                 break
 
         tp_count = len(time_points)
-        xtick_label_stepsize = tp_count / 15
-        self.x_data = range(tp_count)
-        self.xticks = np.arange(0, tp_count, xtick_label_stepsize)
+        xtick_label_stepsize = max(tp_count // 15, 1)
+        self.x_data = list(range(tp_count))
+        self.xticks = list(range(0, tp_count, xtick_label_stepsize))
         self.xtick_labels = [time_points[i] for i in self.xticks]
 
         if self.enable_cpu:
@@ -118,6 +312,9 @@ class Visualization(object):
             self.cpu_usage_usr = [self.sar_data['cpu'][tp]['all']['usr']
                                   for tp in self.time_points]
 
+        if self.enable_cpu_heatmap or self.top_cpus:
+            self._preprocess_cpu_busy()
+
         if self.enable_mem:
             self.pct_mem_used = [self.sar_data['mem'][tp]['memusedpercent'] / 1024
                                  for tp in self.time_points]
@@ -144,140 +341,715 @@ class Visualization(object):
             self.bwrites_per_sec = [self.sar_data['io'][tp]['bwrite'] for tp in self.time_points]
 
         if self.enable_net:
-            net_data = self.sar_data['net']
-            for tp in self.time_points:
-                dp = net_data[tp]
-                for iface in dp.keys():
-                    if iface not in self.kb_rcv_per_sec:
-                        self.kb_rcv_per_sec[iface] = [dp[iface]['rxkB']]
-                    else:
-                        self.kb_rcv_per_sec[iface].append(dp[iface]['rxkB'])
-
-                    if iface not in self.kb_trans_per_sec:
-                        self.kb_trans_per_sec[iface] = [dp[iface]['txkB']]
-                    else:
-                        self.kb_trans_per_sec[iface].append(dp[iface]['txkB'])
+            self._preprocess_net()
 
     def save(self, output_path, output_type=PDF_OUTPUT):
-        plt_idx = 1
-        fig = plt.figure()
-        fig.set_figheight(self.fig_height)
+        """Render enabled charts into a file.
 
-        plt.clf()
-        plt.subplots_adjust(wspace=1, hspace=1)
+        Args:
+            output_path (:obj:`str` or file-like object): Output file
+            output_type (:obj:`int`, optional): One of ``PDF_OUTPUT``,
+                ``PNG_OUTPUT``, ``SVG_OUTPUT``, ``HTML_OUTPUT`` (interactive
+                page, see :mod:`sar.canvas`)
+        """
+        if output_type == Visualization.HTML_OUTPUT:
+            with self._profiler.stage('html'):
+                canvas.write_html(output_path, self.time_points,
+                                  self._panels())
+            return
+
+        if (self.panel_cache is not None or self.workers) and \
+                output_type == Visualization.PNG_OUTPUT:
+            with self._profiler.stage('draw') as run:
+                raster, run.rows = self._composite()
+            with self._profiler.stage('savefig'):
+                import matplotlib.image
+                matplotlib.image.imsave(
+                    output_path, raster, format='png',
+                    dpi=_pyplot().rcParams['figure.dpi'])
+            return
+
+        with self._profiler.stage('draw') as run:
+            fig = self._draw()
+            run.rows = len(self.x_data) * self.num_plots
+
+        with self._profiler.stage('savefig'):
+            _save_figure(fig, output_path, output_type)
+
+    def _preprocess_cpu_busy(self):
+        """Fill dense CPU x time array of busy percentage in one pass."""
+        import numpy as np
+
+        cpu_data = self.sar_data['cpu']
+        ids = set()
+        for tp in self.time_points:
+            ids.update(cpu_data[tp].keys())
+        ids.discard('all')
+        self.cpu_ids = sorted(ids, key=lambda cpu_id: (len(cpu_id), cpu_id))
+        rows = dict((cpu_id, i) for i, cpu_id in enumerate(self.cpu_ids))
+
+        busy = np.full((len(self.cpu_ids), len(self.time_points)), np.nan)
+        for col, tp in enumerate(self.time_points):
+            for cpu_id, row in cpu_data[tp].items():
+                if cpu_id in rows:
+                    busy[rows[cpu_id], col] = row['idle']
+        self.cpu_busy = 100.0 - busy
+
+    def _preprocess_net(self):
+        """Fill dense interface x time arrays of throughput in one pass."""
+        import numpy as np
+
+        net_data = self.sar_data['net']
+        ids = set()
+        for tp in self.time_points:
+            ids.update(net_data.get(tp, {}).keys())
+        self.net_ifaces = sorted(ids)
+        rows = dict((iface, i) for i, iface in enumerate(self.net_ifaces))
+
+        shape = (len(self.net_ifaces), len(self.time_points))
+        self.net_rx = np.full(shape, np.nan)
+        self.net_tx = np.full(shape, np.nan)
+        for col, tp in enumerate(self.time_points):
+            for iface, row in net_data.get(tp, {}).items():
+                self.net_rx[rows[iface], col] = row['rxkB']
+                self.net_tx[rows[iface], col] = row['txkB']
+
+    def _net_series(self):
+        """Pick the busiest interfaces (or ``net_shown`` ones), summing up
+        the rest.
+
+        Returns:
+            list: ``(label, rx, tx)`` per drawn interface, busiest first,
+                followed by ``other`` (sum of the rest) if some were left
+                out
+        """
+        import numpy as np
+
+        if self.net_rx is None or not len(self.net_ifaces):
+            return []
+
+        order = np.argsort(-self._net_totals(), kind='mergesort')
+        if self.net_shown is not None:
+            rows = dict((iface, i) for i, iface in enumerate(self.net_ifaces))
+            top = [rows[iface] for iface in self.net_shown if iface in rows]
+        elif self.top_ifaces is not None:
+            top = list(order[:self.top_ifaces])
+        else:
+            top = list(order)
+        series = [(self.net_ifaces[i], self.net_rx[i], self.net_tx[i])
+                  for i in top]
+
+        shown = set(top)
+        rest = [i for i in order if i not in shown]
+        if len(rest):
+            series.append(('other', np.nansum(self.net_rx[rest], axis=0),
+                           np.nansum(self.net_tx[rest], axis=0)))
+
+        return series
+
+    def _net_totals(self):
+        """Sum up traffic of each interface.
+
+        Returns:
+            :obj:`numpy.ndarray`: received and transmitted KB/s summed over
+                time, in rows order of ``net_ifaces``
+        """
+        import numpy as np
+
+        return np.nansum(self.net_rx, axis=1) + np.nansum(self.net_tx, axis=1)
+
+    def _busiest_cpus(self):
+        """Pick the busiest cores.
+
+        Returns:
+            tuple: indexes (into ``cpu_ids``) of up to ``top_cpus`` cores,
+                busiest first
+        """
+        import numpy as np
+
+        if self.cpu_busy is None or not len(self.cpu_ids):
+            return []
+        means = np.nanmean(self.cpu_busy, axis=1)
+        means = np.where(np.isnan(means), -np.inf, means)
+        return np.argsort(-means, kind='mergesort')[:self.top_cpus]
+
+    def _panels(self):
+        """Describe enabled charts as panels of named series.
+
+        Returns:
+            list: ``(title, ylabel, stacked, [(label, values), ...])`` per
+                chart, in drawing order
+        """
+        panels = []
 
         if self.enable_cpu:
-            plt.subplot(self.num_plots, 1, plt_idx)
-            plt.xticks(self.xticks, self.xtick_labels,
-                       rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
-            plt.plot(self.x_data, self.cpu_usage_usr, label='usr')
-            plt.plot(self.x_data, self.cpu_usage_sys, label='sys')
-            plt.xlabel('time')
-            plt.ylabel('% usage')
-            plt.title('CPU Usage')
-            lg = plt.legend(frameon=False)
-            lg_txts = lg.get_texts()
-            plt.setp(lg_txts, fontsize=10)
-            plt_idx += 1
+            panels.append(('CPU Usage', '% usage', False, [
+                ('usr', self.cpu_usage_usr), ('sys', self.cpu_usage_sys)]))
 
-        if self.enable_mem:
-            plt.subplot(self.num_plots, 1, plt_idx)
-            plt.xticks(self.xticks, self.xtick_labels,
-                       rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
-            plt.plot(self.x_data, self.pct_mem_used, label='% mem used')
-            plt.xlabel('time')
-            plt.ylabel('% mem used')
-            plt.title('Percentage of Memory Used')
-            lg = plt.legend(frameon=False)
-            lg_txts = lg.get_texts()
-            plt.setp(lg_txts, fontsize=10)
-            plt_idx += 1
+        if self.top_cpus:
+            panels.append(('Busiest CPUs', '% busy', False, [
+                ('cpu {}'.format(self.cpu_ids[i]), self.cpu_busy[i])
+                for i in self._busiest_cpus()]))
 
-            plt.subplot(self.num_plots, 1, plt_idx)
-            plt.xticks(self.xticks, self.xtick_labels,
-                       rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
-            plt.stackplot(self.x_data, self.mem_buffer_mb, self.mem_cached_mb, self.mem_used_mb,
-                          colors=['lemonchiffon', 'navajowhite', 'sandybrown'])
-            plt.xlabel('time')
-            plt.ylabel('Mem Usage (MB)')
-            plt.title('Memory Usage')
-
-            # lc_handle = mpatches.Patch(color='lemonchiffon', label='Buffered Memory')
-            # nw_handle = mpatches.Patch(color='navajowhite', label='Cached Memory')
-            # sb_handle = mpatches.Patch(color='sandybrown', label='Used Memory')
-
-            lg = plt.legend([mpatches.Patch(color='lemonchiffon'),
-                             mpatches.Patch(color='navajowhite'),
-                             mpatches.Patch(color='sandybrown')],
-                            ['Buffered Memory', 'Cached Memory', 'Used Memory'])
-            lg.get_frame().set_alpha(0.6)
-            lg_txts = lg.get_texts()
-            plt.setp(lg_txts, fontsize=10)
-            plt_idx += 1
+        if self.enable_mem:
+            panels.append(('Percentage of Memory Used', '% mem used', False,
+                           [('% mem used', self.pct_mem_used)]))
+            panels.append(('Memory Usage', 'Mem Usage (MB)', True, [
+                ('Buffered Memory', self.mem_buffer_mb),
+                ('Cached Memory', self.mem_cached_mb),
+                ('Used Memory', self.mem_used_mb)]))
 
         if self.enable_paging:
-            plt.subplot(self.num_plots, 1, plt_idx)
-            plt.xticks(self.xticks, self.xtick_labels,
-                       rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
-            plt.plot(self.x_data, self.page_faults_per_sec, label='faults/s')
-            plt.plot(self.x_data, self.major_page_faults_per_sec, label='major faults/s')
-            plt.xlabel('time')
-            plt.ylabel('faults/s')
-            plt.title('Page Faults')
-            lg = plt.legend(frameon=False)
-            lg_txts = lg.get_texts()
-            plt.setp(lg_txts, fontsize=10)
-            plt_idx += 1
+            panels.append(('Page Faults', 'faults/s', False, [
+                ('faults/s', self.page_faults_per_sec),
+                ('major faults/s', self.major_page_faults_per_sec)]))
+            panels.append(('Page Ins and Outs', 'KB/s', False, [
+                ('page ins/s', self.page_ins_per_sec),
+                ('page outs/s', self.page_outs_per_sec)]))
 
-            plt.subplot(self.num_plots, 1, plt_idx)
-            plt.xticks(self.xticks, self.xtick_labels,
-                       rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
-            plt.plot(self.x_data, self.page_ins_per_sec, label='page ins/s')
-            plt.plot(self.x_data, self.page_outs_per_sec, label='page outs/s')
-            plt.xlabel('time')
-            plt.ylabel('KB/s')
-            plt.title('Page Ins and Outs')
-            lg = plt.legend(frameon=False)
-            lg_txts = lg.get_texts()
-            plt.setp(lg_txts, fontsize=10)
-            plt_idx += 1
+        if self.enable_net:
+            series = []
+            for iface, rx, tx in self._net_series():
+                series.append(('{}-rx'.format(iface), rx))
+                series.append(('{}-tx'.format(iface), tx))
+            panels.append(('Network Usage', 'KB/s', False, series))
+
+        if self.enable_disk:
+            panels.append(('Disk IO', 'blocks/s', False, [
+                ('reads', self.breads_per_sec),
+                ('writes', self.bwrites_per_sec)]))
+
+        return panels
+
+    def _shade(self, plt, section):
+        """Shade events of a section on the current chart.
+
+        Args:
+            plt (module): ``matplotlib.pyplot``
+            section (str): Section of SAR data the chart shows
+        """
+        events = [event for event in self.events if event.section == section]
+        if not events:
+            return
+
+        epoch, seconds = canvas.time_values(self.time_points)
+        for event in events:
+            start, end = event.start, event.end
+            if not epoch:
+                start, end = start % 86400, end % 86400
+            first = bisect.bisect_left(seconds, start)
+            last = bisect.bisect_right(seconds, end) - 1
+            if first > last:
+                continue
+            plt.axvspan(first - 0.5, last + 0.5, color='red', alpha=0.15,
+                        linewidth=0)
+
+    def _panel_drawers(self):
+        """Describe enabled charts as panels drawn on their own.
+
+        Returns:
+            list: ``(name, section, draw, series, options)`` per chart, in
+                drawing order. ``draw`` draws the chart on the current
+                axes of ``matplotlib.pyplot`` passed to it, ``series``
+                (arrays) and ``options`` are everything the chart depends
+                on, see :meth:`_panel_key`. ``draw`` is the ``_draw_<name>``
+                method.
+        """
+        panels = []
+
+        if self.enable_cpu:
+            panels.append(('cpu', 'cpu', self._draw_cpu,
+                           [self.cpu_usage_usr, self.cpu_usage_sys], None))
+
+        if self.enable_cpu_heatmap:
+            panels.append(('cpu_heatmap', 'cpu', self._draw_cpu_heatmap,
+                           [self.cpu_busy], self.cpu_ids))
+
+        if self.top_cpus:
+            top = self._busiest_cpus()
+            panels.append(('top_cpus', 'cpu', self._draw_top_cpus,
+                           [self.cpu_busy[top]],
+                           [self.cpu_ids[i] for i in top]))
+
+        if self.enable_mem:
+            panels.append(('mem_pct', 'mem', self._draw_mem_pct,
+                           [self.pct_mem_used], None))
+            panels.append(('mem', 'mem', self._draw_mem,
+                           [self.mem_buffer_mb, self.mem_cached_mb,
+                            self.mem_used_mb], None))
+
+        if self.enable_paging:
+            panels.append(('faults', 'paging', self._draw_faults,
+                           [self.page_faults_per_sec,
+                            self.major_page_faults_per_sec], None))
+            panels.append(('page_io', 'paging', self._draw_page_io,
+                           [self.page_ins_per_sec, self.page_outs_per_sec],
+                           None))
 
         if self.enable_net:
-            plt.subplot(self.num_plots, 1, plt_idx)
-            plt.xticks(self.xticks, self.xtick_labels,
-                       rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
-            for iface in self.kb_rcv_per_sec.keys():
-                plt.plot(self.x_data, self.kb_rcv_per_sec[iface], label='{}-rx'.format(iface))
-            for iface in self.kb_trans_per_sec.keys():
-                plt.plot(self.x_data, self.kb_trans_per_sec[iface], label='{}-tx'.format(iface))
-            plt.xlabel('time')
-            plt.ylabel('KB/s')
-            plt.title('Network Usage')
-            lg = plt.legend(loc=1,
-                            ncol=len(self.kb_rcv_per_sec.keys()), frameon=False)
-            lg.get_frame().set_alpha(0)
-            lg_txts = lg.get_texts()
-            plt.setp(lg_txts, fontsize=10)
-            plt_idx += 1
+            series = self._net_series()
+            panels.append(('net', 'net', self._draw_net,
+                           [values for iface, rx, tx in series
+                            for values in (rx, tx)],
+                           [iface for iface, rx, tx in series]))
 
         if self.enable_disk:
+            panels.append(('disk', 'io', self._draw_disk,
+                           [self.breads_per_sec, self.bwrites_per_sec], None))
+
+        return panels
+
+    def _draw(self):
+        plt = _pyplot()
+
+        fig = plt.figure()
+        fig.set_figheight(self.fig_height)
+
+        plt.clf()
+        plt.subplots_adjust(wspace=1, hspace=1)
+
+        for plt_idx, panel in enumerate(self._panel_drawers(), 1):
             plt.subplot(self.num_plots, 1, plt_idx)
-            plt.xticks(self.xticks, self.xtick_labels,
-                       rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
-            plt.plot(self.x_data, self.breads_per_sec, label='reads')
-            plt.plot(self.x_data, self.bwrites_per_sec, label='writes')
-            plt.xlabel('time')
-            plt.ylabel('blocks/s')
-            plt.title('Disk IO')
-            lg = plt.legend(frameon=False)
-            lg_txts = lg.get_texts()
-            plt.setp(lg_txts, fontsize=10)
+            panel[2](plt)
+
+        fig.tight_layout()
+        return fig
+
+    def _panel_key(self, name, section, series, options):
+        """Identify the raster of a chart.
+
+        Args:
+            name (str): Name of the chart
+            section (str): Section of SAR data the chart shows
+            series (list): Arrays of values the chart shows
+            options: Anything else the chart depends on (labels, ids)
+
+        Returns:
+            str: digest of the chart's data and options
+        """
+        import numpy as np
+        plt = _pyplot()
+
+        digest = hashlib.sha1()
+        digest.update(repr((
+            name, options, plt.rcParams['figure.figsize'][0],
+            plt.rcParams['figure.dpi'], PANEL_HEIGHT,
+            [(event.start, event.end) for event in self.events
+             if event.section == section])).encode('utf-8'))
+        digest.update('\n'.join(self.time_points).encode('utf-8'))
+        for values in series:
+            digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+
+        return digest.hexdigest()
+
+    def _render_panel(self, draw):
+        """Render a single chart into a raster.
+
+        Args:
+            draw (callable): Draws the chart, see :meth:`_panel_drawers`
+
+        Returns:
+            :obj:`numpy.ndarray`: height x width x 4 RGBA raster
+        """
+        import numpy as np
+        plt = _pyplot()
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = plt.figure()
+        fig.set_figheight(PANEL_HEIGHT)
+        agg = FigureCanvasAgg(fig)
+        plt.subplot(1, 1, 1)
+        draw(plt)
+        fig.tight_layout()
+        agg.draw()
+
+        width, height = agg.get_width_height()
+        raster = np.frombuffer(agg.buffer_rgba(), dtype=np.uint8).reshape(
+            height, width, 4).copy()
+        plt.close(fig)
+
+        return raster
+
+    def _composite(self):
+        """Stack rasters of enabled charts, rendering only the ones missing
+        from ``panel_cache``, in ``workers`` processes if there are more of
+        them.
+
+        Returns:
+            tuple: (height x width x 4 RGBA raster, number of charts
+                rendered)
+        """
+        import numpy as np
+
+        rasters = []
+        missing = []
+        for name, section, draw, series, options in self._panel_drawers():
+            key = None
+            raster = None
+            if self.panel_cache is not None:
+                key = self._panel_key(name, section, series, options)
+                raster = self.panel_cache.get(key)
+            if raster is None:
+                missing.append((len(rasters), name, key))
+            rasters.append(raster)
+
+        if self.workers and len(missing) > 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(min(self.workers, len(missing)),
+                                        _init_panel_worker, (self,))
+            try:
+                rendered = pool.map(_render_panel_task,
+                                    [name for i, name, key in missing], 1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            rendered = [self._render_panel(getattr(self, '_draw_' + name))
+                        for i, name, key in missing]
+
+        for (i, name, key), raster in zip(missing, rendered):
+            rasters[i] = raster
+            if key is not None:
+                self.panel_cache.put(key, raster)
+
+        return np.vstack(rasters), len(missing)
+
+    def _draw_cpu(self, plt):
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        plt.plot(self.x_data, self.cpu_usage_usr, label='usr')
+        plt.plot(self.x_data, self.cpu_usage_sys, label='sys')
+        plt.xlabel('time')
+        plt.ylabel('% usage')
+        plt.title('CPU Usage')
+        self._shade(plt, 'cpu')
+        lg = plt.legend(frameon=False)
+        lg_txts = lg.get_texts()
+        plt.setp(lg_txts, fontsize=10)
+
+    def _draw_cpu_heatmap(self, plt):
+        # One image, however many cores there are
+        plt.imshow(self.cpu_busy, aspect='auto', interpolation='nearest',
+                   origin='lower', cmap='viridis', vmin=0, vmax=100,
+                   extent=(-0.5, len(self.time_points) - 0.5,
+                           -0.5, len(self.cpu_ids) - 0.5))
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        cpu_step = max(len(self.cpu_ids) // 16, 1)
+        plt.yticks(range(0, len(self.cpu_ids), cpu_step),
+                   self.cpu_ids[::cpu_step])
+        plt.colorbar(pad=0.01).set_label('% busy')
+        plt.xlabel('time')
+        plt.ylabel('CPU')
+        plt.title('CPU Busy per Core')
+
+    def _draw_top_cpus(self, plt):
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        top = self._busiest_cpus()
+        lines = plt.plot(self.x_data, self.cpu_busy[top].T)
+        plt.xlabel('time')
+        plt.ylabel('% busy')
+        plt.title('Busiest CPUs')
+        self._shade(plt, 'cpu')
+        lg = plt.legend(lines, ['cpu {}'.format(self.cpu_ids[i])
+                                for i in top],
+                        frameon=False, ncol=min(len(top), 4))
+        plt.setp(lg.get_texts(), fontsize=10)
+
+    def _draw_mem_pct(self, plt):
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        plt.plot(self.x_data, self.pct_mem_used, label='% mem used')
+        plt.xlabel('time')
+        plt.ylabel('% mem used')
+        plt.title('Percentage of Memory Used')
+        self._shade(plt, 'mem')
+        lg = plt.legend(frameon=False)
+        lg_txts = lg.get_texts()
+        plt.setp(lg_txts, fontsize=10)
+
+    def _draw_mem(self, plt):
+        import matplotlib.patches as mpatches
+
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        plt.stackplot(self.x_data, self.mem_buffer_mb, self.mem_cached_mb, self.mem_used_mb,
+                      colors=['lemonchiffon', 'navajowhite', 'sandybrown'])
+        plt.xlabel('time')
+        plt.ylabel('Mem Usage (MB)')
+        plt.title('Memory Usage')
+        self._shade(plt, 'mem')
+
+        # lc_handle = mpatches.Patch(color='lemonchiffon', label='Buffered Memory')
+        # nw_handle = mpatches.Patch(color='navajowhite', label='Cached Memory')
+        # sb_handle = mpatches.Patch(color='sandybrown', label='Used Memory')
+
+        lg = plt.legend([mpatches.Patch(color='lemonchiffon'),
+                         mpatches.Patch(color='navajowhite'),
+                         mpatches.Patch(color='sandybrown')],
+                        ['Buffered Memory', 'Cached Memory', 'Used Memory'])
+        lg.get_frame().set_alpha(0.6)
+        lg_txts = lg.get_texts()
+        plt.setp(lg_txts, fontsize=10)
+
+    def _draw_faults(self, plt):
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        plt.plot(self.x_data, self.page_faults_per_sec, label='faults/s')
+        plt.plot(self.x_data, self.major_page_faults_per_sec, label='major faults/s')
+        plt.xlabel('time')
+        plt.ylabel('faults/s')
+        plt.title('Page Faults')
+        self._shade(plt, 'paging')
+        lg = plt.legend(frameon=False)
+        lg_txts = lg.get_texts()
+        plt.setp(lg_txts, fontsize=10)
+
+    def _draw_page_io(self, plt):
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        plt.plot(self.x_data, self.page_ins_per_sec, label='page ins/s')
+        plt.plot(self.x_data, self.page_outs_per_sec, label='page outs/s')
+        plt.xlabel('time')
+        plt.ylabel('KB/s')
+        plt.title('Page Ins and Outs')
+        self._shade(plt, 'paging')
+        lg = plt.legend(frameon=False)
+        lg_txts = lg.get_texts()
+        plt.setp(lg_txts, fontsize=10)
+
+    def _draw_net(self, plt):
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        series = self._net_series()
+        for iface, rx, tx in series:
+            plt.plot(self.x_data, rx, label='{}-rx'.format(iface))
+            plt.plot(self.x_data, tx, label='{}-tx'.format(iface))
+        plt.xlabel('time')
+        plt.ylabel('KB/s')
+        plt.title('Network Usage')
+        self._shade(plt, 'net')
+        lg = plt.legend(loc=1, ncol=max(min(len(series), 4), 1),
+                        frameon=False)
+        lg.get_frame().set_alpha(0)
+        lg_txts = lg.get_texts()
+        plt.setp(lg_txts, fontsize=10)
+
+    def _draw_disk(self, plt):
+        plt.xticks(self.xticks, self.xtick_labels,
+                   rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+        plt.plot(self.x_data, self.breads_per_sec, label='reads')
+        plt.plot(self.x_data, self.bwrites_per_sec, label='writes')
+        plt.xlabel('time')
+        plt.ylabel('blocks/s')
+        plt.title('Disk IO')
+        self._shade(plt, 'io')
+        lg = plt.legend(frameon=False)
+        lg_txts = lg.get_texts()
+        plt.setp(lg_txts, fontsize=10)
+
+
+class Comparison(object):
+    OVERLAY = 'overlay'
+    DIFF = 'diff'
+    TIME_OF_DAY = 'time_of_day'
+    OFFSET = 'offset'
+    TICK_STEPS = [1, 5, 10, 30, 60, 300, 600, 1800, 3600, 7200, 10800,
+                  21600, 86400]
+
+    def __init__(self, sar_datasets, labels=None, align=TIME_OF_DAY,
+                 mode=OVERLAY, profile=None, **kwargs):
+        """Compare several sar logs (periods or hosts) on shared charts.
+
+        Datasets are aligned on time of day, or on time since their first
+        sample, and either overlaid or differenced against the first one.
+        Differencing interpolates each dataset onto the time points of the
+        first one with NumPy, so samples don't have to line up exactly.
+
+        Args:
+            sar_datasets (list): Processed sar logs from Parser, the first
+                one is the reference for ``DIFF`` mode
+            labels (:obj:`list` of :obj:`str`, optional): Names of datasets
+                shown in legends, ``#0``, ``#1``... by default
+            align (:obj:`str`, optional): ``TIME_OF_DAY`` or ``OFFSET``
+            mode (:obj:`str`, optional): ``OVERLAY`` or ``DIFF``
+            profile (:obj:`sar.profiling.Profile`, optional): Collects per
+                stage figures (``preprocess``, ``align``, ``draw``,
+                ``savefig``)
+            **kwargs: Chart switches, see :class:`Visualization`
+        """
+        if len(sar_datasets) < 2:
+            raise ValueError('Comparison needs at least two sar logs')
+        if align not in (Comparison.TIME_OF_DAY, Comparison.OFFSET):
+            raise ValueError('Unknown alignment: {}'.format(align))
+        if mode not in (Comparison.OVERLAY, Comparison.DIFF):
+            raise ValueError('Unknown comparison mode: {}'.format(mode))
+        if labels is None:
+            labels = ['#{}'.format(i) for i in range(len(sar_datasets))]
+        if len(labels) != len(sar_datasets):
+            raise ValueError('Expected {} labels, got {}'.format(
+                len(sar_datasets), len(labels)))
+
+        self.labels = labels
+        """(:obj:`list` of :obj:`str`): names of compared datasets"""
+
+        self.align = align
+        self.mode = mode
+
+        self.visualizations = [Visualization(sar_data, profile=profile,
+                                             **kwargs)
+                               for sar_data in sar_datasets]
+        """(:obj:`list` of :obj:`Visualization`): preprocessed datasets"""
+
+        self.profile = profile
+        self._profiler = profile if profile is not None else NULL_PROFILE
+
+        with self._profiler.stage('align') as run:
+            self._share_ifaces()
+            self.panels = self._align()
+            """(:obj:`list`): ``(title, ylabel, [(label, x, y), ...])`` per
+                chart, ``x`` in seconds"""
+            run.rows = sum(len(v.time_points) for v in self.visualizations)
+
+    def _share_ifaces(self):
+        """Draw the same interfaces for every dataset.
+
+        Each dataset would pick its own busiest interfaces otherwise, so
+        charts would miss some of them and ``other`` would sum up different
+        ones. Interfaces are ranked by their traffic in all datasets.
+        """
+        totals = {}
+        for viz in self.visualizations:
+            if viz.net_rx is None:
+                continue
+            for iface, total in zip(viz.net_ifaces, viz._net_totals()):
+                totals[iface] = totals.get(iface, 0.0) + total
+
+        shown = sorted(totals, key=lambda iface: (-totals[iface], iface))
+        top_ifaces = self.visualizations[0].top_ifaces
+        if top_ifaces is not None:
+            shown = shown[:top_ifaces]
+        for viz in self.visualizations:
+            viz.net_shown = shown
+
+    def _align(self):
+        import numpy as np
+
+        xs = []
+        for viz in self.visualizations:
+            x = np.array(canvas.time_values(viz.time_points)[1], dtype=float)
+            if self.align == Comparison.TIME_OF_DAY:
+                x = x % 86400
+            elif len(x):
+                x = x - x[0]
+            xs.append(x)
+        # Interpolation needs increasing x, which time of day of
+        # multi-day data isn't
+        orders = [np.argsort(x, kind='mergesort') for x in xs]
+
+        panels = []
+        all_panels = [viz._panels() for viz in self.visualizations]
+        for i, (title, ylabel, stacked, series) in enumerate(all_panels[0]):
+            datasets = [dict(panels_k[i][3]) for panels_k in all_panels]
+            # Series of any dataset, in order of their first appearance
+            names = []
+            for panels_k in all_panels:
+                for label, values in panels_k[i][3]:
+                    if label not in names:
+                        names.append(label)
+            lines = []
+
+            for label in names:
+                ys = [np.array(dataset.get(label, []), dtype=float)
+                      for dataset in datasets]
+
+                if self.mode == Comparison.OVERLAY:
+                    for k, y in enumerate(ys):
+                        if len(y):
+                            lines.append(('{} {}'.format(
+                                label, self.labels[k]), xs[k], y))
+                    continue
+
+                reference = ys[0]
+                # Time of day of multi-day data goes back at midnight, draw
+                # differences left to right
+                first = orders[0]
+                for k in range(1, len(ys)):
+                    if not len(ys[k]) or not len(reference):
+                        continue
+                    order = orders[k]
+                    other = np.interp(xs[0], xs[k][order], ys[k][order],
+                                      left=np.nan, right=np.nan)
+                    lines.append(('{} {} - {}'.format(
+                        label, self.labels[k], self.labels[0]), xs[0][first],
+                        (other - reference)[first]))
+
+            panels.append((title, ylabel, lines))
+
+        return panels
+
+    def _format_x(self, seconds, pos=None):
+        seconds = int(round(seconds))
+        sign = ''
+        if self.align == Comparison.OFFSET:
+            sign = '+' if seconds >= 0 else '-'
+            seconds = abs(seconds)
+        return '{}{:02d}:{:02d}:{:02d}'.format(
+            sign, seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+    def save(self, output_path, output_type=Visualization.PDF_OUTPUT):
+        """Render comparison charts into a file.
+
+        Args:
+            output_path (:obj:`str` or file-like object): Output file
+            output_type (:obj:`int`, optional): One of
+                ``Visualization.PDF_OUTPUT``, ``Visualization.PNG_OUTPUT``,
+                ``Visualization.SVG_OUTPUT``
+        """
+        if output_type == Visualization.HTML_OUTPUT:
+            raise ValueError('HTML output is not supported for comparisons')
+
+        with self._profiler.stage('draw') as run:
+            fig = self._draw()
+            run.rows = sum(len(x) for panel in self.panels
+                           for label, x, y in panel[2])
+
+        with self._profiler.stage('savefig'):
+            _save_figure(fig, output_path, output_type)
+
+    def _draw(self):
+        plt = _pyplot()
+        from matplotlib.ticker import FuncFormatter, MultipleLocator
+
+        num_plots = max(len(self.panels), 1)
+        fig = plt.figure()
+        fig.set_figheight(num_plots * 4)
+        formatter = FuncFormatter(self._format_x)
+        span = max([x.max() - x.min() for panel in self.panels
+                    for label, x, y in panel[2] if len(x)] or [0])
+        # Ticks on whole minutes / hours rather than arbitrary seconds
+        step = next((step for step in Comparison.TICK_STEPS
+                     if span / step <= 12), Comparison.TICK_STEPS[-1])
+
+        for idx, (title, ylabel, lines) in enumerate(self.panels):
+            ax = fig.add_subplot(num_plots, 1, idx + 1)
+            for label, x, y in lines:
+                ax.plot(x, y, label=label, linewidth=0.8)
+            if self.mode == Comparison.DIFF:
+                ax.axhline(0, color='grey', linewidth=0.5)
+                title = '{} (difference)'.format(title)
+            ax.xaxis.set_major_formatter(formatter)
+            ax.xaxis.set_major_locator(MultipleLocator(step))
+            plt.setp(ax.get_xticklabels(),
+                     rotation=Visualization.PLT_XTICK_LABEL_ROTATION)
+            ax.set_xlabel('time of day' if self.align == Comparison.TIME_OF_DAY
+                          else 'time since start')
+            ax.set_ylabel(ylabel)
+            ax.set_title(title)
+            if lines:
+                lg = ax.legend(frameon=False)
+                plt.setp(lg.get_texts(), fontsize=8)
 
         fig.tight_layout()
-        if output_type == Visualization.PDF_OUTPUT:
-            pp = PdfPages(output_path)
-            pp.savefig()
-            pp.close()
-        elif output_type == Visualization.PNG_OUTPUT:
-            fig.savefig(output_path)
-            plt.close(fig)
+        return fig
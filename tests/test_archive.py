@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+'''
+Appending SAR files to the columnar archive and reading them back.
+'''
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import sar.parser as sarparse
+from sar.archive import Archive
+from sar.timeutil import time_to_seconds, to_epoch
+from tests.test_parser import DATA_DIR
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='sararchive')
+        self.archive = Archive(os.path.join(self.workdir, 'j-login1'))
+        self.parser = sarparse.Parser(os.path.join(DATA_DIR, 'sample.log'))
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_append_once(self):
+        appended = self.archive.append_parser(self.parser)
+        self.assertTrue(appended > 0)
+        self.assertEqual(self.archive.append_parser(self.parser), 0)
+        # Reopened archive sees the same data
+        self.assertEqual(
+            Archive(self.archive.path).append_parser(self.parser), 0)
+
+    def test_read_range(self):
+        self.archive.append_parser(self.parser)
+        mem = self.parser.get_sar_info()['mem']
+        midnight = to_epoch(datetime.date(2016, 8, 20))
+        expected = sorted(midnight + time_to_seconds(full_time)
+                          for full_time in mem)
+
+        columns = self.archive.read('mem', ['memused'])
+        self.assertEqual(list(columns['ts']), expected)
+        self.assertEqual(len(columns['memused']), len(expected))
+
+        ranged = self.archive.read('mem', ['memused'], start=expected[1],
+                                   end=expected[-1])
+        self.assertEqual(list(ranged['ts']), expected[1:-1])
+
+    def test_entities(self):
+        self.archive.append_parser(self.parser)
+        entities = self.archive.entities('cpu')
+        self.assertTrue('all' in entities)
+        usr = self.archive.read('cpu', ['usr'], entity='all')
+        self.assertEqual(len(usr['ts']), len(usr['usr']))
+        self.assertRaises(ValueError, self.archive.read, 'cpu', ['usr'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+'''
+Parsing the same file in windows, in worker pools, in pieces or into
+compact rows gives the same data as the default parse.
+'''
+
+import os
+import unittest
+
+import sar.parser as sarparse
+
+"""Directory with sample SAR files"""
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'data')
+
+"""Sample files: 12hr AM/PM timestamps, and LINUX RESTART lines"""
+SAMPLES = ('sample.log', 'sample_restart.log')
+
+
+def plain(data):
+    '''
+    Returns parsed data with compact rows turned into ``dict``s
+    '''
+    if (hasattr(data, 'items')):
+        return dict((key, plain(value)) for key, value in data.items())
+
+    return data
+
+
+class ParseEquivalenceTest(unittest.TestCase):
+
+    def assert_same_parse(self, **options):
+        for sample in SAMPLES:
+            filename = os.path.join(DATA_DIR, sample)
+            expected = sarparse.Parser(filename)
+            parser = sarparse.Parser(filename, **options)
+
+            sar_info = parser.get_sar_info()
+            self.assertIsNot(sar_info, False)
+            self.assertEqual(plain(sar_info),
+                             plain(expected.get_sar_info()), sample)
+            self.assertEqual(plain(parser.get_averages()),
+                             plain(expected.get_averages()), sample)
+
+    def test_default_parse(self):
+        for sample in SAMPLES:
+            parser = sarparse.Parser(os.path.join(DATA_DIR, sample))
+            sar_info = parser.get_sar_info()
+            self.assertTrue(sar_info['cpu'])
+            self.assertTrue(sar_info['mem'])
+            # 12hr timestamps are converted to 24hr ones
+            self.assertTrue(all(len(full_time) == 8 and
+                                int(full_time[:2]) < 24
+                                for full_time in sar_info['cpu']))
+        restarted = sarparse.Parser(os.path.join(DATA_DIR, SAMPLES[1]))
+        self.assertTrue(any(int(full_time[:2]) >= 12
+                            for full_time in restarted.get_sar_info()['cpu']))
+
+    def test_window(self):
+        self.assert_same_parse(window=4096)
+        self.assert_same_parse(window=256)
+
+    def test_thread_workers(self):
+        self.assert_same_parse(workers=2, pool='thread')
+        self.assert_same_parse(workers=2, pool='thread', split_size=4096)
+
+    def test_process_workers(self):
+        self.assert_same_parse(workers=2, pool='process')
+        self.assert_same_parse(workers=2, pool='process', split_size=4096)
+
+    def test_unsplit_sections(self):
+        self.assert_same_parse(workers=2, split_size=None)
+
+    def test_compact(self):
+        self.assert_same_parse(compact=True)
+        self.assert_same_parse(compact=True, workers=2, split_size=4096)
+
+    def test_summary(self):
+        for sample in SAMPLES:
+            filename = os.path.join(DATA_DIR, sample)
+            parser = sarparse.Parser(filename)
+            expected = parser.get_summary()
+            only = sarparse.Parser(filename, stats_only=True).summarize()
+
+            # Merging into a summary leaves the parser's own intact
+            merged = parser.summarize().merge(only)
+            self.assertEqual(parser.get_summary(), expected)
+            count = expected['mem']['memused']['count']
+            self.assertEqual(merged.get('mem', 'memused')['count'], 2 * count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+'''
+Report service endpoints, served over HTTP from the sample files.
+'''
+
+import json
+import threading
+import unittest
+
+from sar.server import ReportServer, ReportService
+from tests.test_parser import DATA_DIR
+from tests.test_viz import PNG_MAGIC
+
+try:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import urlopen, HTTPError
+
+"""Path of charts of the sample file"""
+CHART_PATH = '/chart/j-login1/2016-08-20'
+
+
+class ReportServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = ReportService(DATA_DIR, workers=1)
+        cls.server = ReportServer(('127.0.0.1', 0), cls.service)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.base_url = 'http://127.0.0.1:%d' % (cls.server.server_address[1],)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.close()
+
+    def get(self, path):
+        '''
+        Returns (status, content type, body) of a request
+        '''
+        try:
+            response = urlopen(self.base_url + path)
+        except HTTPError as error:
+            return error.code, error.headers.get('Content-Type'), error.read()
+        try:
+            return (response.getcode(), response.headers.get('Content-Type'),
+                    response.read())
+        finally:
+            response.close()
+
+    def test_hosts(self):
+        status, content_type, body = self.get('/hosts')
+        self.assertEqual(status, 200)
+        hosts = json.loads(body.decode('utf-8'))
+        self.assertEqual(hosts['j-login1'], ['2016-08-20'])
+
+    def test_png_chart(self):
+        status, content_type, body = self.get(
+            CHART_PATH + '.png?charts=cpu,mem,net&start=10:00&end=12:00')
+        self.assertEqual(status, 200)
+        self.assertEqual(content_type, 'image/png')
+        self.assertTrue(body.startswith(PNG_MAGIC))
+
+    def test_svg_chart(self):
+        status, content_type, body = self.get(CHART_PATH + '.svg')
+        self.assertEqual(status, 200)
+        self.assertEqual(content_type, 'image/svg+xml')
+        self.assertTrue(b'<svg' in body)
+
+    def test_cached_chart(self):
+        first = self.get(CHART_PATH + '.png?charts=paging')
+        hits = self.service.images.stats()['hits']
+        self.assertEqual(self.get(CHART_PATH + '.png?charts=paging'), first)
+        stats = self.service.images.stats()
+        self.assertEqual(stats['hits'], hits + 1)
+        self.assertTrue(stats['bytes'] >= len(first[2]))
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get(CHART_PATH + '.png?charts=nope')[0], 400)
+        self.assertEqual(self.get('/chart/nobody/2016-08-20.png')[0], 404)
+        self.assertEqual(self.get(CHART_PATH + '.png?start=25')[0], 400)
+
+    def test_summary(self):
+        status, content_type, body = self.get('/summary/j-login1/2016-08-20')
+        self.assertEqual(status, 200)
+        summary = json.loads(body.decode('utf-8'))
+        self.assertTrue(summary['mem']['memused']['count'] > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+'''
+Ingesting SAR files into the SQLite store and querying them back.
+'''
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from sar.store import Store
+from sar.timeutil import to_epoch
+from tests.test_parser import DATA_DIR
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='sarstore')
+        self.store = Store(os.path.join(self.workdir, 'sar.db'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_ingest_once(self):
+        filename = os.path.join(DATA_DIR, 'sample.log')
+        rows = self.store.ingest_file(filename)
+        self.assertTrue(rows > 0)
+        self.assertEqual(self.store.ingest_file(filename), 0)
+
+        # Same content under another name is recognized too
+        copy = os.path.join(self.workdir, 'copy.log')
+        shutil.copy(filename, copy)
+        self.assertEqual(self.store.ingest_file(copy), 0)
+        self.assertEqual(self.store.hosts(), ['j-login1'])
+
+    def test_query_range(self):
+        self.store.ingest_file(os.path.join(DATA_DIR, 'sample.log'))
+        midnight = to_epoch(datetime.date(2016, 8, 20))
+
+        everything = self.store.query('mem', ['memused'])
+        self.assertTrue(everything['ts'])
+        self.assertEqual(everything['ts'], sorted(everything['ts']))
+
+        start = everything['ts'][1]
+        end = everything['ts'][-1]
+        ranged = self.store.query('mem', ['memused'], host='j-login1',
+                                  start=start, end=end)
+        self.assertEqual(ranged['ts'], everything['ts'][1:-1])
+        self.assertTrue(all(midnight <= ts < midnight + 86400
+                            for ts in ranged['ts']))
+
+        cpu = self.store.query('cpu', ['usr'], entity='all')
+        self.assertEqual(set(cpu['entity']), set(['all']))
+        self.assertEqual(self.store.query('mem', start=end + 1,
+                                          end=end + 2)['ts'], [])
+
+    def test_combined_file(self):
+        filename = os.path.join(DATA_DIR, 'sample_combo.log')
+        rows = self.store.ingest_file(filename, combined=True)
+        self.assertTrue(rows > 0)
+        self.assertEqual(self.store.ingest_file(filename, combined=True), 0)
+        # Host is taken from banner line of each day
+        self.assertEqual(self.store.hosts(), ['gen-combo'])
+
+        second_day = to_epoch(datetime.date(2016, 8, 21))
+        mem = self.store.query('mem', ['memused'], start=second_day)
+        self.assertTrue(mem['ts'])
+        self.assertTrue(all(ts >= second_day for ts in mem['ts']))
+
+    def test_unknown_field(self):
+        self.assertRaises(ValueError, self.store.query, 'mem', ['nope'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+'''
+Rendering charts and comparisons of parsed SAR data.
+'''
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import sar.parser as sarparse
+from sar import viz
+from sar.cache import LRUCache
+from sar.store import Store
+from tests.test_parser import DATA_DIR
+
+"""Chart switches turning every chart on"""
+ALL_CHARTS = dict(cpu=True, mem=True, disk=True, network=True, paging=True,
+                  cpu_heatmap=True, top_cpus=4)
+
+"""First bytes of PNG files"""
+PNG_MAGIC = b'\x89PNG'
+
+
+class VisualizationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sar_info = sarparse.Parser(
+            os.path.join(DATA_DIR, 'sample.log')).get_sar_info()
+
+    def render(self, visualization, output_type):
+        output = io.BytesIO()
+        visualization.save(output, output_type)
+        return output.getvalue()
+
+    def test_png(self):
+        image = self.render(viz.Visualization(self.sar_info, **ALL_CHARTS),
+                            viz.Visualization.PNG_OUTPUT)
+        self.assertTrue(image.startswith(PNG_MAGIC))
+
+    def test_svg(self):
+        image = self.render(viz.Visualization(self.sar_info, **ALL_CHARTS),
+                            viz.Visualization.SVG_OUTPUT)
+        self.assertTrue(b'<svg' in image)
+
+    def test_html(self):
+        workdir = tempfile.mkdtemp(prefix='sarviz')
+        try:
+            path = os.path.join(workdir, 'report.html')
+            viz.Visualization(self.sar_info, **ALL_CHARTS).save(
+                path, viz.Visualization.HTML_OUTPUT)
+            with open(path, 'rb') as fhandle:
+                page = fhandle.read()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        self.assertTrue(b'<html' in page)
+
+    def test_panel_cache(self):
+        cache = LRUCache()
+        first = self.render(
+            viz.Visualization(self.sar_info, panel_cache=cache, **ALL_CHARTS),
+            viz.Visualization.PNG_OUTPUT)
+        cached = len(cache)
+        self.assertTrue(first.startswith(PNG_MAGIC))
+        self.assertTrue(cached > 0)
+
+        # Same charts again are taken from the cache
+        self.render(
+            viz.Visualization(self.sar_info, panel_cache=cache, **ALL_CHARTS),
+            viz.Visualization.PNG_OUTPUT)
+        self.assertEqual(len(cache), cached)
+
+    def test_workers(self):
+        image = self.render(
+            viz.Visualization(self.sar_info, workers=2, **ALL_CHARTS),
+            viz.Visualization.PNG_OUTPUT)
+        self.assertTrue(image.startswith(PNG_MAGIC))
+
+    def test_from_columns(self):
+        workdir = tempfile.mkdtemp(prefix='sarviz')
+        try:
+            store = Store(os.path.join(workdir, 'sar.db'))
+            store.ingest_file(os.path.join(DATA_DIR, 'sample.log'))
+            columns = dict((section, store.query(section))
+                           for section in ('cpu', 'mem'))
+            store.close()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        image = self.render(viz.Visualization.from_columns(columns),
+                            viz.Visualization.PNG_OUTPUT)
+        self.assertTrue(image.startswith(PNG_MAGIC))
+
+
+class ComparisonTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.datasets = [
+            sarparse.Parser(os.path.join(DATA_DIR, sample)).get_sar_info()
+            for sample in ('sample.log', 'sample_restart.log')]
+
+    def test_overlay(self):
+        comparison = viz.Comparison(self.datasets, labels=['a', 'b'],
+                                    **ALL_CHARTS)
+        self.assertTrue(comparison.panels)
+        output = io.BytesIO()
+        comparison.save(output, viz.Visualization.PNG_OUTPUT)
+        self.assertTrue(output.getvalue().startswith(PNG_MAGIC))
+
+    def test_diff(self):
+        comparison = viz.Comparison(self.datasets, mode=viz.Comparison.DIFF,
+                                    **ALL_CHARTS)
+        for title, ylabel, lines in comparison.panels:
+            for label, x, y in lines:
+                # Differences are drawn in time order
+                self.assertTrue(all(x[i] <= x[i + 1]
+                                    for i in range(len(x) - 1)), label)
+        output = io.BytesIO()
+        comparison.save(output, viz.Visualization.PNG_OUTPUT)
+        self.assertTrue(output.getvalue().startswith(PNG_MAGIC))
+
+    def test_shared_ifaces(self):
+        comparison = viz.Comparison(self.datasets, network=True,
+                                    top_ifaces=1)
+        shown = [v.net_shown for v in comparison.visualizations]
+        self.assertEqual(len(shown[0]), 1)
+        self.assertEqual(shown[0], shown[1])
+
+    def test_single_dataset(self):
+        self.assertRaises(ValueError, viz.Comparison, self.datasets[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()